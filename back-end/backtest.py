@@ -0,0 +1,35 @@
+# --- START OF FILE backtest.py ---
+import argparse
+from core.database import criar_tabelas
+from services.replay import executar_replay, comparar_versoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay offline do ensemble sobre os dados históricos da tabela 'clima'.")
+    parser.add_argument('--municipios', nargs='*', default=None, help="Nomes das estações (padrão: todas).")
+    parser.add_argument('--inicio', default=None, help="Data inicial (YYYY-MM-DD).")
+    parser.add_argument('--fim', default=None, help="Data final (YYYY-MM-DD).")
+    parser.add_argument('--tamanho-lote', type=int, default=50_000)
+    parser.add_argument('--processos', type=int, default=None)
+    parser.add_argument('--historico', action='store_true', help="Também grava as probabilidades em 'historico_previsao'.")
+    parser.add_argument('--manter', action='store_true', help="Não apaga resultados anteriores da mesma versão de modelo.")
+    parser.add_argument('--comparar', action='store_true', help="Apenas mostra o resumo das versões já reexecutadas.")
+    args = parser.parse_args()
+
+    criar_tabelas() # Garante que 'backtest_previsao' existe
+
+    if not args.comparar:
+        executar_replay(
+            municipios=args.municipios,
+            inicio=args.inicio,
+            fim=args.fim,
+            tamanho_lote=args.tamanho_lote,
+            processos=args.processos,
+            gravar_historico=args.historico,
+            substituir=not args.manter,
+        )
+
+    print("\n--- Comparação entre versões de modelo ---")
+    print(comparar_versoes().to_string(index=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# --- START OF FILE bench_api.py ---
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import numpy as np
+from benchmarks.comum import diretorio_de_trabalho, metrica, pico_rss_mb, salvar_json
+from benchmarks.bench_treino import FEATURES, dataset_sintetico
+from benchmarks.stub_weatherapi import clima_atual, iniciar_stub
+
+
+def clima_simulado(lat, lon, tentativas=3):
+    """
+    Substitui `get_weather_data` durante o benchmark: devolve os mesmos valores determinísticos
+    do stub local da weatherapi.com, sem passar por HTTP.
+    """
+    atual = clima_atual(lat, lon)["current"]
+    return [atual["temp_c"], atual["humidity"], atual["wind_kph"], atual["precip_mm"]]
+
+
+async def _carga(cliente, caminhos, concorrencia):
+    """Dispara as requisições com `concorrencia` clientes simultâneos e devolve as latências (s)."""
+    fila = asyncio.Queue()
+    for caminho in caminhos:
+        fila.put_nowait(caminho)
+    latencias = []
+    erros = 0
+
+    async def trabalhador():
+        nonlocal erros
+        while not fila.empty():
+            caminho = fila.get_nowait()
+            inicio = time.perf_counter()
+            resposta = await cliente.get(caminho)
+            latencias.append(time.perf_counter() - inicio)
+            if resposta.status_code != 200:
+                erros += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    return np.array(latencias), time.perf_counter() - inicio, erros
+
+
+def _metricas_carga(latencias, duracao, erros):
+    return {
+        "req_por_s": metrica(len(latencias) / duracao, 'req/s', 'maior'),
+        "p50_ms": metrica(np.percentile(latencias, 50) * 1000, 'ms'),
+        "p95_ms": metrica(np.percentile(latencias, 95) * 1000, 'ms'),
+        "p99_ms": metrica(np.percentile(latencias, 99) * 1000, 'ms'),
+        "erros": metrica(erros, 'req'),
+    }
+
+
+async def _executar_carga(requisicoes, concorrencia):
+    # O agendador de risco não roda em segundo plano durante o benchmark; o snapshot é
+    # calculado uma vez abaixo, sem limite de taxa (o clima é simulado)
+    os.environ['RISCO_INTERVALO_SEGUNDOS'] = '0'
+    os.environ['RISCO_REQUISICOES_POR_MINUTO'] = '1000000'
+    import httpx
+    import main
+    import services.ensemble
+    import services.risco
+    import services.weather
+    from core.database import criar_tabelas
+
+    criar_tabelas()
+    services.ensemble.get_weather_data = clima_simulado
+    services.weather.get_weather_data = clima_simulado
+    await main.load_data_and_models()
+    await services.risco.atualizar_snapshot(main.df_estacoes)
+
+    estacoes = main.df_estacoes.dropna(subset=['VL_LATITUDE', 'VL_LONGITUDE'])
+    coordenadas = list(zip(estacoes['VL_LATITUDE'], estacoes['VL_LONGITUDE']))
+    coordenadas = [coordenadas[i % len(coordenadas)] for i in range(requisicoes)]
+
+    transporte = httpx.ASGITransport(app=main.app)
+    resultado = {}
+    async with httpx.AsyncClient(transport=transporte, base_url='http://bench') as cliente:
+        caminhos = ['/estacoes/'] * requisicoes
+        resultado['estacoes'] = _metricas_carga(*await _carga(cliente, caminhos, concorrencia))
+
+        caminhos = [f'/predict/?lat={lat}&lon={lon}' for lat, lon in coordenadas]
+        resultado['predict'] = _metricas_carga(*await _carga(cliente, caminhos, concorrencia))
+
+        # O /predict/ acima já gravou histórico para essas coordenadas
+        caminhos = [f'/predict/history/?lat={lat}&lon={lon}&limit=30' for lat, lon in coordenadas]
+        resultado['history'] = _metricas_carga(*await _carga(cliente, caminhos, concorrencia))
+
+        caminhos = [f'/predict/history/?lat={lat}&lon={lon}&agrupamento=dia&limit=30' for lat, lon in coordenadas]
+        resultado['history_dia'] = _metricas_carga(*await _carga(cliente, caminhos, concorrencia))
+
+        # Viewports variados do Brasil, no zoom em que o mapa abre e um pouco mais próximo
+        caminhos = [f'/estacoes/geojson?zoom={4 + i % 3}&bbox={lon - 8},{lat - 6},{lon + 8},{lat + 6}'
+                    for i, (lat, lon) in enumerate(coordenadas)]
+        resultado['geojson'] = _metricas_carga(*await _carga(cliente, caminhos, concorrencia))
+
+        caminhos = ['/risk/snapshot'] * requisicoes
+        resultado['snapshot'] = _metricas_carga(*await _carga(cliente, caminhos, concorrencia))
+
+        # Previsão horária servida pelo stub local via HTTP: primeiro com o cache vazio, depois do cache
+        stub, services.weather.WEATHER_API_URL = iniciar_stub()
+        try:
+            caminhos = [f'/predict/forecast/?lat={lat}&lon={lon}&horas=48' for lat, lon in coordenadas]
+            resultado['forecast_frio'] = _metricas_carga(*await _carga(cliente, caminhos, concorrencia))
+            resultado['forecast'] = _metricas_carga(*await _carga(cliente, caminhos, concorrencia))
+        finally:
+            stub.shutdown()
+    return resultado
+
+
+def executar(requisicoes=300, concorrencia=16):
+    """
+    Teste de carga em processo dos endpoints /estacoes/, /estacoes/geojson, /predict/, /predict/history/
+    (bruto e agrupado por dia), /risk/snapshot e /predict/forecast/ (cache vazio e cheio) via
+    cliente ASGI, com o serviço de clima substituído por um stub determinístico.
+    Os modelos são treinados antes sobre um dataset sintético pequeno, numa pasta temporária.
+    """
+    with tempfile.TemporaryDirectory(prefix='bench_api_') as pasta:
+        with diretorio_de_trabalho(pasta):
+            from core.treino_rf import treinar_modelo_rf
+            from core.treino_xgb import treinar_modelo_xgb
+            from core.treino_lstm import treinar_modelo_lstm
+
+            X, y = dataset_sintetico(os.path.join(pasta, 'inmet'), n_estacoes=2, n_anos=1)
+            treinar_modelo_rf(X, y)
+            treinar_modelo_xgb(X, y)
+            treinar_modelo_lstm(X, y, FEATURES)
+
+            por_endpoint = asyncio.run(_executar_carga(requisicoes, concorrencia))
+
+    resultado = {}
+    for endpoint, metricas in por_endpoint.items():
+        for nome, m in metricas.items():
+            resultado[f"{endpoint}_{nome}"] = m
+    resultado["pico_rss_mb"] = metrica(pico_rss_mb(), 'MB')
+    return resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Teste de carga dos endpoints da API.")
+    parser.add_argument('--requisicoes', type=int, default=300)
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--saida', default=None, help="Arquivo JSON onde gravar as métricas.")
+    args = parser.parse_args()
+    resultado = executar(args.requisicoes, args.concorrencia)
+    if args.saida:
+        salvar_json(resultado, args.saida)
+    else:
+        print(resultado)
@@ -0,0 +1,50 @@
+# --- START OF FILE bench_ingestao.py ---
+import argparse
+import logging
+import os
+import tempfile
+from benchmarks.comum import cronometro, metrica, pico_rss_mb, salvar_json
+from benchmarks.gerador_inmet import gera_dados_inmet
+from prepara_dados import processa_arquivos_inmet
+
+
+def executar(n_estacoes=4, n_anos=2):
+    """
+    Mede a vazão de `processa_arquivos_inmet` (linhas/s) e o pico de RSS
+    sobre N estações x Y anos de arquivos INMET sintéticos.
+    """
+    with tempfile.TemporaryDirectory(prefix='bench_ingestao_') as pasta:
+        arquivos, total_linhas, _ = gera_dados_inmet(pasta, n_estacoes, n_anos)
+        rss_antes = pico_rss_mb()
+
+        # O logging de cada arquivo não faz parte do que queremos medir
+        logging.disable(logging.INFO)
+        try:
+            with cronometro() as t:
+                df_inmet = processa_arquivos_inmet(pasta)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        tamanho_mb = sum(os.path.getsize(a) for a in arquivos) / (1024 * 1024)
+
+    return {
+        "linhas_por_s": metrica(total_linhas / t['segundos'], 'linhas/s', 'maior'),
+        "mb_por_s": metrica(tamanho_mb / t['segundos'], 'MB/s', 'maior'),
+        "segundos": metrica(t['segundos'], 's'),
+        "linhas_validas": metrica(len(df_inmet), 'linhas', 'maior'),
+        "pico_rss_mb": metrica(pico_rss_mb(), 'MB'),
+        "incremento_rss_mb": metrica(pico_rss_mb() - rss_antes, 'MB'),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de ingestão dos arquivos INMET.")
+    parser.add_argument('--estacoes', type=int, default=4)
+    parser.add_argument('--anos', type=int, default=2)
+    parser.add_argument('--saida', default=None, help="Arquivo JSON onde gravar as métricas.")
+    args = parser.parse_args()
+    resultado = executar(args.estacoes, args.anos)
+    if args.saida:
+        salvar_json(resultado, args.saida)
+    else:
+        print(resultado)
@@ -0,0 +1,72 @@
+# --- START OF FILE bench_treino.py ---
+import argparse
+import logging
+import os
+import tempfile
+import numpy as np
+from benchmarks.comum import cronometro, diretorio_de_trabalho, metrica, pico_rss_mb, salvar_json
+from benchmarks.gerador_inmet import gera_dados_inmet
+from prepara_dados import processa_arquivos_inmet
+from core.treino_rf import treinar_modelo_rf
+from core.treino_xgb import treinar_modelo_xgb
+from core.treino_lstm import treinar_modelo_lstm
+
+FEATURES = ['Temperatura', 'Umidade', 'Vento', 'Precipitacao']
+
+
+def dataset_sintetico(pasta, n_estacoes=4, n_anos=2):
+    """
+    Gera arquivos INMET sintéticos, processa com `processa_arquivos_inmet` e devolve X, y
+    no mesmo formato que `treinamento_acelerado` entrega aos treinadores.
+    O rótulo 'Enchente' é fixo por estação (como na base da ANA), alternando entre 0 e 1.
+    """
+    gera_dados_inmet(pasta, n_estacoes, n_anos)
+    logging.disable(logging.INFO)
+    try:
+        df = processa_arquivos_inmet(pasta)
+    finally:
+        logging.disable(logging.NOTSET)
+    codigos = sorted(df['CODIGOESTACAO'].unique())
+    rotulos = {codigo: i % 2 for i, codigo in enumerate(codigos)}
+    y = df['CODIGOESTACAO'].map(rotulos).values.astype(int)
+    X = df[FEATURES].values
+    return X, y
+
+
+def executar(n_estacoes=4, n_anos=2):
+    """Mede o tempo de parede de cada treinador (RF, XGBoost e LSTM) sobre as mesmas linhas."""
+    with tempfile.TemporaryDirectory(prefix='bench_treino_') as pasta:
+        X, y = dataset_sintetico(os.path.join(pasta, 'inmet'), n_estacoes, n_anos)
+        resultado = {"linhas": metrica(len(X), 'linhas', 'maior')}
+
+        # Os treinadores salvam os artefatos no diretório atual
+        with diretorio_de_trabalho(pasta, vincular=()):
+            with cronometro() as t:
+                treinar_modelo_rf(X, y)
+            resultado["rf_segundos"] = metrica(t['segundos'], 's')
+
+            with cronometro() as t:
+                treinar_modelo_xgb(X, y)
+            resultado["xgb_segundos"] = metrica(t['segundos'], 's')
+
+            with cronometro() as t:
+                treinar_modelo_lstm(X, y, FEATURES)
+            resultado["lstm_segundos"] = metrica(t['segundos'], 's')
+
+    total = resultado["rf_segundos"]["valor"] + resultado["xgb_segundos"]["valor"] + resultado["lstm_segundos"]["valor"]
+    resultado["linhas_por_s_total"] = metrica(len(X) / total, 'linhas/s', 'maior')
+    resultado["pico_rss_mb"] = metrica(pico_rss_mb(), 'MB')
+    return resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de tempo de treinamento dos modelos.")
+    parser.add_argument('--estacoes', type=int, default=4)
+    parser.add_argument('--anos', type=int, default=2)
+    parser.add_argument('--saida', default=None, help="Arquivo JSON onde gravar as métricas.")
+    args = parser.parse_args()
+    resultado = executar(args.estacoes, args.anos)
+    if args.saida:
+        salvar_json(resultado, args.saida)
+    else:
+        print(resultado)
@@ -0,0 +1,176 @@
+# --- START OF FILE bench_workers.py ---
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks.comum import RAIZ_BACKEND, ambiente, diretorio_de_trabalho, metrica, salvar_json
+from benchmarks.bench_treino import FEATURES, dataset_sintetico
+from benchmarks.stub_weatherapi import iniciar_stub
+
+
+def memoria_processo(pid):
+    """RSS, PSS (memória compartilhada dividida entre os processos) e memória privada, em MB (Linux)."""
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for linha in f:
+            partes = linha.split()
+            if len(partes) >= 2 and partes[0].endswith(':') and partes[1].isdigit():
+                valores[partes[0][:-1]] = int(partes[1]) / 1024
+    return {
+        "rss_mb": valores.get('Rss', 0),
+        "pss_mb": valores.get('Pss', 0),
+        "privada_mb": valores.get('Private_Clean', 0) + valores.get('Private_Dirty', 0),
+    }
+
+
+def filhos(pid):
+    """Processos filhos de `pid` que são workers (ignora o resource_tracker do multiprocessing)."""
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        pids = [int(p) for p in f.read().split()]
+    workers = []
+    for filho in pids:
+        with open(f'/proc/{filho}/cmdline', 'rb') as f:
+            if b'resource_tracker' not in f.read():
+                workers.append(filho)
+    return workers
+
+
+async def _carga(url, caminhos, concorrencia):
+    import httpx
+    fila = list(reversed(caminhos))
+    latencias = []
+
+    async with httpx.AsyncClient(base_url=url, timeout=60) as cliente:
+        async def trabalhador():
+            while fila:
+                caminho = fila.pop()
+                inicio = time.perf_counter()
+                resposta = await cliente.get(caminho)
+                resposta.raise_for_status()
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+        return np.array(latencias), time.perf_counter() - inicio
+
+
+def _aguardar_servidor(url, processo, limite=120):
+    import httpx
+    fim = time.time() + limite
+    while time.time() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError("servidor.py terminou antes de ficar pronto.")
+        try:
+            if httpx.get(f'{url}/estacoes/', timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Tempo esgotado esperando o servidor.py.")
+
+
+def medir(workers, pasta, url_clima, porta, requisicoes, concorrencia, coordenadas, modo='servidor'):
+    """
+    Sobe a API com N workers, mede a memória de cada processo e a vazão de /predict/.
+    modo='servidor' usa o servidor.py (modelos compartilhados); modo='uvicorn' usa
+    `uvicorn --workers N`, em que cada worker carrega sua própria cópia dos modelos.
+    """
+    env = dict(os.environ, WEATHER_API_URL=url_clima, WEATHER_API_KEY='stub', RISCO_INTERVALO_SEGUNDOS='0')
+    if modo == 'servidor':
+        comando = [sys.executable, os.path.join(RAIZ_BACKEND, 'servidor.py'), '--workers', str(workers), '--port', str(porta)]
+    else:
+        comando = [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', RAIZ_BACKEND,
+                   '--workers', str(workers), '--port', str(porta), '--log-level', 'warning']
+    processo = subprocess.Popen(comando, cwd=pasta, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{porta}'
+    try:
+        _aguardar_servidor(url, processo)
+        caminhos = [f'/predict/?lat={lat}&lon={lon}' for lat, lon in coordenadas[:requisicoes]]
+        asyncio.run(_carga(url, caminhos[:concorrencia * 2], concorrencia)) # aquecimento
+        latencias, duracao = asyncio.run(_carga(url, caminhos, concorrencia))
+
+        pai = memoria_processo(processo.pid)
+        memorias = [memoria_processo(pid) for pid in filhos(processo.pid)]
+        if not memorias:
+            # uvicorn com 1 worker atende no próprio processo principal
+            pai, memorias = {"rss_mb": 0, "pss_mb": 0}, [pai]
+        return {
+            "modo": modo,
+            "workers": workers,
+            "req_por_s": metrica(len(latencias) / duracao, 'req/s', 'maior'),
+            "p50_ms": metrica(np.percentile(latencias, 50) * 1000, 'ms'),
+            "p95_ms": metrica(np.percentile(latencias, 95) * 1000, 'ms'),
+            "rss_pai_mb": metrica(pai['rss_mb'], 'MB'),
+            "rss_por_worker_mb": metrica(np.mean([m['rss_mb'] for m in memorias]), 'MB'),
+            "privada_por_worker_mb": metrica(np.mean([m['privada_mb'] for m in memorias]), 'MB'),
+            # Soma das PSS de todos os processos = memória física realmente ocupada pelo servidor
+            "pss_total_mb": metrica(pai['pss_mb'] + sum(m['pss_mb'] for m in memorias), 'MB'),
+            "rss_somado_mb": metrica(pai['rss_mb'] + sum(m['rss_mb'] for m in memorias), 'MB'),
+        }
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+def executar(lista_workers=(1, 2, 4), requisicoes=400, concorrencia=16, n_estacoes=4, n_anos=1, porta=8765,
+             modos=('servidor', 'uvicorn')):
+    """
+    Curva de escala do servidor.py: para cada número de workers, memória por worker
+    (RSS, privada e PSS total) e vazão de /predict/ com o clima servido pelo stub local.
+    """
+    import pandas as pd
+    with tempfile.TemporaryDirectory(prefix='bench_workers_') as pasta:
+        with diretorio_de_trabalho(pasta):
+            from core.treino_rf import treinar_modelo_rf
+            from core.treino_xgb import treinar_modelo_xgb
+            from core.treino_lstm import treinar_modelo_lstm
+
+            X, y = dataset_sintetico(os.path.join(pasta, 'inmet'), n_estacoes, n_anos)
+            treinar_modelo_rf(X, y)
+            treinar_modelo_xgb(X, y)
+            treinar_modelo_lstm(X, y, FEATURES)
+            tamanho_modelos = sum(os.path.getsize(a) for a in ('modelo_rf.pkl', 'modelo_xgb.pkl', 'modelo_lstm.pth')) / (1024 * 1024)
+
+        catalogo = pd.read_csv(os.path.join(RAIZ_BACKEND, 'dados', 'catalogoestacoesautomaticas.csv'), sep=';', decimal=',')
+        coordenadas = list(zip(catalogo['VL_LATITUDE'], catalogo['VL_LONGITUDE']))
+        coordenadas = [coordenadas[i % len(coordenadas)] for i in range(requisicoes)]
+
+        stub, url_clima = iniciar_stub()
+        try:
+            curva = [medir(w, pasta, url_clima, porta, requisicoes, concorrencia, coordenadas, modo)
+                     for modo in modos for w in lista_workers]
+        finally:
+            stub.shutdown()
+
+    return {"ambiente": ambiente(), "linhas_treino": len(X), "artefatos_mb": round(tamanho_modelos, 1), "curva": curva}
+
+
+def imprimir_tabela(resultado):
+    print(f"Artefatos dos modelos: {resultado['artefatos_mb']} MB ({resultado['linhas_treino']} linhas de treino), "
+          f"{resultado['ambiente']['cpus']} CPU(s)")
+    print("| modo | workers | req/s | p50 (ms) | RSS por worker (MB) | privada por worker (MB) | PSS total (MB) | RSS somado (MB) |")
+    print("|---|---|---|---|---|---|---|---|")
+    for c in resultado['curva']:
+        print(f"| {c['modo']} | {c['workers']} | {c['req_por_s']['valor']:.1f} | {c['p50_ms']['valor']:.1f} | {c['rss_por_worker_mb']['valor']:.0f} | "
+              f"{c['privada_por_worker_mb']['valor']:.0f} | {c['pss_total_mb']['valor']:.0f} | {c['rss_somado_mb']['valor']:.0f} |")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Curva de memória e vazão do servidor.py por número de workers (Linux).")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requisicoes', type=int, default=400)
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--estacoes', type=int, default=4)
+    parser.add_argument('--anos', type=int, default=1)
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--modos', nargs='+', choices=['servidor', 'uvicorn'], default=['servidor', 'uvicorn'])
+    parser.add_argument('--saida', default=None, help="Arquivo JSON onde gravar a curva.")
+    args = parser.parse_args()
+    resultado = executar(args.workers, args.requisicoes, args.concorrencia, args.estacoes, args.anos, args.porta, args.modos)
+    if args.saida:
+        salvar_json(resultado, args.saida)
+    imprimir_tabela(resultado)
@@ -0,0 +1,115 @@
+# --- START OF FILE comum.py ---
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+# Os benchmarks trocam o diretório de trabalho para uma pasta temporária (o código do back-end
+# usa caminhos relativos como 'database.db'), então a raiz do back-end precisa estar no sys.path.
+RAIZ_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ_BACKEND not in sys.path:
+    sys.path.insert(0, RAIZ_BACKEND)
+
+
+def pico_rss_mb():
+    """Pico de memória residente (RSS) do processo atual, em MB."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # No Linux o valor vem em KB, no macOS em bytes
+    if sys.platform == 'darwin':
+        return maxrss / (1024 * 1024)
+    return maxrss / 1024
+
+
+@contextmanager
+def cronometro():
+    """Mede o tempo de parede de um bloco. Uso: `with cronometro() as t: ...; t['segundos']`."""
+    resultado = {}
+    inicio = time.perf_counter()
+    try:
+        yield resultado
+    finally:
+        resultado['segundos'] = time.perf_counter() - inicio
+
+
+@contextmanager
+def diretorio_de_trabalho(pasta, vincular=('dados',)):
+    """
+    Executa o bloco com `pasta` como diretório de trabalho, para que 'database.db' e os
+    artefatos dos modelos sejam gravados fora do repositório. Os itens de `vincular`
+    (ex.: a pasta 'dados' com o catálogo de estações) são ligados por symlink.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    for nome in vincular:
+        destino = os.path.join(pasta, nome)
+        if not os.path.exists(destino):
+            os.symlink(os.path.join(RAIZ_BACKEND, nome), destino)
+    anterior = os.getcwd()
+    os.chdir(pasta)
+    try:
+        yield pasta
+    finally:
+        os.chdir(anterior)
+
+
+def metrica(valor, unidade, melhor='menor'):
+    """Representa uma métrica de benchmark. `melhor` indica se valores 'maior' ou 'menor' são melhores."""
+    return {"valor": round(float(valor), 6), "unidade": unidade, "melhor": melhor}
+
+
+def ambiente():
+    """Metadados da máquina, para saber se os resultados são comparáveis com a baseline."""
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "processador": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def salvar_json(dados, caminho):
+    with open(caminho, 'w') as f:
+        json.dump(dados, f, indent=4, ensure_ascii=False)
+
+
+def carregar_json(caminho):
+    with open(caminho, 'r') as f:
+        return json.load(f)
+
+
+def comparar_com_baseline(resultados, baseline, tolerancia=0.25):
+    """
+    Compara cada métrica dos resultados com a baseline.
+    Uma métrica regrediu se piorou mais do que `tolerancia` (fração) na direção indicada por 'melhor'.
+    Retorna a lista de comparações e a lista de regressões.
+    """
+    comparacoes = []
+    regressoes = []
+    for bench, metricas in resultados.get("benchmarks", {}).items():
+        metricas_base = baseline.get("benchmarks", {}).get(bench, {})
+        for nome, m in metricas.items():
+            base = metricas_base.get(nome)
+            if base is None:
+                continue
+            if base["valor"] == 0:
+                # Sem variação relativa possível (ex.: 'erros'); qualquer valor pior que zero é regressão
+                variacao = None
+                piorou = m["valor"] > 0 if m["melhor"] == 'menor' else False
+            else:
+                variacao = round((m["valor"] - base["valor"]) / base["valor"], 4)
+                piorou = variacao > tolerancia if m["melhor"] == 'menor' else variacao < -tolerancia
+            item = {
+                "benchmark": bench,
+                "metrica": nome,
+                "baseline": base["valor"],
+                "atual": m["valor"],
+                "unidade": m["unidade"],
+                "variacao": variacao,
+                "regressao": piorou,
+            }
+            comparacoes.append(item)
+            if piorou:
+                regressoes.append(item)
+    return comparacoes, regressoes
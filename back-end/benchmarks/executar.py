@@ -0,0 +1,93 @@
+# --- START OF FILE executar.py ---
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from benchmarks.comum import RAIZ_BACKEND, ambiente, carregar_json, comparar_com_baseline, salvar_json
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_BASELINE = os.path.join(PASTA_BENCHMARKS, 'baseline.json')
+
+# Cada benchmark roda em um subprocesso próprio, para que o pico de RSS de um não contamine o outro
+BENCHMARKS = {
+    'ingestao': ['benchmarks.bench_ingestao', '--estacoes', '{estacoes}', '--anos', '{anos}'],
+    'treino': ['benchmarks.bench_treino', '--estacoes', '{estacoes}', '--anos', '{anos}'],
+    'api': ['benchmarks.bench_api', '--requisicoes', '{requisicoes}', '--concorrencia', '{concorrencia}'],
+}
+
+
+def rodar_benchmark(nome, parametros):
+    """Executa um benchmark em subprocesso e devolve as métricas gravadas por ele em JSON."""
+    with tempfile.TemporaryDirectory(prefix='bench_') as pasta:
+        saida = os.path.join(pasta, f'{nome}.json')
+        comando = [sys.executable, '-m'] + [arg.format(**parametros) for arg in BENCHMARKS[nome]] + ['--saida', saida]
+        print(f"INFO: Executando benchmark '{nome}'...")
+        processo = subprocess.run(comando, cwd=RAIZ_BACKEND, capture_output=True, text=True)
+        if processo.returncode != 0 or not os.path.exists(saida):
+            print(processo.stdout[-2000:])
+            print(processo.stderr[-2000:])
+            raise RuntimeError(f"Benchmark '{nome}' falhou (código {processo.returncode}).")
+        return carregar_json(saida)
+
+
+def imprimir_comparacao(comparacoes):
+    for c in comparacoes:
+        marcador = 'REGRESSAO' if c['regressao'] else 'ok'
+        variacao = 'n/a' if c['variacao'] is None else f"{c['variacao']:+.1%}"
+        print(f"  [{marcador:>9}] {c['benchmark']}.{c['metrica']}: {c['baseline']:.4g} -> {c['atual']:.4g} {c['unidade']} ({variacao})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Executa a suíte de benchmarks e compara com a baseline.")
+    parser.add_argument('--apenas', nargs='*', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--estacoes', type=int, default=4)
+    parser.add_argument('--anos', type=int, default=2)
+    parser.add_argument('--requisicoes', type=int, default=300)
+    parser.add_argument('--concorrencia', type=int, default=16)
+    parser.add_argument('--saida', default='resultados_benchmark.json')
+    parser.add_argument('--baseline', default=CAMINHO_BASELINE)
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="Piora relativa aceita antes de acusar regressão.")
+    parser.add_argument('--atualizar-baseline', action='store_true', help="Grava os resultados como nova baseline.")
+    args = parser.parse_args()
+
+    parametros = {
+        'estacoes': args.estacoes,
+        'anos': args.anos,
+        'requisicoes': args.requisicoes,
+        'concorrencia': args.concorrencia,
+    }
+    resultados = {
+        "data": datetime.now().isoformat(timespec='seconds'),
+        "ambiente": ambiente(),
+        "parametros": parametros,
+        "benchmarks": {nome: rodar_benchmark(nome, parametros) for nome in args.apenas},
+    }
+    salvar_json(resultados, args.saida)
+    print(f"INFO: Resultados salvos em '{args.saida}'.")
+
+    if args.atualizar_baseline:
+        salvar_json(resultados, args.baseline)
+        print(f"INFO: Baseline atualizada em '{args.baseline}'.")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"AVISO: Baseline '{args.baseline}' não encontrada. Use --atualizar-baseline para criá-la.")
+        return 0
+
+    baseline = carregar_json(args.baseline)
+    if baseline.get("parametros") != parametros:
+        print("AVISO: Parâmetros diferentes dos usados na baseline; a comparação pode não ser significativa.")
+    comparacoes, regressoes = comparar_com_baseline(resultados, baseline, args.tolerancia)
+    print("Comparação com a baseline:")
+    imprimir_comparacao(comparacoes)
+    if regressoes:
+        print(f"ERRO: {len(regressoes)} métrica(s) regrediram mais de {args.tolerancia:.0%}.")
+        return 1
+    print("INFO: Nenhuma regressão em relação à baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# --- START OF FILE gerador_inmet.py ---
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+# Cabeçalho exatamente como nos arquivos do INMET (linha 9 do arquivo, com ';' no final)
+COLUNAS_INMET = [
+    'DATA (YYYY-MM-DD)',
+    'HORA (UTC)',
+    'PRECIPITAÇÃO TOTAL, HORÁRIO (mm)',
+    'PRESSAO ATMOSFERICA AO NIVEL DA ESTACAO, HORARIA (mB)',
+    'PRESSÃO ATMOSFERICA MAX.NA HORA ANT. (AUT) (mB)',
+    'PRESSÃO ATMOSFERICA MIN. NA HORA ANT. (AUT) (mB)',
+    'RADIACAO GLOBAL (KJ/m²)',
+    'TEMPERATURA DO AR - BULBO SECO, HORARIA (°C)',
+    'TEMPERATURA DO PONTO DE ORVALHO (°C)',
+    'TEMPERATURA MÁXIMA NA HORA ANT. (AUT) (°C)',
+    'TEMPERATURA MÍNIMA NA HORA ANT. (AUT) (°C)',
+    'TEMPERATURA ORVALHO MAX. NA HORA ANT. (AUT) (°C)',
+    'TEMPERATURA ORVALHO MIN. NA HORA ANT. (AUT) (°C)',
+    'UMIDADE REL. MAX. NA HORA ANT. (AUT) (%)',
+    'UMIDADE REL. MIN. NA HORA ANT. (AUT) (%)',
+    'UMIDADE RELATIVA DO AR, HORARIA (%)',
+    'VENTO, DIREÇÃO HORARIA (gr) (° (gr))',
+    'VENTO, RAJADA MAXIMA (m/s)',
+    'VENTO, VELOCIDADE HORARIA (m/s)',
+]
+
+CAMINHO_CATALOGO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dados', 'catalogoestacoesautomaticas.csv')
+
+
+def _estacoes_do_catalogo(n_estacoes):
+    """
+    Retorna (codigo, nome, uf, lat, lon) das primeiras estações do catálogo do INMET.
+    Se forem pedidas mais estações do que existem no catálogo, gera códigos sintéticos.
+    """
+    estacoes = []
+    if os.path.exists(CAMINHO_CATALOGO):
+        df_catalogo = pd.read_csv(CAMINHO_CATALOGO, sep=';', decimal=',', encoding='latin1')
+        for _, row in df_catalogo.head(n_estacoes).iterrows():
+            estacoes.append((str(row['CD_ESTACAO']), row['DC_NOME'], row['SG_ESTADO'], row['VL_LATITUDE'], row['VL_LONGITUDE']))
+    for i in range(len(estacoes), n_estacoes):
+        estacoes.append((f"S{i:04d}", f"SINTETICA {i}", 'XX', -15.0, -47.0))
+    return estacoes
+
+
+def _formata_decimal(valores, casas=1):
+    """Formata um array numérico no padrão do INMET: vírgula como separador decimal e -9999 como ausente."""
+    texto = np.char.mod(f'%.{casas}f', np.round(valores, casas))
+    texto = np.char.replace(texto, '.', ',')
+    return np.where(np.isnan(valores), '-9999', texto)
+
+
+def gera_arquivo_inmet(pasta, codigo, nome, uf, lat, lon, ano, rng, taxa_ausentes=0.02):
+    """
+    Gera um arquivo CSV horário de um ano no mesmo layout que `processa_arquivos_inmet` lê:
+    8 linhas de metadados, a linha de cabeçalho e os dados separados por ';' em latin1.
+    """
+    horas = pd.date_range(f'{ano}-01-01 00:00', f'{ano}-12-31 23:00', freq='h')
+    n = len(horas)
+    dia_do_ano = horas.dayofyear.values
+    hora = horas.hour.values
+
+    # Séries com sazonalidade diária/anual simples, suficientes para o custo de parsing e treino
+    temperatura = 22 + 5 * np.sin(2 * np.pi * (hora - 9) / 24) + 3 * np.cos(2 * np.pi * dia_do_ano / 365) + rng.normal(0, 1.5, n)
+    umidade = np.clip(70 - 2.5 * (temperatura - 22) + rng.normal(0, 8, n), 5, 100)
+    vento = np.abs(rng.normal(2.5, 1.2, n))
+    precipitacao = np.where(rng.random(n) < 0.08, rng.gamma(0.8, 4.0, n), 0.0)
+    pressao = 886 + rng.normal(0, 2, n)
+    radiacao = np.where((hora >= 9) & (hora <= 21), np.abs(rng.normal(1500, 600, n)), np.nan)
+
+    colunas = {
+        'precipitacao': precipitacao, 'pressao': pressao, 'temperatura': temperatura,
+        'umidade': np.round(umidade), 'vento': vento, 'radiacao': radiacao,
+    }
+    # Simula as falhas de sensor que o INMET marca com -9999
+    for valores in colunas.values():
+        valores[rng.random(n) < taxa_ausentes] = np.nan
+
+    df = pd.DataFrame({
+        0: horas.strftime('%Y-%m-%d'),
+        1: horas.strftime('%H:%M'),
+        2: _formata_decimal(colunas['precipitacao']),
+        3: _formata_decimal(colunas['pressao']),
+        4: _formata_decimal(colunas['pressao'] + 0.3),
+        5: _formata_decimal(colunas['pressao'] - 0.3),
+        6: _formata_decimal(colunas['radiacao']),
+        7: _formata_decimal(colunas['temperatura']),
+        8: _formata_decimal(colunas['temperatura'] - 3),
+        9: _formata_decimal(colunas['temperatura'] + 0.5),
+        10: _formata_decimal(colunas['temperatura'] - 0.5),
+        11: _formata_decimal(colunas['temperatura'] - 2.5),
+        12: _formata_decimal(colunas['temperatura'] - 3.5),
+        13: _formata_decimal(colunas['umidade'], 0),
+        14: _formata_decimal(colunas['umidade'] - 2, 0),
+        15: _formata_decimal(colunas['umidade'], 0),
+        16: _formata_decimal(rng.uniform(0, 360, n), 0),
+        17: _formata_decimal(colunas['vento'] * 2),
+        18: _formata_decimal(colunas['vento']),
+        # O INMET termina cada linha com ';', o que gera uma coluna vazia extra
+        19: '',
+    })
+
+    nome_arquivo = f"INMET_XX_{uf}_{codigo}_{nome.replace(' ', '_')}_01-01-{ano}_A_31-12-{ano}.CSV"
+    caminho = os.path.join(pasta, nome_arquivo)
+    metadados = [
+        "REGIÃO:;XX",
+        f"UF:;{uf}",
+        f"ESTAÇÃO:;{nome}",
+        f"CODIGO (WMO):;{codigo}",
+        f"LATITUDE:;{str(lat).replace('.', ',')}",
+        f"LONGITUDE:;{str(lon).replace('.', ',')}",
+        "ALTITUDE:;1000",
+        "DATA DE FUNDAÇÃO (YYYY-MM-DD):;2000-01-01",
+        ';'.join(COLUNAS_INMET) + ';',
+    ]
+    with open(caminho, 'w', encoding='latin1', newline='') as f:
+        f.write('\n'.join(metadados) + '\n')
+        df.to_csv(f, sep=';', header=False, index=False, lineterminator='\n')
+    return caminho, n
+
+
+def gera_dados_inmet(pasta, n_estacoes=4, n_anos=2, ano_inicial=2010, semente=42):
+    """
+    Gera N estações x Y anos de arquivos INMET sintéticos em `pasta`.
+    Retorna a lista de arquivos, o total de linhas e as estações usadas.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    estacoes = _estacoes_do_catalogo(n_estacoes)
+    arquivos = []
+    total_linhas = 0
+    for codigo, nome, uf, lat, lon in estacoes:
+        for ano in range(ano_inicial, ano_inicial + n_anos):
+            caminho, n = gera_arquivo_inmet(pasta, codigo, nome, uf, lat, lon, ano, rng)
+            arquivos.append(caminho)
+            total_linhas += n
+    return arquivos, total_linhas, estacoes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera arquivos INMET sintéticos para benchmarks.")
+    parser.add_argument('pasta')
+    parser.add_argument('--estacoes', type=int, default=4)
+    parser.add_argument('--anos', type=int, default=2)
+    parser.add_argument('--ano-inicial', type=int, default=2010)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args()
+    arquivos, total_linhas, _ = gera_dados_inmet(args.pasta, args.estacoes, args.anos, args.ano_inicial, args.semente)
+    print(f"INFO: {len(arquivos)} arquivos gerados em '{args.pasta}' ({total_linhas} linhas).")
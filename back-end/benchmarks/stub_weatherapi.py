@@ -0,0 +1,127 @@
+# --- START OF FILE stub_weatherapi.py ---
+# Servidor HTTP local que imita a weatherapi.com, para benchmarks e desenvolvimento sem rede.
+# Aponte o back-end para ele com: export WEATHER_API_URL=http://127.0.0.1:<porta>/v1
+import argparse
+import copy
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+
+def clima_atual(lat, lon):
+    """Resposta determinística de current.json para uma coordenada."""
+    semente = int(abs(lat * 1000) + abs(lon * 1000)) % (2 ** 32)
+    rng = np.random.default_rng(semente)
+    return {
+        "location": {"lat": lat, "lon": lon},
+        "current": {
+            "temp_c": round(float(rng.uniform(15, 35)), 1),
+            "humidity": int(rng.uniform(30, 100)),
+            "wind_kph": round(float(rng.uniform(0, 30)), 1),
+            "precip_mm": round(float(rng.gamma(0.8, 4.0)), 1),
+        },
+    }
+
+
+# Resposta de forecast.json (3 dias, formato da weatherapi.com) usada como gravação
+ARQUIVO_FIXTURE_PREVISAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'forecast_brasilia.json')
+_fixture_previsao = None
+
+
+def previsao(lat, lon, dias=3, agora=None):
+    """
+    Resposta de forecast.json para uma coordenada: a gravação da fixture, com os horários
+    deslocados para que a última atualização caia na hora atual (mantendo os minutos).
+    """
+    global _fixture_previsao
+    if _fixture_previsao is None:
+        with open(ARQUIVO_FIXTURE_PREVISAO) as f:
+            _fixture_previsao = json.load(f)
+    dados = copy.deepcopy(_fixture_previsao)
+    agora = int(agora if agora is not None else time.time())
+    gravado = dados['current']['last_updated_epoch']
+    deslocamento = (agora - agora % 3600) - (gravado - gravado % 3600)
+    fuso = timezone(timedelta(hours=-3)) # America/Sao_Paulo, sem horário de verão
+
+    def formatar(epoch):
+        return datetime.fromtimestamp(epoch, fuso).strftime('%Y-%m-%d %H:%M')
+
+    dados['location'].update(lat=lat, lon=lon)
+    for bloco, chave in ((dados['location'], 'localtime'), (dados['current'], 'last_updated')):
+        bloco[f'{chave}_epoch'] += deslocamento
+        bloco[chave] = formatar(bloco[f'{chave}_epoch'])
+    dados['forecast']['forecastday'] = dados['forecast']['forecastday'][:max(1, dias)]
+    for dia in dados['forecast']['forecastday']:
+        dia['date_epoch'] += deslocamento
+        dia['date'] = datetime.fromtimestamp(dia['date_epoch'], timezone.utc).strftime('%Y-%m-%d')
+        for hora in dia['hour']:
+            hora['time_epoch'] += deslocamento
+            hora['time'] = formatar(hora['time_epoch'])
+    return dados
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        try:
+            lat, lon = (float(v) for v in params['q'][0].split(','))
+        except (KeyError, ValueError):
+            self._responder(400, {"error": {"code": 1006, "message": "No location found matching parameter 'q'"}})
+            return
+        if url.path.endswith('/current.json'):
+            self._responder(200, clima_atual(lat, lon))
+        elif url.path.endswith('/forecast.json'):
+            self._responder(200, previsao(lat, lon, int(params.get('days', ['1'])[0])))
+        else:
+            self._responder(404, {"error": {"message": "Endpoint não simulado."}})
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def iniciar_stub(host='127.0.0.1', port=0):
+    """Inicia o stub numa thread de fundo. Retorna (servidor, url_base) - use servidor.shutdown() para parar."""
+    servidor = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}/v1"
+
+
+def gravar_previsao(lat, lon, caminho=ARQUIVO_FIXTURE_PREVISAO):
+    """Grava como fixture a resposta real de forecast.json (3 dias) da weatherapi.com para a coordenada."""
+    import requests
+    chave = os.environ["WEATHER_API_KEY"]
+    resposta = requests.get("http://api.weatherapi.com/v1/forecast.json",
+                            params={"key": chave, "q": f"{lat},{lon}", "days": 3, "aqi": "no", "alerts": "no"}, timeout=30)
+    resposta.raise_for_status()
+    with open(caminho, 'w') as f:
+        json.dump(resposta.json(), f, indent=1, ensure_ascii=False)
+    print(f"INFO: Previsão de {lat},{lon} gravada em '{caminho}'.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor local que imita a weatherapi.com.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--gravar', metavar='LAT,LON', default=None,
+                        help="Em vez de servir, grava a fixture de previsão a partir da weatherapi.com real (requer WEATHER_API_KEY).")
+    args = parser.parse_args()
+    if args.gravar:
+        gravar_previsao(*(float(v) for v in args.gravar.split(',')))
+    else:
+        servidor = ThreadingHTTPServer((args.host, args.port), _Handler)
+        print(f"INFO: Stub da weatherapi.com em http://{args.host}:{args.port}/v1")
+        servidor.serve_forever()
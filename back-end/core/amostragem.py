@@ -0,0 +1,187 @@
+# --- START OF FILE amostragem.py ---
+# Amostragem estratificada da tabela 'clima' para o treinamento.
+#
+# A amostra é balanceada por estação (cada estação recebe a mesma cota), por mês dentro de
+# cada estação e mantém a proporção de 'Enchente' dentro de cada mês. As contagens por estrato
+# vêm de uma agregação no próprio SQLite; as linhas são lidas numa única passada com fetchmany,
+# e em cada estrato ficam as `cota` linhas com menor prioridade (hash do id com a semente).
+# O resultado é determinístico para a mesma semente e não depende da ordem de leitura.
+# Com a 'clima' particionada por UF (core/database.py), cada shard é contado e lido em paralelo.
+import hashlib
+import json
+import math
+import sqlite3
+import numpy as np
+import pandas as pd
+import core.database as database
+
+COLUNAS_TREINO = ['Temperatura', 'Umidade', 'Vento', 'Precipitacao', 'Enchente']
+
+# Perfis de treinamento: 'rapido' para desenvolvimento, 'completo' para produção (sem amostragem)
+PERFIS_AMOSTRAGEM = {
+    'rapido': {"linhas": 200_000, "semente": 42},
+    'completo': {"linhas": None, "semente": 42},
+}
+
+TAMANHO_LOTE_PADRAO = 50_000
+
+# Mês normalizado a partir da coluna Data, que pode vir como '2001-01-01' ou '2019/01/01'
+_SQL_MES = "replace(substr(Data, 1, 7), '/', '-')"
+# Classe binária de enchente: o rótulo vem de CHEIAS_201 da ANA, que vai de 0 a 3 (número de cheias)
+_SQL_CLASSE = "(Enchente > 0)"
+
+
+def _prioridade(ids, semente):
+    """Hash (splitmix64) de cada id com a semente: uma ordem pseudoaleatória estável das linhas."""
+    with np.errstate(over='ignore'):
+        x = ids.astype(np.uint64) + np.uint64(semente) * np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def _distribuir(capacidades, total):
+    """
+    Divide `total` em partes iguais entre as chaves, sem passar da capacidade de cada uma;
+    o que sobra das chaves pequenas é redistribuído entre as demais.
+    """
+    cotas = {}
+    restantes = sorted(capacidades, key=capacidades.get)
+    for i, chave in enumerate(restantes):
+        parte = total // (len(restantes) - i)
+        cotas[chave] = min(capacidades[chave], parte)
+        total -= cotas[chave]
+    return cotas
+
+
+def contar_estratos(conn, where="", params=()):
+    """Número de linhas válidas por (estação, mês, Enchente 0 ou 1), calculado pelo SQLite."""
+    linhas = conn.execute(f"""
+        SELECT municipio, {_SQL_MES}, {_SQL_CLASSE}, COUNT(*)
+        FROM clima {where}
+        GROUP BY 1, 2, 3
+    """, params).fetchall()
+    return {(municipio, mes, int(classe)): n for municipio, mes, classe, n in linhas}
+
+
+def calcular_cotas(contagens, linhas):
+    """
+    Cota de cada estrato (estação, mês, Enchente 0 ou 1) para uma amostra de `linhas` linhas.
+    Com `linhas` None (ou maior que o total), todos os estratos são mantidos inteiros.
+    """
+    if linhas is None or linhas >= sum(contagens.values()):
+        return dict(contagens)
+
+    por_estacao, por_mes = {}, {}
+    for (municipio, mes, classe), n in contagens.items():
+        por_estacao[municipio] = por_estacao.get(municipio, 0) + n
+        por_mes.setdefault(municipio, {})
+        por_mes[municipio][mes] = por_mes[municipio].get(mes, 0) + n
+
+    cotas = {}
+    for municipio, cota_estacao in _distribuir(por_estacao, linhas).items():
+        for mes, cota_mes in _distribuir(por_mes[municipio], cota_estacao).items():
+            positivos = contagens.get((municipio, mes, 1), 0)
+            negativos = contagens.get((municipio, mes, 0), 0)
+            # Arredonda para cima a classe positiva (rara), para não perdê-la em meses pequenos
+            cota_pos = min(positivos, math.ceil(cota_mes * positivos / (positivos + negativos)))
+            cotas[(municipio, mes, 1)] = cota_pos
+            cotas[(municipio, mes, 0)] = min(negativos, cota_mes - cota_pos)
+    return {estrato: cota for estrato, cota in cotas.items() if cota > 0}
+
+
+def _hash_cotas(cotas):
+    conteudo = json.dumps(sorted([list(e) + [c] for e, c in cotas.items()]), separators=(',', ':'))
+    return hashlib.sha1(conteudo.encode()).hexdigest()[:12]
+
+
+def _selecionar(caminho, where, cotas, completa, semente, tamanho_lote):
+    """Lê as linhas de um banco numa única passada e mantém, em cada estrato, as `cota` de menor prioridade."""
+    indice_estrato = {estrato: i for i, estrato in enumerate(cotas)}
+    cota_por_indice = np.array([cotas[e] for e in indice_estrato] + [0], dtype=np.int64)
+    conn = sqlite3.connect(caminho)
+    try:
+        # O rótulo sai binário do SQLite, como nas contagens dos estratos
+        colunas_sql = [f"{_SQL_CLASSE} AS Enchente" if c == 'Enchente' else c for c in COLUNAS_TREINO]
+        cursor = conn.execute(
+            f"SELECT id, municipio, {_SQL_MES}, {', '.join(colunas_sql)} FROM clima {where}"
+        )
+        colunas = ['id', 'municipio', 'mes'] + COLUNAS_TREINO
+        mantidas = None
+        lotes = []
+        while True:
+            registros = cursor.fetchmany(tamanho_lote)
+            if not registros:
+                break
+            lote = pd.DataFrame.from_records(registros, columns=colunas)
+            if completa:
+                # Perfil completo: nenhum estrato é cortado, então não há o que ordenar
+                lotes.append(lote)
+                continue
+            chaves = zip(lote['municipio'], lote['mes'], lote['Enchente'].astype(int))
+            lote['estrato'] = np.fromiter((indice_estrato.get(c, -1) for c in chaves), dtype=np.int64, count=len(lote))
+            lote = lote[lote['estrato'] >= 0].drop(columns=['municipio', 'mes'])
+            lote['prioridade'] = _prioridade(lote['id'].values, semente)
+
+            # Mantém, em cada estrato, as linhas de menor prioridade vistas até agora
+            candidatas = lote if mantidas is None else pd.concat([mantidas, lote], ignore_index=True)
+            candidatas = candidatas.sort_values(['estrato', 'prioridade'], kind='stable')
+            posicao = candidatas.groupby('estrato').cumcount().values
+            mantidas = candidatas[posicao < cota_por_indice[candidatas['estrato'].values]]
+    finally:
+        conn.close()
+
+    if lotes:
+        mantidas = pd.concat(lotes, ignore_index=True)
+    if mantidas is None:
+        return pd.DataFrame(columns=COLUNAS_TREINO)
+    return mantidas.sort_values('id')[COLUNAS_TREINO].reset_index(drop=True)
+
+
+def amostrar_clima(caminho_db=None, linhas=None, semente=42, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Amostra estratificada da tabela 'clima' com as colunas de treino (Enchente 0 ou 1).
+    Sem `caminho_db`, lê os bancos da tabela (core/database.py): com a 'clima' particionada por
+    UF, as contagens e a leitura de cada shard correm em paralelo. As cotas continuam globais
+    (o mesmo cotas_sha1 de um banco único): cada estação está inteira num só shard.
+    Retorna (DataFrame, especificacao), em que a especificação descreve a amostra para o manifesto.
+    """
+    caminhos = [caminho_db] if caminho_db else database.bancos('clima')
+    where = "WHERE " + " AND ".join(f"{c} IS NOT NULL" for c in COLUNAS_TREINO)
+
+    def contar(caminho):
+        conn = sqlite3.connect(caminho)
+        try:
+            return contar_estratos(conn, where)
+        finally:
+            conn.close()
+
+    contagens_por_banco = database.em_paralelo(contar, caminhos)
+    contagens = {estrato: n for c in contagens_por_banco for estrato, n in c.items()}
+    cotas = calcular_cotas(contagens, linhas)
+    completa = cotas == contagens
+
+    def selecionar(item):
+        caminho, contagens_banco = item
+        cotas_banco = {estrato: cotas[estrato] for estrato in contagens_banco if estrato in cotas}
+        return _selecionar(caminho, where, cotas_banco, completa, semente, tamanho_lote)
+
+    partes = database.em_paralelo(selecionar, zip(caminhos, contagens_por_banco))
+    partes = [p for p in partes if len(p)]
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS_TREINO)
+
+    total = sum(contagens.values())
+    especificacao = {
+        "fonte": f"{caminhos[0]}:clima" if len(caminhos) == 1 else f"{database.PASTA_SHARDS}:clima ({len(caminhos)} shards por UF)",
+        "linhas_alvo": linhas,
+        "linhas_disponiveis": total,
+        "linhas_amostradas": len(df),
+        "semente": semente,
+        "estratificacao": ["municipio", "mes", "Enchente"],
+        "estacoes": len({m for m, _, _ in cotas}),
+        "estratos": len(cotas),
+        "positivos": int(df['Enchente'].sum()) if len(df) else 0,
+        # Impressão digital das cotas: duas amostras com o mesmo valor vieram dos mesmos estratos
+        "cotas_sha1": _hash_cotas(cotas),
+    }
+    return df, especificacao
@@ -1,10 +1,59 @@
 # --- START OF FILE database.py ---
+# Criação das tabelas e roteamento das tabelas particionadas por UF.
+#
+# Com ARMAZENAMENTO_CLIMA=uf, as tabelas 'clima' e 'historico_previsao' deixam o database.db e
+# ficam num banco SQLite por tabela e UF (PASTA_SHARDS/clima_SP.db, ...): ingestão, leituras do
+# treinamento e consultas de histórico de estados diferentes não disputam o mesmo arquivo nem a
+# mesma trava de escrita. O estado de cada chave vem do catálogo de estações (SG_ESTADO):
+#   - 'clima': pelo nome da estação (DC_NOME, a coluna municipio);
+#   - 'historico_previsao': pelo identificador 'lat,lon', atribuído à UF da estação mais próxima
+#     (as previsões podem ser de qualquer ponto do mapa; a mesma chave vai sempre ao mesmo shard).
+# As demais tabelas continuam no database.db. Com ARMAZENAMENTO_CLIMA=unico (padrão), todas as
+# funções de roteamento devolvem o database.db e o comportamento é o de antes.
+import glob
+import math
+import os
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+import pandas as pd
 
-def criar_tabelas():
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
+BANCO_PRINCIPAL = 'database.db'
+# Espera pela trava de escrita ao criar tabelas e índices: os workers do servidor.py inicializam ao
+# mesmo tempo, e a limpeza que antecede o índice único da 'clima' pode passar dos 5s padrão do sqlite3
+ESPERA_TRAVA_SEGUNDOS = 60
+ARMAZENAMENTO_POR_UF = os.getenv("ARMAZENAMENTO_CLIMA", "unico") == 'uf'
+PASTA_SHARDS = os.getenv("PASTA_SHARDS", os.path.join('dados', 'shards'))
+# Shards processados ao mesmo tempo na ingestão, na preparação dos dados e no treinamento
+PARALELISMO_SHARDS = int(os.getenv("SHARDS_PARALELISMO", str(os.cpu_count() or 1)))
+TABELAS_PARTICIONADAS = ('clima', 'historico_previsao')
+# Shard das chaves sem estado conhecido (estação fora do catálogo, identificador malformado)
+UF_DESCONHECIDA = 'XX'
+CAMINHO_CATALOGO = os.path.join('dados', 'catalogoestacoesautomaticas.csv')
+
+# Índices do catálogo: DC_NOME -> UF e coordenadas (em radianos) das estações
+_uf_por_estacao = {}
+_ufs = np.array([], dtype=object)
+_latitudes = np.array([])
+_longitudes = np.array([])
+# Shards cujas tabelas já foram criadas por este processo
+_shards_prontos = set()
+
+# Chave de uma observação da 'clima'. Data e Hora entram normalizadas porque os CSVs do INMET
+# trazem '2019/01/01' e '0000 UTC' em alguns anos e '2019-01-01' e '00:00' em outros
+SQL_CHAVE_CLIMA = "municipio, replace(Data, '/', '-'), substr(replace(replace(Hora, ' UTC', ''), ':', ''), 1, 4)"
+
+def _garantir_coluna(cursor, tabela, coluna, tipo):
+    """Adiciona a coluna à tabela se ela ainda não existir (migração simples para bancos antigos)."""
+    colunas = [linha[1] for linha in cursor.execute(f"PRAGMA table_info({tabela})")]
+    if coluna not in colunas:
+        cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+
+def _indice_existe(cursor, nome):
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (nome,)).fetchone() is not None
 
+def _criar_tabela_clima(cursor):
     # Tabela 'clima' - ajustada para refletir as colunas que você está gerando em prepara_dados.py
     # Adicionamos 'Radiacao'
     cursor.execute("""
@@ -22,6 +71,57 @@ def criar_tabelas():
             municipio TEXT NOT NULL
         );
     """)
+    # Uma observação por estação e horário (a ingestão grava com INSERT OR IGNORE)
+    if not _indice_existe(cursor, 'idx_clima_observacao'):
+        # Os workers do servidor.py criam as tabelas ao mesmo tempo: a trava de escrita é tomada
+        # antes de conferir de novo, e só o primeiro limpa a tabela e cria o índice
+        conn = cursor.connection
+        if conn.in_transaction:
+            conn.commit()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if not _indice_existe(cursor, 'idx_clima_observacao'):
+                # Bancos anteriores ao índice podem ter a mesma observação gravada mais de uma vez
+                removidas = cursor.execute(
+                    f"DELETE FROM clima WHERE id NOT IN (SELECT MIN(id) FROM clima GROUP BY {SQL_CHAVE_CLIMA})"
+                ).rowcount
+                cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_clima_observacao ON clima ({SQL_CHAVE_CLIMA})")
+                banco = conn.execute("PRAGMA database_list").fetchone()[2]
+                print(f"INFO [database]: Índice único da 'clima' criado em '{banco}'; {removidas} observações repetidas removidas.")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    # O replay (services/replay.py) lê por estação em ordem de data e hora, sem ordenar a tabela inteira
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_clima_municipio_data
+        ON clima (municipio, Data, Hora);
+    """)
+
+def _criar_tabela_historico(cursor):
+    # Tabela 'historico_previsao' - para armazenar o histórico de previsões
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS historico_previsao (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            municipio TEXT NOT NULL,
+            data_hora TEXT NOT NULL,
+            probabilidade REAL NOT NULL,
+            versao_modelo TEXT
+        );
+    """)
+    # Bancos criados antes da coluna 'versao_modelo' existir
+    _garantir_coluna(cursor, 'historico_previsao', 'versao_modelo', 'TEXT')
+    # Consultas de histórico filtram por município e ordenam/agrupam por data
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_historico_municipio_data
+        ON historico_previsao (municipio, data_hora);
+    """)
+
+def criar_tabelas():
+    conn = sqlite3.connect(BANCO_PRINCIPAL, timeout=ESPERA_TRAVA_SEGUNDOS)
+    cursor = conn.cursor()
+
+    _criar_tabela_clima(cursor)
 
     # Tabela 'municipios' - para armazenar as coordenadas e nomes dos municípios/estações
     cursor.execute("""
@@ -33,19 +133,145 @@ def criar_tabelas():
         );
     """)
     
-    # Tabela 'historico_previsao' - para armazenar o histórico de previsões
+    _criar_tabela_historico(cursor)
+
+    # Tabela 'backtest_previsao' - probabilidades do replay offline do ensemble sobre a tabela 'clima'
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS historico_previsao (
+        CREATE TABLE IF NOT EXISTS backtest_previsao (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
+            versao_modelo TEXT NOT NULL,
             municipio TEXT NOT NULL,
             data_hora TEXT NOT NULL,
-            probabilidade REAL NOT NULL
+            prob_rf REAL,
+            prob_xgb REAL,
+            prob_lstm REAL,
+            probabilidade REAL NOT NULL,
+            enchente INTEGER
+        );
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_backtest_versao_municipio
+        ON backtest_previsao (versao_modelo, municipio, data_hora);
+    """)
+
+    # Tabela 'snapshot_risco' - último risco calculado para cada estação pelo agendador da API
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS snapshot_risco (
+            codigo TEXT PRIMARY KEY,
+            nome TEXT NOT NULL,
+            uf TEXT,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            probabilidade REAL NOT NULL,
+            Temperatura REAL,
+            Umidade REAL,
+            Vento REAL,
+            Precipitacao REAL,
+            versao_modelo TEXT,
+            atualizado_em TEXT NOT NULL
         );
     """)
 
     conn.commit()
     conn.close()
 
+    if ARMAZENAMENTO_POR_UF:
+        os.makedirs(PASTA_SHARDS, exist_ok=True)
+
+# Tabelas criadas em cada shard
+_CRIAR_TABELA = {'clima': _criar_tabela_clima, 'historico_previsao': _criar_tabela_historico}
+
+def preparar_roteamento(df_estacoes):
+    """Monta os índices de roteamento a partir do catálogo do INMET (DC_NOME, SG_ESTADO, coordenadas)."""
+    global _ufs, _latitudes, _longitudes
+    df = df_estacoes.dropna(subset=['DC_NOME', 'SG_ESTADO', 'VL_LATITUDE', 'VL_LONGITUDE'])
+    _uf_por_estacao.clear()
+    for nome, uf in zip(df['DC_NOME'], df['SG_ESTADO']):
+        # Nomes repetidos em estados diferentes (ex.: VALENCA) já se misturam na 'clima': vale o primeiro
+        _uf_por_estacao.setdefault(nome, uf.strip().upper())
+    _ufs = df['SG_ESTADO'].str.strip().str.upper().to_numpy(dtype=object)
+    _latitudes = np.radians(df['VL_LATITUDE'].to_numpy(dtype=np.float64))
+    _longitudes = np.radians(df['VL_LONGITUDE'].to_numpy(dtype=np.float64))
+    _uf_das_coordenadas.cache_clear()
+
+def _garantir_roteamento():
+    if not _uf_por_estacao:
+        preparar_roteamento(pd.read_csv(CAMINHO_CATALOGO, sep=';', decimal=',',
+                                        dtype={'VL_LATITUDE': float, 'VL_LONGITUDE': float}))
+
+@lru_cache(maxsize=65536)
+def _uf_das_coordenadas(chave):
+    try:
+        lat, lon = (math.radians(float(v)) for v in chave.split(','))
+    except ValueError:
+        return UF_DESCONHECIDA
+    # Distância equiretangular: basta para achar a estação mais próxima
+    dx = (_longitudes - lon) * math.cos(lat)
+    dy = _latitudes - lat
+    return _ufs[int(np.argmin(dx * dx + dy * dy))]
+
+def uf_da_chave(tabela, chave):
+    """UF do shard de uma chave: nome da estação em 'clima', 'lat,lon' em 'historico_previsao'."""
+    _garantir_roteamento()
+    if tabela == 'clima':
+        return _uf_por_estacao.get(chave, UF_DESCONHECIDA)
+    return _uf_das_coordenadas(chave) if len(_ufs) else UF_DESCONHECIDA
+
+def caminho_banco(tabela, chave=None, uf=None):
+    """Arquivo do banco que guarda a tabela (e, se particionada, a chave ou a UF dada)."""
+    if not ARMAZENAMENTO_POR_UF or tabela not in TABELAS_PARTICIONADAS:
+        return BANCO_PRINCIPAL
+    return os.path.join(PASTA_SHARDS, f"{tabela}_{uf or uf_da_chave(tabela, chave)}.db")
+
+def conectar(tabela, chave=None, uf=None, caminho=None):
+    """
+    Conexão com o banco da tabela/chave (ou com o `caminho` de um dos bancos(tabela)); um shard
+    novo é criado com a tabela e os índices. Para quem grava: leituras usam caminho_banco ou
+    bancos(tabela) e não criam shards.
+    """
+    caminho = caminho or caminho_banco(tabela, chave, uf)
+    if caminho != BANCO_PRINCIPAL and caminho not in _shards_prontos:
+        os.makedirs(PASTA_SHARDS, exist_ok=True)
+        conn = sqlite3.connect(caminho, timeout=ESPERA_TRAVA_SEGUNDOS)
+        # WAL: leituras (histórico, treinamento) não esperam a gravação em curso no mesmo shard
+        conn.execute("PRAGMA journal_mode=WAL")
+        _CRIAR_TABELA[tabela](conn.cursor())
+        conn.commit()
+        _shards_prontos.add(caminho)
+        return conn
+    return sqlite3.connect(caminho)
+
+def bancos(tabela, chaves=None):
+    """
+    Arquivos de banco que guardam a tabela, em ordem de UF: todos os shards existentes ou, com
+    `chaves`, só os shards dessas chaves (que existam). Sem particionamento, apenas o database.db.
+    """
+    if not ARMAZENAMENTO_POR_UF or tabela not in TABELAS_PARTICIONADAS:
+        return [BANCO_PRINCIPAL]
+    if chaves:
+        caminhos = {caminho_banco(tabela, chave) for chave in chaves}
+        return sorted(c for c in caminhos if os.path.exists(c))
+    return sorted(glob.glob(os.path.join(PASTA_SHARDS, f"{tabela}_*.db")))
+
+def particionar(tabela, df, coluna='municipio'):
+    """Divide o DataFrame pelo banco de destino das chaves em `coluna`: {caminho: parte}."""
+    if not ARMAZENAMENTO_POR_UF or tabela not in TABELAS_PARTICIONADAS:
+        return {BANCO_PRINCIPAL: df} if len(df) else {}
+    destinos = df[coluna].map({chave: caminho_banco(tabela, chave) for chave in df[coluna].unique()})
+    return {caminho: parte for caminho, parte in df.groupby(destinos, sort=True)}
+
+def em_paralelo(funcao, itens):
+    """
+    Aplica `funcao` a cada item (em geral, um shard) em threads e retorna os resultados na ordem
+    dos itens. O sqlite3 libera o GIL enquanto o SQLite executa, e cada shard tem sua própria
+    trava de escrita, então os shards avançam de fato ao mesmo tempo.
+    """
+    itens = list(itens)
+    if len(itens) <= 1 or PARALELISMO_SHARDS <= 1:
+        return [funcao(item) for item in itens]
+    with ThreadPoolExecutor(max_workers=min(PARALELISMO_SHARDS, len(itens))) as pool:
+        return list(pool.map(funcao, itens))
+
 # Remove as funções inserir_dados_clima, pois o pandas fará isso com to_sql
 
 if __name__ == '__main__':
@@ -0,0 +1,67 @@
+# --- START OF FILE drift.py ---
+# Referência da distribuição de treino e métricas de drift (PSI e KS) por feature.
+#
+# No treinamento, cada feature é resumida num histograma de NUMERO_FAIXAS faixas com limites nos
+# quantis dos dados de treino (faixas de mesma massa; limites repetidos, como os muitos zeros de
+# Precipitacao, são fundidos). As entradas em produção são contadas nas mesmas faixas, então as
+# métricas comparam apenas dois vetores de contagens, sem guardar nenhuma amostra.
+import numpy as np
+
+NUMERO_FAIXAS = 20
+# Evita log(0) no PSI quando uma faixa está vazia de um dos lados
+EPSILON_PSI = 1e-4
+# Faixas usuais de interpretação do PSI
+PSI_MODERADO = 0.1
+PSI_ALTO = 0.25
+
+
+def construir_referencia(X, colunas, numero_faixas=NUMERO_FAIXAS):
+    """Histograma de referência de cada coluna de X (matriz de treino): limites internos e proporções por faixa."""
+    X = np.asarray(X, dtype=np.float64)
+    quantis = np.linspace(0, 1, numero_faixas + 1)[1:-1]
+    referencia = {}
+    for j, coluna in enumerate(colunas):
+        valores = X[:, j][~np.isnan(X[:, j])]
+        limites = np.unique(np.quantile(valores, quantis))
+        contagens = np.bincount(np.searchsorted(limites, valores, side='left'), minlength=len(limites) + 1)
+        referencia[coluna] = {
+            "limites": limites.round(6).tolist(),
+            "proporcoes": (contagens / len(valores)).round(8).tolist(),
+            "n": int(len(valores)),
+            "media": round(float(valores.mean()), 6),
+            "desvio": round(float(valores.std()), 6),
+            "minimo": round(float(valores.min()), 6),
+            "maximo": round(float(valores.max()), 6),
+        }
+    return referencia
+
+
+def contar_faixas(valores, limites):
+    """Contagem por faixa (-inf, l0], (l0, l1], ..., (ln, +inf) dos valores não ausentes."""
+    valores = valores[~np.isnan(valores)]
+    return np.bincount(np.searchsorted(limites, valores, side='left'), minlength=len(limites) + 1)
+
+
+def psi(proporcoes_referencia, contagens):
+    """Population Stability Index entre as proporções de referência e as contagens observadas."""
+    esperado = np.maximum(np.asarray(proporcoes_referencia, dtype=np.float64), EPSILON_PSI)
+    observado = np.maximum(contagens / contagens.sum(), EPSILON_PSI)
+    return float(np.sum((observado - esperado) * np.log(observado / esperado)))
+
+
+def ks(proporcoes_referencia, contagens):
+    """
+    Estatística KS calculada nos limites das faixas (maior distância entre as distribuições
+    acumuladas). Como só os limites são comparados, é um limite inferior do KS exato.
+    """
+    acumulada_referencia = np.cumsum(proporcoes_referencia)
+    acumulada_observada = np.cumsum(contagens) / contagens.sum()
+    return float(np.max(np.abs(acumulada_observada - acumulada_referencia)))
+
+
+def classificar_psi(valor):
+    if valor >= PSI_ALTO:
+        return 'alto'
+    if valor >= PSI_MODERADO:
+        return 'moderado'
+    return 'estavel'
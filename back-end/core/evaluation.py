@@ -1,21 +1,31 @@
 # --- START OF FILE evaluation.py ---
 import numpy as np
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, matthews_corrcoef, roc_auc_score
-from core.models import lstm_model, rf_model, xgb_model, lstm_scaler # Importar o scaler também
+from sklearn.metrics import log_loss
+from sklearn.model_selection import train_test_split
+import core.models as models # lstm_scaler é reatribuído por carregar_modelos(); ler sempre via módulo
+from core.models import lstm_model, rf_model, xgb_model
+from core.previsores import MEMBROS, PESOS_PADRAO, prever_membro, combinar_probabilidades
 import torch
 import torch.nn.functional as F
 import json # Para salvar as métricas
 import os
+import time
+
+# Meias-larguras da faixa de incerteza em torno de 0.5 testadas para a cascata
+MEIAS_LARGURAS_CASCATA = (0.05, 0.1, 0.2, 0.3, 0.4)
+# Perda de acurácia (na validação) aceita em troca de latência ao escolher o ponto de operação
+TOLERANCIA_ACURACIA = 0.005
 
 def predict_lstm(data):
     """Prevê usando o modelo LSTM. Aplica o scaler antes da previsão."""
-    if lstm_scaler is None:
+    if models.lstm_scaler is None:
         print("AVISO: Scaler LSTM não carregado. Não é possível prever com LSTM.")
         # Pode retornar um array de zeros ou lançar um erro, dependendo da robustez desejada
         return np.zeros(data.shape[0]) 
     
     # Aplica o scaler nos dados de entrada
-    scaled_data = lstm_scaler.transform(data)
+    scaled_data = models.lstm_scaler.transform(data)
     
     # A entrada para o LSTM precisa ser um tensor 3D: (batch_size, sequence_length, input_size)
     # Cada linha de 'data' é uma observação, então sequence_length = 1
@@ -40,7 +50,7 @@ def run_ensemble_evaluation(X_teste, y_teste):
     xgb_trained = hasattr(xgb_model, '_Booster') # e.g., if xgb_model.is_trained
 
     # Verifica se o modelo LSTM e o scaler foram carregados/treinados
-    lstm_trained = hasattr(lstm_model, 'lstm') and lstm_scaler is not None # Checagem mais robusta
+    lstm_trained = hasattr(lstm_model, 'lstm') and models.lstm_scaler is not None # Checagem mais robusta
 
     if not (rf_trained and xgb_trained and lstm_trained):
         print("INFO: Nem todos os modelos ou o scaler do LSTM foram treinados/carregados. Não é possível realizar a avaliação completa.")
@@ -109,8 +119,122 @@ def run_ensemble_evaluation(X_teste, y_teste):
             json.dump(metrics, f, indent=4)
         print("INFO: Métricas de avaliação salvas em 'evaluation_metrics.json'.")
 
+        avaliar_cascata(X_teste, y_teste)
+
         return metrics
 
     except Exception as e:
         print(f"ERRO: Falha na avaliação do ensemble. Verifique os dados. Erro: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+def medir_latencias(X, n_chamadas=50):
+    """Latência média (ms) de cada membro para uma previsão de uma linha, como no /predict/."""
+    X = np.asarray(X, dtype=np.float32)[:n_chamadas]
+    latencias = {}
+    for membro in MEMBROS:
+        prever_membro(membro, X[:1], avisar=False) # aquecimento
+        inicio = time.perf_counter()
+        for i in range(len(X)):
+            prever_membro(membro, X[i:i + 1], avisar=False)
+        latencias[membro] = (time.perf_counter() - inicio) / len(X) * 1000
+    return latencias
+
+
+def aprender_pesos(probabilidades, y, passo=0.05):
+    """
+    Pesos do ensemble (não negativos, somando 1) que minimizam a log-loss na validação.
+    Busca em grade sobre o simplex: com três membros são poucas centenas de combinações.
+    """
+    P = np.column_stack([probabilidades[m] for m in MEMBROS])
+    n = int(round(1 / passo))
+    melhor_perda, melhores = np.inf, PESOS_PADRAO
+    for i in range(n + 1):
+        for j in range(n + 1 - i):
+            w = np.array([i, j, n - i - j]) / n
+            perda = log_loss(y, np.clip(P @ w, 1e-6, 1 - 1e-6), labels=[0, 1])
+            if perda < melhor_perda:
+                melhor_perda, melhores = perda, dict(zip(MEMBROS, map(float, w)))
+    return melhores
+
+
+def _metricas_configuracao(probabilidades, y):
+    previsoes = (probabilidades > 0.5).astype(int)
+    return {
+        'accuracy': accuracy_score(y, previsoes),
+        'f1_score': f1_score(y, previsoes, zero_division=0),
+        'auc_roc': roc_auc_score(y, probabilidades) if len(np.unique(y)) > 1 else None,
+    }
+
+
+def simular_cascatas(probabilidades, y, pesos, latencias):
+    """
+    Acurácia x latência de cada configuração: só o ensemble completo, cada membro sozinho e a
+    cascata com cada membro na frente e cada faixa de incerteza. As probabilidades de todos os
+    membros já foram calculadas, então a cascata é simulada sem rodar os modelos de novo; a
+    latência estimada é a do primeiro membro mais a dos demais na fração de linhas escaladas.
+    """
+    completo = combinar_probabilidades(probabilidades['rf'], probabilidades['xgb'], probabilidades['lstm'], pesos)
+    configuracoes = [dict(nome='completo', primeiro=None, faixa=None, fracao_escalada=1.0,
+                          latencia_ms=sum(latencias.values()), **_metricas_configuracao(completo, y))]
+    for primeiro in MEMBROS:
+        p = probabilidades[primeiro]
+        outros = sum(latencias[m] for m in MEMBROS if m != primeiro)
+        configuracoes.append(dict(nome=f'apenas_{primeiro}', primeiro=primeiro, faixa=None, fracao_escalada=0.0,
+                                  latencia_ms=latencias[primeiro], **_metricas_configuracao(p, y)))
+        for meia in MEIAS_LARGURAS_CASCATA:
+            faixa = [round(0.5 - meia, 2), round(0.5 + meia, 2)]
+            incertas = (p >= faixa[0]) & (p <= faixa[1])
+            final = np.where(incertas, completo, p)
+            configuracoes.append(dict(nome=f'cascata_{primeiro}_{meia:g}', primeiro=primeiro, faixa=faixa,
+                                      fracao_escalada=float(incertas.mean()),
+                                      latencia_ms=latencias[primeiro] + incertas.mean() * outros,
+                                      **_metricas_configuracao(final, y)))
+    return configuracoes
+
+
+def escolher_ponto_de_operacao(configuracoes, tolerancia=TOLERANCIA_ACURACIA):
+    """A cascata mais rápida cuja acurácia fica a até `tolerancia` da do ensemble completo."""
+    referencia = configuracoes[0]['accuracy']
+    cascatas = [c for c in configuracoes if c['faixa'] is not None and c['accuracy'] >= referencia - tolerancia]
+    return min(cascatas, key=lambda c: c['latencia_ms']) if cascatas else None
+
+
+def avaliar_cascata(X_teste, y_teste, caminho=models.ARQUIVO_CONFIG_ENSEMBLE):
+    """
+    Divide o conjunto de teste em validação e teste: na validação aprende os pesos do ensemble e
+    escolhe o ponto de operação da cascata; no teste reporta acurácia x latência de cada
+    configuração. Salva tudo em config_ensemble.json, lido por carregar_modelos().
+    """
+    try:
+        X_val, X_tst, y_val, y_tst = train_test_split(X_teste, y_teste, test_size=0.5, random_state=42, stratify=y_teste)
+    except ValueError:
+        # Poucas linhas de alguma classe para estratificar
+        X_val, X_tst, y_val, y_tst = train_test_split(X_teste, y_teste, test_size=0.5, random_state=42)
+
+    prob_val = {m: prever_membro(m, X_val, avisar=False) for m in MEMBROS}
+    prob_tst = {m: prever_membro(m, X_tst, avisar=False) for m in MEMBROS}
+    latencias = medir_latencias(X_tst)
+
+    pesos = aprender_pesos(prob_val, y_val)
+    escolhida = escolher_ponto_de_operacao(simular_cascatas(prob_val, y_val, pesos, latencias))
+    configuracoes = simular_cascatas(prob_tst, y_tst, pesos, latencias)
+
+    print(f"INFO: Pesos aprendidos para o ensemble: {pesos}")
+    print("| configuração | acurácia | F1 | escaladas | latência estimada (ms) |")
+    for c in configuracoes:
+        print(f"| {c['nome']} | {c['accuracy']:.4f} | {c['f1_score']:.4f} | {c['fracao_escalada']:.0%} | {c['latencia_ms']:.2f} |")
+
+    config = {
+        "versao_modelos": models.calcular_versao_modelos(),
+        "pesos": pesos,
+        "cascata": {"primeiro": escolhida['primeiro'], "faixa": escolhida['faixa']} if escolhida else None,
+        "latencias_membros_ms": latencias,
+        "configuracoes_teste": configuracoes,
+    }
+    with open(caminho, 'w') as f:
+        json.dump(config, f, indent=4)
+    if escolhida:
+        print(f"INFO: Ponto de operação da cascata: {escolhida['nome']} (ative com ENSEMBLE_MODO=cascata).")
+    print(f"INFO: Configuração do ensemble salva em '{caminho}'.")
+    return config
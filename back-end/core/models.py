@@ -1,6 +1,9 @@
 # --- START OF FILE models.py ---
 import joblib
+import hashlib
+import json
 import os
+from datetime import datetime
 import torch
 import torch.nn as nn
 from sklearn.ensemble import RandomForestClassifier
@@ -16,12 +19,59 @@ lstm_model = LSTMModel(input_size=4, hidden_size=50) # Ajuste input_size conform
 # Variável global para o scaler do LSTM
 lstm_scaler = None
 
+# Identificador dos artefatos carregados (hash do conteúdo), usado para comparar versões de modelo
+versao_modelos = None
+
+# Indica se carregar_modelos() já rodou neste processo (ex.: pré-carregado pelo servidor.py antes do fork)
+modelos_carregados = False
+
+ARTEFATOS_MODELOS = ['modelo_rf.pkl', 'modelo_xgb.pkl', 'modelo_lstm.pth', 'scaler_lstm.pkl']
+
+# Pesos do ensemble e ponto de operação da cascata aprendidos em core/evaluation.py
+ARQUIVO_CONFIG_ENSEMBLE = 'config_ensemble.json'
+configuracao_ensemble = None
+
+# Manifesto gravado a cada treinamento: versão dos artefatos e como os dados de treino foram amostrados
+ARQUIVO_MANIFESTO = 'manifesto_modelos.json'
+
+def calcular_versao_modelos(caminhos=ARTEFATOS_MODELOS):
+    """
+    Calcula um identificador curto da versão dos modelos a partir do conteúdo dos artefatos.
+    Artefatos ausentes também entram no hash, para diferenciar conjuntos incompletos.
+    """
+    h = hashlib.sha1()
+    for caminho in caminhos:
+        h.update(caminho.encode())
+        if os.path.exists(caminho):
+            with open(caminho, 'rb') as f:
+                h.update(f.read())
+        else:
+            h.update(b'ausente')
+    return h.hexdigest()[:12]
+
+def salvar_manifesto(perfil, amostra, referencia_drift=None, caminho=ARQUIVO_MANIFESTO):
+    """
+    Registra a versão dos artefatos recém-treinados, a especificação da amostra usada no treino e
+    o histograma de referência de cada feature (core/drift.py), usado no monitoramento de drift.
+    """
+    manifesto = {
+        "versao_modelos": calcular_versao_modelos(),
+        "treinado_em": datetime.now().isoformat(timespec='seconds'),
+        "perfil": perfil,
+        "amostra": amostra,
+        "referencia_drift": referencia_drift,
+    }
+    with open(caminho, 'w') as f:
+        json.dump(manifesto, f, indent=4)
+    print(f"INFO [models.salvar_manifesto]: Manifesto salvo em '{caminho}' (versão {manifesto['versao_modelos']}).")
+    return manifesto
+
 def carregar_modelos():
     """
     Tenta carregar os modelos pré-treinados e o scaler do LSTM.
     Se não existirem, usa as instâncias padrão (não treinadas).
     """
-    global lstm_scaler # Permite modificar a variável global
+    global lstm_scaler, versao_modelos, configuracao_ensemble, modelos_carregados # Permite modificar as variáveis globais
     print("DEBUG [models.carregar_modelos]: Iniciando carregamento de modelos...")
     
     # Carregar modelo LSTM
@@ -55,14 +105,9 @@ def carregar_modelos():
     if os.path.exists(caminho_rf):
         try:
             rf_model_carregado = joblib.load(caminho_rf)
-            rf_model.set_params(**rf_model_carregado.get_params())
-            # Se o modelo carregado já foi treinado, ele terá o atributo .classes_
-            if hasattr(rf_model_carregado, 'classes_'):
-                 rf_model.classes_ = rf_model_carregado.classes_
-            if hasattr(rf_model_carregado, 'n_features_in_'): # scikit-learn >= 0.24
-                 rf_model.n_features_in_ = rf_model_carregado.n_features_in_
-            elif hasattr(rf_model_carregado, 'n_features_'): # scikit-learn < 0.24
-                 rf_model.n_features_ = rf_model_carregado.n_features_
+            # Copia todo o estado treinado (estimators_, classes_, n_features_in_...) para a
+            # instância global, que já foi importada por referência em outros módulos
+            rf_model.__dict__.update(rf_model_carregado.__dict__)
 
             print(f"INFO [models.carregar_modelos]: Modelo RF carregado de '{caminho_rf}'. N° estimators: {rf_model.get_params()['n_estimators']}")
         except Exception as e:
@@ -76,10 +121,8 @@ def carregar_modelos():
     if os.path.exists(caminho_xgb):
         try:
             xgb_model_carregado = joblib.load(caminho_xgb)
-            xgb_model.set_params(**xgb_model_carregado.get_params())
-            # É importante carregar o _Booster se existir
-            if hasattr(xgb_model_carregado, '_Booster'):
-                xgb_model._Booster = xgb_model_carregado._Booster
+            # Copia o estado completo (_Booster, n_classes_, parâmetros...), como no RF
+            xgb_model.__dict__.update(xgb_model_carregado.__dict__)
             print(f"INFO [models.carregar_modelos]: Modelo XGB carregado de '{caminho_xgb}'.")
         except Exception as e:
             print(f"ERRO [models.carregar_modelos]: Falha ao carregar '{caminho_xgb}': {e}")
@@ -87,4 +130,22 @@ def carregar_modelos():
     else:
         print(f"INFO [models.carregar_modelos]: '{caminho_xgb}' não encontrado. Usando instância XGB não treinada.")
 
+    versao_modelos = calcular_versao_modelos()
+    print(f"INFO [models.carregar_modelos]: Versão dos modelos: {versao_modelos}")
+
+    # Carregar pesos/cascata do ensemble (só valem para os artefatos em que foram aprendidos)
+    configuracao_ensemble = None
+    if os.path.exists(ARQUIVO_CONFIG_ENSEMBLE):
+        try:
+            with open(ARQUIVO_CONFIG_ENSEMBLE) as f:
+                config = json.load(f)
+            if config.get('versao_modelos') == versao_modelos:
+                configuracao_ensemble = config
+                print(f"INFO [models.carregar_modelos]: Pesos do ensemble carregados de '{ARQUIVO_CONFIG_ENSEMBLE}': {config['pesos']}")
+            else:
+                print(f"AVISO [models.carregar_modelos]: '{ARQUIVO_CONFIG_ENSEMBLE}' foi gerado para outra versão dos modelos. Usando média simples.")
+        except Exception as e:
+            print(f"ERRO [models.carregar_modelos]: Falha ao carregar '{ARQUIVO_CONFIG_ENSEMBLE}': {e}")
+    modelos_carregados = True
+
     print("DEBUG [models.carregar_modelos]: Fim do carregamento de modelos.")
\ No newline at end of file
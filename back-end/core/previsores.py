@@ -0,0 +1,96 @@
+# --- START OF FILE previsores.py ---
+# Probabilidade de enchente de cada membro do ensemble (Random Forest, XGBoost e LSTM) e a
+# combinação ponderada delas. Usado pela API (services/ensemble.py) e pela avaliação do
+# treinamento (core/evaluation.py), que aprende os pesos e o ponto de operação da cascata.
+import numpy as np
+import torch
+import core.models as models # Acessar via módulo: carregar_modelos() reatribui lstm_scaler e configuracao_ensemble
+from core.models import rf_model, xgb_model, lstm_model
+
+# Ordem das features usada no treinamento
+FEATURES = ['Temperatura', 'Umidade', 'Vento', 'Precipitacao']
+
+# Membros do ensemble, na ordem em que prever_probabilidades os devolve
+MEMBROS = ('rf', 'xgb', 'lstm')
+PESOS_PADRAO = {'rf': 1 / 3, 'xgb': 1 / 3, 'lstm': 1 / 3}
+
+def _prever_rf(X):
+    if (hasattr(rf_model, 'estimators_') and len(rf_model.estimators_) > 0 and rf_model.n_features_in_ == X.shape[1]
+            and 1 in rf_model.classes_): # Treinado só com uma classe, predict_proba não tem a coluna da enchente
+        return rf_model.predict_proba(X)[:, list(rf_model.classes_).index(1)]
+    return None
+
+def _prever_xgb(X):
+    if hasattr(xgb_model, '_Booster') and xgb_model.n_features_in_ == X.shape[1]:
+        return xgb_model.predict_proba(X)[:, 1]
+    return None
+
+def _prever_lstm(X):
+    if models.lstm_scaler is None or not hasattr(lstm_model, 'lstm'):
+        return None
+    # Aplica o scaler nos dados para o LSTM; cada observação é uma sequência de comprimento 1
+    scaled_data_lstm = models.lstm_scaler.transform(X)
+    data_lstm_tensor = torch.tensor(scaled_data_lstm, dtype=torch.float32).unsqueeze(1)
+
+    # Coloca o modelo LSTM em modo de avaliação
+    lstm_model.eval()
+    with torch.no_grad():
+        return lstm_model(data_lstm_tensor).flatten().numpy().astype(np.float64) # O modelo já retorna a probabilidade
+
+PREVISORES = {'rf': _prever_rf, 'xgb': _prever_xgb, 'lstm': _prever_lstm}
+_AVISOS_MEMBROS = {
+    'rf': "AVISO: Modelo Random Forest não treinado. Usando probabilidade padrão de 0.5.",
+    'xgb': "AVISO: Modelo XGBoost não treinado. Usando probabilidade padrão de 0.5.",
+    'lstm': "AVISO: Modelo LSTM ou scaler não disponível/treinado. Usando probabilidade padrão de 0.5.",
+}
+
+def prever_membro(membro, X, avisar=True):
+    """
+    Probabilidade de enchente de um membro ('rf', 'xgb' ou 'lstm') para uma matriz (n, 4) de features.
+    Modelos não treinados (ou treinados com outro número de features) devolvem 0.5.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    pred = PREVISORES[membro](X)
+    if pred is None:
+        if avisar:
+            print(_AVISOS_MEMBROS[membro])
+        return np.full(X.shape[0], 0.5)
+    return pred
+
+def prever_probabilidades(X, avisar=True):
+    """
+    Calcula a probabilidade de enchente de cada modelo para uma matriz (n, 4) de features,
+    na ordem de FEATURES. Modelos não treinados (ou treinados com outro número de features)
+    contribuem com a probabilidade padrão de 0.5.
+    Retorna três arrays de tamanho n: (pred_rf, pred_xgb, pred_lstm).
+    """
+    X = np.asarray(X, dtype=np.float32)
+    return tuple(prever_membro(membro, X, avisar) for membro in MEMBROS)
+
+def pesos_ensemble():
+    """Pesos aprendidos na validação (config_ensemble.json) ou, na falta deles, média simples."""
+    if models.configuracao_ensemble:
+        return models.configuracao_ensemble['pesos']
+    return PESOS_PADRAO
+
+def combinar_probabilidades(pred_rf, pred_xgb, pred_lstm, pesos=None):
+    """Previsão final do ensemble: média ponderada das probabilidades, limitada a [0, 1]."""
+    pesos = pesos or pesos_ensemble()
+    return np.clip(pesos['rf'] * pred_rf + pesos['xgb'] * pred_xgb + pesos['lstm'] * pred_lstm, 0, 1)
+
+def prever_cascata(X, primeiro, faixa, pesos=None, avisar=True):
+    """
+    Cascata: avalia `primeiro` em todas as linhas e os outros membros apenas nas linhas em que
+    a probabilidade dele ficou dentro de `faixa` (limite_inferior, limite_superior).
+    Nas demais linhas, a probabilidade do primeiro modelo é a resposta final.
+    Retorna (probabilidades, máscara das linhas que precisaram do ensemble completo).
+    """
+    X = np.asarray(X, dtype=np.float32)
+    p_primeiro = prever_membro(primeiro, X, avisar)
+    incertas = (p_primeiro >= faixa[0]) & (p_primeiro <= faixa[1])
+    final = p_primeiro.astype(np.float64)
+    if incertas.any():
+        X_incertas = X[incertas]
+        preds = {m: p_primeiro[incertas] if m == primeiro else prever_membro(m, X_incertas, avisar) for m in MEMBROS}
+        final[incertas] = combinar_probabilidades(preds['rf'], preds['xgb'], preds['lstm'], pesos)
+    return final, incertas
@@ -0,0 +1,35 @@
+# --- START OF FILE exportar.py ---
+import argparse
+import sys
+from services.exportacao import FORMATOS, TABELAS_EXPORTAVEIS, exportar
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta previsões, backtest ou dados climáticos do banco em fluxo, com memória constante.")
+    parser.add_argument('tabela', choices=list(TABELAS_EXPORTAVEIS))
+    parser.add_argument('--formato', choices=list(FORMATOS), default=None, help="Padrão: deduzido da extensão de --saida, ou csv.")
+    parser.add_argument('--saida', default='-', help="Arquivo de saída ('-' para a saída padrão).")
+    parser.add_argument('--municipios', nargs='*', default=None, help="Estações (nas previsões: 'lat,lon').")
+    parser.add_argument('--inicio', default=None, help="Data inicial (YYYY-MM-DD).")
+    parser.add_argument('--fim', default=None, help="Data final (YYYY-MM-DD).")
+    parser.add_argument('--versao', default=None, help="Versão de modelo (previsões e backtest).")
+    parser.add_argument('--banco', default=None, help="Padrão: o banco da tabela (ou os seus shards por UF, com ARMAZENAMENTO_CLIMA=uf).")
+    parser.add_argument('--tamanho-lote', type=int, default=10_000)
+    args = parser.parse_args()
+
+    formato = args.formato or next((f for f in FORMATOS if args.saida.endswith(f'.{f}')), 'csv')
+    partes = exportar(args.tabela, formato, args.municipios, args.inicio, args.fim, args.versao,
+                      args.banco, args.tamanho_lote)
+    saida = sys.stdout.buffer if args.saida == '-' else open(args.saida, 'wb')
+    total = 0
+    try:
+        for parte in partes:
+            saida.write(parte)
+            total += len(parte)
+    finally:
+        if saida is not sys.stdout.buffer:
+            saida.close()
+    if args.saida != '-':
+        print(f"INFO: {args.tabela} exportada para '{args.saida}' ({formato}, {total / (1024 * 1024):.1f} MB).")
+
+if __name__ == '__main__':
+    main()
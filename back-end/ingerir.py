@@ -0,0 +1,136 @@
+# --- START OF FILE ingerir.py ---
+import argparse
+import io
+import os
+import time
+import pandas as pd
+import requests
+from core.database import criar_tabelas, preparar_roteamento
+from core.models import carregar_modelos
+from prepara_dados import COLUNAS_INMET
+from services.ingestao import ingerir, municipio_da_estacao, preparar_ingestao
+
+# Linhas de metadados antes da linha com os nomes das colunas nos CSVs do INMET
+LINHAS_METADADOS_INMET = 8
+
+
+def ler_cabecalho(arquivo):
+    """
+    Lê o cabeçalho do arquivo e retorna (colunas, municipio, codificacao, sep). Aceita o CSV do
+    INMET (estação no cabeçalho, ';' e latin1) ou um CSV no esquema da tabela 'clima' (com 'municipio').
+    """
+    with open(arquivo, 'rb') as f:
+        primeira = f.readline().decode('latin1')
+        if ':;' in primeira:
+            metadados = [primeira] + [f.readline().decode('latin1') for _ in range(LINHAS_METADADOS_INMET - 1)]
+            codigo = next((l.split(';')[1].strip() for l in metadados if 'CODIGO (WMO):;' in l), None)
+            municipio = municipio_da_estacao(codigo)
+            if municipio is None:
+                raise ValueError(f"Estação '{codigo}' do cabeçalho não encontrada no catálogo do INMET.")
+            colunas = f.readline().decode('latin1').rstrip('\r\n').split(';')
+            return [COLUNAS_INMET.get(c, c) for c in colunas], municipio, 'latin1', ';'
+    linha = primeira.rstrip('\r\n')
+    sep = ';' if ';' in linha else ','
+    return linha.split(sep), None, 'utf-8', sep
+
+
+def abrir(arquivo):
+    """Abre o arquivo posicionado na primeira linha de dados; retorna (arquivo, colunas, municipio, codificacao, sep)."""
+    colunas, municipio, codificacao, sep = ler_cabecalho(arquivo)
+    f = open(arquivo, 'rb')
+    for _ in range(LINHAS_METADADOS_INMET + 1 if municipio is not None else 1):
+        f.readline()
+    return f, colunas, municipio, codificacao, sep
+
+
+def montar_lote(linhas, colunas, municipio, codificacao, sep):
+    texto = '\n'.join(l.decode(codificacao).rstrip('\r') for l in linhas)
+    df = pd.read_csv(io.StringIO(texto), sep=sep, header=None, names=colunas, dtype=str,
+                     keep_default_na=False, na_values=[''], on_bad_lines='skip')
+    if municipio is not None:
+        df['municipio'] = municipio
+    return df
+
+
+def enviar(df, api):
+    if api:
+        corpo = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+        resposta = requests.post(f"{api.rstrip('/')}/observacoes/", json=corpo, timeout=120)
+        resposta.raise_for_status()
+        return resposta.json()
+    resumo, _ = ingerir(df)
+    return resumo
+
+
+def acompanhar(arquivo, api=None, seguir=False, do_fim=False, intervalo=5.0, tamanho_lote=5000):
+    """
+    Envia as linhas do arquivo em lotes e, com `seguir`, continua lendo as linhas acrescentadas
+    (como `tail -f`). Só linhas completas são enviadas; se o arquivo for truncado ou substituído,
+    a leitura recomeça do início. Reler linhas já gravadas não as duplica (ver services/ingestao.py).
+    """
+    def processar(linhas):
+        linhas = [l for l in linhas if l.strip()]
+        for i in range(0, len(linhas), tamanho_lote):
+            resumo = enviar(montar_lote(linhas[i:i + tamanho_lote], colunas, municipio, codificacao, sep), api)
+            print(f"INFO: {resumo['inseridas']}/{resumo['recebidas']} observações inseridas "
+                  f"({resumo['repetidas']} repetidas, rejeitadas: {resumo['rejeitadas'] or 0}); "
+                  f"risco atualizado: {resumo['risco_atualizado'] or '-'}")
+
+    f, colunas, municipio, codificacao, sep = abrir(arquivo)
+    if do_fim:
+        f.seek(0, os.SEEK_END)
+    inode = os.fstat(f.fileno()).st_ino
+    resto = b''
+    try:
+        while True:
+            bloco = f.read()
+            if bloco:
+                resto += bloco
+                *linhas, resto = resto.split(b'\n')
+                processar(linhas)
+                continue
+            if not seguir:
+                # Última linha sem quebra de linha no fim do arquivo
+                processar([resto])
+                break
+            time.sleep(intervalo)
+            try:
+                atual = os.stat(arquivo)
+            except FileNotFoundError:
+                continue
+            if atual.st_ino != inode or atual.st_size < f.tell():
+                print(f"INFO: '{arquivo}' foi truncado ou substituído; lendo desde o início.")
+                f.close()
+                f, colunas, municipio, codificacao, sep = abrir(arquivo)
+                inode, resto = atual.st_ino, b''
+    finally:
+        f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingere observações de um CSV do INMET (ou no esquema da tabela 'clima') sem reprocessar todos os dados.")
+    parser.add_argument('arquivo')
+    parser.add_argument('--seguir', action='store_true', help="Continua acompanhando as linhas acrescentadas ao arquivo.")
+    parser.add_argument('--do-fim', action='store_true', help="Com --seguir, ignora as linhas já existentes.")
+    parser.add_argument('--intervalo', type=float, default=5.0, help="Segundos entre verificações do arquivo.")
+    parser.add_argument('--tamanho-lote', type=int, default=5000)
+    parser.add_argument('--api', default=None, help="URL da API (ex.: http://localhost:8000): envia os lotes a POST /observacoes/ "
+                                                     "para que o mapa de risco e o push sejam atualizados na hora.")
+    args = parser.parse_args()
+
+    df_estacoes = pd.read_csv("dados/catalogoestacoesautomaticas.csv", sep=';', decimal=',',
+                              dtype={'VL_LATITUDE': float, 'VL_LONGITUDE': float})
+    preparar_ingestao(df_estacoes)
+    if not args.api:
+        # Gravação direta no banco: o risco das estações é recalculado aqui mesmo
+        preparar_roteamento(df_estacoes)
+        criar_tabelas()
+        carregar_modelos()
+
+    try:
+        acompanhar(args.arquivo, args.api, args.seguir, args.do_fim, args.intervalo, args.tamanho_lote)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
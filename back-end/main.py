@@ -1,9 +1,22 @@
 # --- START OF FILE main.py ---
 import pandas as pd
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from services.ensemble import predict_ensemble, predict_historical
+from fastapi.responses import JSONResponse, StreamingResponse
+from services.ensemble import ENSEMBLE_MODO, FEATURES, configuracao_cascata, predict_ensemble, predict_historical, AGRUPAMENTOS
+import core.models as models
+import services.eventos as eventos
+import services.risco as risco
 from core.models import carregar_modelos
+from core.database import criar_tabelas, preparar_roteamento
+from services.explicacao import explicar_lote
+from services.camadas import ZOOM_MAXIMO, camada_geojson, preparar_camadas
+from services.monitoramento import calcular_relatorio, iniciar_monitoramento, parar_monitoramento
+from services.ingestao import MAXIMO_LINHAS_LOTE, ingerir, preparar_ingestao
+from services.exportacao import FORMATOS, TABELAS_EXPORTAVEIS, exportar, parquet_disponivel
+from services.previsao import HORAS_MAXIMAS, prever_horizonte
+from services.risco import carregar_snapshot_do_banco, iniciar_agendador, parar_agendador, obter_snapshot
+import asyncio
 import json # Importar json
 import os # Importar os para checar arquivo
 
@@ -33,9 +46,30 @@ async def load_data_and_models():
             dtype={'VL_LATITUDE': float, 'VL_LONGITUDE': float}
         )
         print("Dados de estações carregados com sucesso!")
+        # Agrupamento das estações por zoom para /estacoes/geojson
+        preparar_camadas(df_estacoes)
+        # Índice de estações usado pela ingestão de observações (/observacoes/)
+        preparar_ingestao(df_estacoes)
+        # UF de cada estação, usada para rotear 'clima' e 'historico_previsao' entre os shards por UF
+        preparar_roteamento(df_estacoes)
         
-        # Carrega os modelos de Machine Learning
-        carregar_modelos()
+        # Garante que as tabelas, colunas e índices usados pela API existem
+        criar_tabelas()
+
+        # Carrega os modelos de Machine Learning, a menos que o processo pai (servidor.py)
+        # já os tenha carregado antes do fork; nesse caso a memória é compartilhada entre workers
+        if not models.modelos_carregados:
+            carregar_modelos()
+        # Ponto de operação da cascata validado na inicialização (um erro no log, não um a cada previsão)
+        if ENSEMBLE_MODO == 'cascata':
+            configuracao_cascata()
+
+        # Drift das entradas dos modelos em relação à distribuição de treino (/drift/)
+        iniciar_monitoramento()
+
+        # Restaura o último mapa de risco e inicia a atualização periódica em segundo plano
+        carregar_snapshot_do_banco()
+        iniciar_agendador(df_estacoes)
 
         # Carrega as métricas de avaliação se o arquivo existir
         evaluation_file = 'evaluation_metrics.json'
@@ -51,6 +85,11 @@ async def load_data_and_models():
     except Exception as e:
         print(f"ERRO ao carregar dados ou modelos: {e}")
 
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    parar_agendador()
+    parar_monitoramento()
+
 @app.get("/estacoes/")
 async def get_estacoes():
     if df_estacoes is not None:
@@ -62,8 +101,9 @@ async def get_estacoes():
         estacoes_list = valid_estacoes.rename(columns={
             'DC_NOME': 'nome', # Usar 'nome' para ser consistente com o `municipioSelecionado.nome` no frontend
             'VL_LATITUDE': 'lat',
-            'VL_LONGITUDE': 'lon'
-        })[['nome', 'lat', 'lon']].to_dict(orient='records')
+            'VL_LONGITUDE': 'lon',
+            'CD_ESTACAO': 'codigo' # Mesmo código usado por /risk/snapshot e /risk/stream
+        })[['nome', 'lat', 'lon', 'codigo']].to_dict(orient='records')
         
         return {"estacoes": estacoes_list}
     
@@ -71,24 +111,145 @@ async def get_estacoes():
     raise HTTPException(status_code=500, detail="Dados de estações não carregados.")
 
 
+@app.get("/estacoes/geojson")
+async def get_estacoes_geojson(zoom: int, bbox: str = None):
+    # bbox='oeste,sul,leste,norte' (graus); sem bbox devolve o mundo inteiro no zoom pedido
+    if not 0 <= zoom <= ZOOM_MAXIMO:
+        raise HTTPException(status_code=400, detail=f"O zoom deve estar entre 0 e {ZOOM_MAXIMO}.")
+    limites = []
+    if bbox:
+        try:
+            limites = [float(v) for v in bbox.split(',')]
+        except ValueError:
+            limites = []
+        if len(limites) != 4 or limites[1] > limites[3]:
+            raise HTTPException(status_code=400, detail="bbox inválido. Use 'oeste,sul,leste,norte'.")
+    return JSONResponse(camada_geojson(zoom, *limites))
+
 @app.get("/predict/") # Ajustar o endpoint para receber lat/lon diretamente
-async def get_prediction(lat: float, lon: float):
+async def get_prediction(lat: float, lon: float, explain: bool = False):
     # A função predict_ensemble no ensemble.py espera lat/lon, não um nome de município.
     # Vamos adaptar aqui.
     try:
-        prediction = predict_ensemble(lat, lon) # Passar lat e lon
+        # A consulta à weatherapi.com é bloqueante; roda numa thread para não travar o loop de eventos
+        prediction = await asyncio.to_thread(predict_ensemble, lat, lon) # Passar lat e lon
+        if explain and 'error' not in prediction:
+            # Contribuição de cada feature para a probabilidade (TreeSHAP, em cache por vetor de features)
+            X = [[prediction['dados_atuais'][f] for f in FEATURES]]
+            prediction['explicacao'] = (await asyncio.to_thread(explicar_lote, X))[0]
         return prediction
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/predict/forecast/")
+async def get_forecast(lat: float, lon: float, horas: int = 24):
+    # Série de risco das próximas horas a partir da previsão horária da weatherapi.com
+    if not 1 <= horas <= HORAS_MAXIMAS:
+        raise HTTPException(status_code=400, detail=f"O horizonte deve estar entre 1 e {HORAS_MAXIMAS} horas.")
+    try:
+        # A consulta à weatherapi.com é bloqueante; roda numa thread para não travar o loop de eventos
+        return await asyncio.to_thread(prever_horizonte, lat, lon, horas)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/predict/history/") # Ajustar para lat/lon
-async def get_history(lat: float, lon: float, limit: int = 30):
+async def get_history(lat: float, lon: float, limit: int = 30, inicio: str = None, fim: str = None,
+                      agrupamento: str = None, pontos: int = None):
+    # agrupamento: 'hora', 'dia' ou 'semana'; pontos: downsampling LTTB da série bruta
+    if agrupamento is not None and agrupamento not in AGRUPAMENTOS:
+        raise HTTPException(status_code=400, detail=f"Agrupamento inválido. Use um de: {', '.join(AGRUPAMENTOS)}.")
+    if pontos is not None and pontos < 3:
+        raise HTTPException(status_code=400, detail="O número de pontos deve ser pelo menos 3.")
     try:
-        history = predict_historical(lat, lon, limit)
+        history = predict_historical(lat, lon, limit, inicio, fim, agrupamento, pontos)
         return history
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/risk/snapshot")
+async def get_risk_snapshot():
+    # Mapa nacional pré-calculado pelo agendador; não dispara inferência nem chamadas de clima.
+    # O conteúdo já é JSON puro, então dispensa a conversão genérica do FastAPI
+    return JSONResponse(obter_snapshot())
+
+@app.get("/risk/explicacoes")
+async def get_risk_explicacoes(uf: str = None, estacoes: str = None):
+    # Explicação do risco de cada estação do snapshot, para o mapa. uf=SP,RJ e/ou estacoes=A001,A002
+    # restringem as estações; as explicações de vetores de features já vistos vêm do cache.
+    # A explicação é sempre dos modelos carregados: se o registro for de outra versão (snapshot
+    # restaurado de antes de um retreino), a probabilidade explicada difere da do registro
+    ufs = {u.strip().upper() for u in uf.split(',') if u.strip()} if uf else None
+    codigos = {e.strip().upper() for e in estacoes.split(',') if e.strip()} if estacoes else None
+    registros = [r for r in risco.snapshot.values()
+                 if (ufs is None or r['uf'] in ufs) and (codigos is None or r['codigo'] in codigos)]
+    X = [[r['dados_atuais'][f] for f in FEATURES] for r in registros]
+    explicacoes = await asyncio.to_thread(explicar_lote, X) if registros else []
+    return JSONResponse({
+        "atualizado_em": risco.snapshot_atualizado_em,
+        "versao_modelo": models.versao_modelos,
+        "estacoes": {r['codigo']: {"probabilidade": r['probabilidade'], "versao_modelo": r['versao_modelo'], "explicacao": e}
+                     for r, e in zip(registros, explicacoes)},
+    })
+
+@app.get("/risk/stream")
+async def get_risk_stream(request: Request, uf: str = None, estacoes: str = None):
+    # Push (Server-Sent Events) das estações cujo risco mudou a cada atualização do snapshot.
+    # uf=SP,RJ e/ou estacoes=A001,A002 restringem o que o cliente recebe
+    if len(eventos.assinantes) >= eventos.MAXIMO_ASSINANTES:
+        raise HTTPException(status_code=503, detail="Limite de conexões de push atingido. Tente novamente mais tarde.")
+    assinatura = eventos.Assinatura(
+        ufs=[u.strip().upper() for u in uf.split(',') if u.strip()] if uf else None,
+        estacoes=[e.strip().upper() for e in estacoes.split(',') if e.strip()] if estacoes else None,
+    )
+    corpo = eventos.transmitir(assinatura, list(risco.snapshot.values()),
+                               lambda: risco.snapshot_atualizado_em, request.is_disconnected)
+    return StreamingResponse(corpo, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/observacoes/")
+async def post_observacoes(request: Request):
+    # Lote de observações no esquema da tabela 'clima': uma lista de objetos, ou {"observacoes": [...]}
+    try:
+        corpo = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corpo da requisição não é um JSON válido.")
+    observacoes = corpo.get('observacoes') if isinstance(corpo, dict) else corpo
+    if not isinstance(observacoes, list) or not all(isinstance(o, dict) for o in observacoes):
+        raise HTTPException(status_code=400, detail="Envie uma lista de observações (objetos com municipio, Data, Hora e medidas).")
+    if len(observacoes) > MAXIMO_LINHAS_LOTE:
+        raise HTTPException(status_code=413, detail=f"Lote maior que {MAXIMO_LINHAS_LOTE} observações.")
+    try:
+        # Validação, escrita no SQLite e pontuação numa thread; o snapshot em memória é atualizado aqui, no loop
+        resumo, registros = await asyncio.to_thread(ingerir, pd.DataFrame(observacoes))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    risco.incorporar_registros(registros)
+    return resumo
+
+@app.get("/export/{tabela}")
+async def get_export(tabela: str, formato: str = 'csv', municipio: list[str] = Query(None),
+                     inicio: str = None, fim: str = None, versao: str = None):
+    # Exportação em fluxo de 'previsoes', 'backtest' ou 'clima'. municipio pode ser repetido;
+    # nas previsões o identificador é 'lat,lon', como em /predict/history/
+    if tabela not in TABELAS_EXPORTAVEIS:
+        raise HTTPException(status_code=404, detail=f"Tabela desconhecida. Use uma de: {', '.join(TABELAS_EXPORTAVEIS)}.")
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Use um de: {', '.join(FORMATOS)}.")
+    if formato == 'parquet' and not parquet_disponivel():
+        raise HTTPException(status_code=501, detail="Exportação em Parquet requer o pacote 'pyarrow' no servidor.")
+    try:
+        corpo = exportar(tabela, formato, municipio, inicio, fim, versao)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tipo, extensao = FORMATOS[formato]
+    return StreamingResponse(corpo, media_type=tipo,
+                             headers={"Content-Disposition": f'attachment; filename="{tabela}.{extensao}"'})
+
+@app.get("/drift/")
+async def get_drift():
+    # PSI e KS de cada feature das entradas recebidas por este worker, contra a distribuição de treino
+    return calcular_relatorio()
+
 @app.get("/evaluate/")
 async def get_evaluation():
     if evaluation_metrics_data:
@@ -0,0 +1,78 @@
+# --- START OF FILE particionar.py ---
+# Copia 'clima' e 'historico_previsao' do database.db para os shards por UF (ARMAZENAMENTO_CLIMA=uf).
+#
+# Cada shard é preenchido em paralelo pelo próprio SQLite (INSERT ... SELECT a partir do
+# database.db anexado), sem passar as linhas pelo Python. Rodar de novo substitui as linhas das
+# estações copiadas, sem duplicá-las; observações repetidas no database.db são copiadas uma vez.
+#
+# Uso (na pasta back-end/):
+#   ARMAZENAMENTO_CLIMA=uf python3 particionar.py [--apagar-origem]
+import argparse
+import sqlite3
+import time
+import core.database as database
+from core.database import BANCO_PRINCIPAL, TABELAS_PARTICIONADAS, criar_tabelas
+
+
+def migrar_tabela(tabela):
+    """Copia a tabela do database.db para os shards das suas chaves; retorna {caminho: linhas}."""
+    conn = sqlite3.connect(BANCO_PRINCIPAL)
+    chaves = [linha[0] for linha in conn.execute(f"SELECT DISTINCT municipio FROM {tabela}")]
+    colunas = ', '.join(linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})") if linha[1] != 'id')
+    conn.close()
+    grupos = {}
+    for chave in chaves:
+        grupos.setdefault(database.caminho_banco(tabela, chave), []).append(chave)
+
+    def copiar(item):
+        caminho, chaves_shard = item
+        conn = database.conectar(tabela, caminho=caminho)
+        try:
+            conn.execute("ATTACH DATABASE ? AS origem", (BANCO_PRINCIPAL,))
+            conn.execute("CREATE TEMP TABLE chaves (municipio TEXT PRIMARY KEY)")
+            conn.executemany("INSERT INTO chaves VALUES (?)", [(c,) for c in chaves_shard])
+            with conn:
+                conn.execute(f"DELETE FROM main.{tabela} WHERE municipio IN (SELECT municipio FROM chaves)")
+                # ORDER BY id mantém a ordem de inserção original (e a primeira de cada observação)
+                linhas = conn.execute(f"""
+                    INSERT OR IGNORE INTO main.{tabela} ({colunas})
+                    SELECT {colunas} FROM origem.{tabela}
+                    WHERE municipio IN (SELECT municipio FROM chaves) ORDER BY id
+                """).rowcount
+        finally:
+            conn.close()
+        return caminho, linhas
+
+    return dict(database.em_paralelo(copiar, sorted(grupos.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Particiona 'clima' e 'historico_previsao' do database.db em shards por UF.")
+    parser.add_argument('--apagar-origem', action='store_true',
+                        help="Depois da cópia, apaga as tabelas copiadas do database.db e o compacta (VACUUM).")
+    args = parser.parse_args()
+
+    if not database.ARMAZENAMENTO_POR_UF:
+        print("ERRO: Defina ARMAZENAMENTO_CLIMA=uf (o mesmo valor usado pela API e pelos scripts) para particionar.")
+        return
+    criar_tabelas()
+
+    for tabela in TABELAS_PARTICIONADAS:
+        inicio = time.perf_counter()
+        linhas = migrar_tabela(tabela)
+        print(f"INFO: '{tabela}': {sum(linhas.values())} linhas copiadas para {len(linhas)} shard(s) "
+              f"em {time.perf_counter() - inicio:.1f}s.")
+        for caminho, n in linhas.items():
+            print(f"  {caminho}: {n}")
+
+    if args.apagar_origem:
+        conn = sqlite3.connect(BANCO_PRINCIPAL)
+        with conn:
+            for tabela in TABELAS_PARTICIONADAS:
+                conn.execute(f"DELETE FROM {tabela}")
+        conn.execute("VACUUM")
+        conn.close()
+        print(f"INFO: Tabelas {', '.join(TABELAS_PARTICIONADAS)} apagadas de '{BANCO_PRINCIPAL}'.")
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,28 @@
 # --- START OF FILE prepara_dados.py ---
 import pandas as pd
+import numpy as np
 import glob
 import os
 import sqlite3
 import unidecode
 import logging
-from database import criar_tabelas # Importar a função para criar as tabelas
+from core.database import BANCO_PRINCIPAL, bancos, conectar, criar_tabelas, em_paralelo, particionar # Importar a função para criar as tabelas
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Colunas do CSV do INMET usadas na tabela 'clima' (também usadas por ingerir.py)
+COLUNAS_INMET = {
+    'DATA (YYYY-MM-DD)': 'Data',
+    'HORA (UTC)': 'Hora',
+    'PRECIPITAÇÃO TOTAL, HORÁRIO (mm)': 'Precipitacao',
+    'TEMPERATURA DO AR - BULBO SECO, HORARIA (°C)': 'Temperatura',
+    'UMIDADE RELATIVA DO AR, HORARIA (%)': 'Umidade',
+    'VENTO, VELOCIDADE HORARIA (m/s)': 'Vento',
+    'PRESSAO ATMOSFERICA AO NIVEL DA ESTACAO, HORARIA (mB)': 'Pressao',
+    'RADIACAO GLOBAL (KJ/m²)':'Radiacao',
+}
+
 def normalizar_nome_municipio(nome):
     """
     Normaliza o nome do município removendo acentos, convertendo para maiúsculas e
@@ -61,16 +74,7 @@ def processa_arquivos_inmet(pasta_inmet):
             df_data = pd.read_csv(arquivo, sep=';', encoding='latin1', skiprows=9, header=None, names=colunas, on_bad_lines='skip')
             
             # 3. Limpeza e seleção de colunas relevantes
-            colunas_selecionadas = {
-                'DATA (YYYY-MM-DD)': 'Data',
-                'HORA (UTC)': 'Hora',
-                'PRECIPITAÇÃO TOTAL, HORÁRIO (mm)': 'Precipitacao',
-                'TEMPERATURA DO AR - BULBO SECO, HORARIA (°C)': 'Temperatura',
-                'UMIDADE RELATIVA DO AR, HORARIA (%)': 'Umidade',
-                'VENTO, VELOCIDADE HORARIA (m/s)': 'Vento',
-                'PRESSAO ATMOSFERICA AO NIVEL DA ESTACAO, HORARIA (mB)': 'Pressao',
-                'RADIACAO GLOBAL (KJ/m²)':'Radiacao',
-            }
+            colunas_selecionadas = COLUNAS_INMET
             df_data = df_data.rename(columns=colunas_selecionadas)
             
             colunas_finais = list(colunas_selecionadas.values())
@@ -136,7 +140,7 @@ def prepara_e_salva_dados():
     df_catalogo['CD_ESTACAO'] = df_catalogo['CD_ESTACAO'].astype(str)
     
     # Popular a tabela 'municipios'
-    conn = sqlite3.connect('database.db')
+    conn = sqlite3.connect(BANCO_PRINCIPAL)
     df_municipios_para_db = df_catalogo[['DC_NOME', 'VL_LATITUDE', 'VL_LONGITUDE']].rename(columns={'DC_NOME': 'nome', 'VL_LATITUDE': 'latitude', 'VL_LONGITUDE': 'longitude'})
     df_municipios_para_db.drop_duplicates(subset=['nome'], inplace=True)
     try:
@@ -215,17 +219,46 @@ def prepara_e_salva_dados():
 
     logging.info(f"SUCESSO: Datasets combinados com sucesso! Dataset final para 'clima' com {len(df_final)} linhas.")
 
-    # Conexão com o banco de dados
-    conn = sqlite3.connect('database.db')
-    
     logging.info("Salvando o dataset final no banco de dados 'clima'...")
-    # Limpa a tabela antes de inserir para evitar duplicatas em cada execução
-    conn.execute("DELETE FROM clima")
-    df_final.to_sql('clima', conn, if_exists='append', index=False)
-    
+    salvar_clima(df_final)
     logging.info("Dados salvos com sucesso na tabela 'clima'!")
-    
-    conn.close()
+
+def salvar_clima(df_final):
+    """
+    Substitui o conteúdo da tabela 'clima' pelo DataFrame, sem observações repetidas. Com a tabela particionada por UF, cada
+    shard é limpo e gravado em paralelo (inclusive os que não recebem linhas novas).
+    """
+    # Uma observação por estação e horário (índice idx_clima_observacao): os CSVs do INMET de anos
+    # vizinhos se sobrepõem e trazem Data e Hora em formatos diferentes ('2019/01/01', '0000 UTC')
+    chave = pd.DataFrame({
+        'municipio': df_final['municipio'],
+        'Data': df_final['Data'].astype(str).str.replace('/', '-'),
+        'Hora': df_final['Hora'].astype(str).str.replace(' UTC', '').str.replace(':', '').str[:4],
+    })
+    repetidas = chave.duplicated()
+    if repetidas.any():
+        logging.info(f"{int(repetidas.sum())} observações repetidas descartadas.")
+        df_final = df_final[~repetidas]
+
+    partes = particionar('clima', df_final)
+    for caminho in bancos('clima'):
+        partes.setdefault(caminho, df_final.iloc[:0])
+
+    def gravar(item):
+        caminho, parte = item
+        conn = conectar('clima', caminho=caminho)
+        try:
+            with conn:
+                # Limpa a tabela antes de inserir para evitar duplicatas em cada execução
+                conn.execute("DELETE FROM clima")
+                parte.to_sql('clima', conn, if_exists='append', index=False)
+        finally:
+            conn.close()
+        return caminho, len(parte)
+
+    for caminho, linhas in em_paralelo(gravar, sorted(partes.items(), key=lambda item: item[0])):
+        if caminho != BANCO_PRINCIPAL:
+            logging.info(f"Shard '{caminho}': {linhas} linhas.")
 
 if __name__ == '__main__':
     prepara_e_salva_dados()
\ No newline at end of file
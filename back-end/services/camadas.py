@@ -0,0 +1,140 @@
+# --- START OF FILE camadas.py ---
+# Camada GeoJSON das estações agrupada no servidor, por nível de zoom.
+#
+# Na inicialização, as estações são projetadas em Web Mercator e, para cada zoom, agrupadas numa
+# grade de células de TAMANHO_CELULA_PX pixels na tela; cada célula ocupada vira um grupo.
+# Uma requisição só filtra os grupos do zoom pedido pela caixa visível (operação vetorizada sobre
+# algumas centenas de pontos) e anexa o risco agregado do último snapshot, recalculado apenas
+# quando o snapshot muda.
+import math
+import numpy as np
+import services.risco as risco
+
+ZOOM_MAXIMO = 18
+# Acima deste zoom cada estação é devolvida sozinha, sem agrupamento
+ZOOM_SEM_AGRUPAMENTO = 11
+# Lado da célula da grade, em pixels de tela (tiles de 256 px)
+TAMANHO_CELULA_PX = 60
+
+# Estações (arrays alinhados) e grupos pré-calculados por zoom
+estacoes = None
+niveis = {}
+# Risco agregado por zoom, válido para o snapshot de `_risco_calculado_em`
+_risco_por_nivel = {}
+_risco_calculado_em = None
+
+
+def _mercator(lat, lon):
+    """Coordenadas Web Mercator normalizadas em [0, 1) (x para leste, y para sul)."""
+    x = (lon + 180) / 360
+    lat_rad = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    y = (1 - np.log(np.tan(lat_rad) + 1 / np.cos(lat_rad)) / math.pi) / 2
+    return x, y
+
+
+def _agrupar(x, y, zoom):
+    """
+    Agrupa as estações pela célula da grade no zoom dado. Retorna o nível com a ordem das
+    estações por grupo (`ordem`), o início de cada grupo nessa ordem (`inicios`) e o centro de cada grupo.
+    """
+    celulas_por_eixo = 256 * 2 ** zoom / TAMANHO_CELULA_PX
+    if zoom > ZOOM_SEM_AGRUPAMENTO:
+        grupo = np.arange(len(x))
+    else:
+        cx = np.floor(x * celulas_por_eixo).astype(np.int64)
+        cy = np.floor(y * celulas_por_eixo).astype(np.int64)
+        _, grupo = np.unique(cx * (int(celulas_por_eixo) + 1) + cy, return_inverse=True)
+    ordem = np.argsort(grupo, kind='stable')
+    _, inicios, quantidades = np.unique(grupo[ordem], return_index=True, return_counts=True)
+    return {
+        "ordem": ordem,
+        "inicios": inicios,
+        "quantidades": quantidades,
+        "lat": np.add.reduceat(estacoes['lat'][ordem], inicios) / quantidades,
+        "lon": np.add.reduceat(estacoes['lon'][ordem], inicios) / quantidades,
+    }
+
+
+def preparar_camadas(df_estacoes):
+    """Pré-calcula os grupos de estações de todos os níveis de zoom (chamado na inicialização da API)."""
+    global estacoes, _risco_calculado_em
+    df = df_estacoes.dropna(subset=['CD_ESTACAO', 'DC_NOME', 'VL_LATITUDE', 'VL_LONGITUDE'])
+    estacoes = {
+        "codigo": df['CD_ESTACAO'].to_numpy(),
+        "nome": df['DC_NOME'].to_numpy(),
+        "uf": df['SG_ESTADO'].to_numpy(),
+        "lat": df['VL_LATITUDE'].to_numpy(dtype=np.float64),
+        "lon": df['VL_LONGITUDE'].to_numpy(dtype=np.float64),
+    }
+    x, y = _mercator(estacoes['lat'], estacoes['lon'])
+    niveis.clear()
+    for zoom in range(ZOOM_MAXIMO + 1):
+        niveis[zoom] = _agrupar(x, y, zoom)
+    _risco_por_nivel.clear()
+    _risco_calculado_em = None
+    print(f"INFO: Camada de estações pré-agrupada para zoom 0-{ZOOM_MAXIMO} "
+          f"({len(df)} estações, {len(niveis[0]['inicios'])} grupo(s) no zoom 0).")
+
+
+def _risco_agregado(zoom):
+    """(máximo, média) da probabilidade do snapshot em cada grupo do zoom; NaN nos grupos sem risco calculado."""
+    global _risco_calculado_em
+    if _risco_calculado_em != risco.snapshot_atualizado_em:
+        _risco_por_nivel.clear()
+        _risco_calculado_em = risco.snapshot_atualizado_em
+    if zoom not in _risco_por_nivel:
+        probabilidades = np.array([
+            risco.snapshot[codigo]['probabilidade'] if codigo in risco.snapshot else np.nan
+            for codigo in estacoes['codigo']
+        ])
+        nivel = niveis[zoom]
+        ordenadas = probabilidades[nivel['ordem']]
+        validas = ~np.isnan(ordenadas)
+        contagem = np.add.reduceat(validas.astype(np.int64), nivel['inicios'])
+        soma = np.add.reduceat(np.where(validas, ordenadas, 0), nivel['inicios'])
+        maximo = np.maximum.reduceat(np.where(validas, ordenadas, -np.inf), nivel['inicios'])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media = np.where(contagem > 0, soma / contagem, np.nan)
+        _risco_por_nivel[zoom] = (np.where(contagem > 0, maximo, np.nan), media)
+    return _risco_por_nivel[zoom]
+
+
+def _valor(v):
+    return None if np.isnan(v) else round(float(v), 4)
+
+
+def camada_geojson(zoom, oeste=-180.0, sul=-90.0, leste=180.0, norte=90.0):
+    """FeatureCollection com os grupos (ou estações) do zoom cujo centro está dentro da caixa."""
+    zoom = min(max(zoom, 0), ZOOM_MAXIMO)
+    nivel = niveis[zoom]
+    dentro = (nivel['lat'] >= sul) & (nivel['lat'] <= norte)
+    if oeste <= leste:
+        dentro &= (nivel['lon'] >= oeste) & (nivel['lon'] <= leste)
+    else:
+        # Caixa que atravessa o antimeridiano
+        dentro &= (nivel['lon'] >= oeste) | (nivel['lon'] <= leste)
+    risco_max, risco_medio = _risco_agregado(zoom)
+
+    features = []
+    for g in np.flatnonzero(dentro):
+        quantidade = int(nivel['quantidades'][g])
+        propriedades = {
+            "agrupado": quantidade > 1,
+            "quantidade": quantidade,
+            "risco_max": _valor(risco_max[g]),
+            "risco_medio": _valor(risco_medio[g]),
+        }
+        if quantidade == 1:
+            i = nivel['ordem'][nivel['inicios'][g]]
+            propriedades.update(codigo=estacoes['codigo'][i], nome=estacoes['nome'][i], uf=estacoes['uf'][i])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(float(nivel['lon'][g]), 6), round(float(nivel['lat'][g]), 6)]},
+            "properties": propriedades,
+        })
+    return {
+        "type": "FeatureCollection",
+        "zoom": zoom,
+        "snapshot_atualizado_em": risco.snapshot_atualizado_em,
+        "features": features,
+    }
@@ -1,10 +1,75 @@
 # --- START OF FILE ensemble.py ---
-import os, joblib, torch, numpy as np, sqlite3
-from core.models import rf_model, xgb_model, lstm_model, lstm_scaler # Importar o lstm_scaler
+import os, joblib, sqlite3, torch, numpy as np
+import core.database as database
+import core.models as models # Acessar via módulo: carregar_modelos() reatribui lstm_scaler e versao_modelos
+from core.models import rf_model, xgb_model, lstm_model
 from core.model_lstm import LSTMModel # Importar a classe para instanciar se necessário (embora já instanciada em models.py)
 from services.weather import get_weather_data
+import services.monitoramento as monitoramento
 import json
 import pandas as pd # Importar pandas para histórico
+# Probabilidades de cada membro e combinação ponderada (compartilhadas com core/evaluation.py)
+from core.previsores import (FEATURES, MEMBROS, PESOS_PADRAO, prever_membro, prever_probabilidades,
+                             pesos_ensemble, combinar_probabilidades, prever_cascata)
+
+# 'media' avalia sempre os três modelos; 'cascata' avalia primeiro o modelo mais rápido e só chama
+# os demais quando a probabilidade dele cai na faixa de incerteza (ver core/evaluation.py)
+ENSEMBLE_MODO = os.getenv("ENSEMBLE_MODO", "media")
+
+# Ponto de operação da cascata já validado e a configuração de que ele veio: a validação roda uma vez
+# por carregamento dos modelos (core/models.py troca o objeto a cada carregar_modelos)
+_NAO_VALIDADA = object()
+_cascata = None
+_cascata_origem = _NAO_VALIDADA
+
+def _erro_cascata(cascata):
+    """Motivo pelo qual o ponto de operação da cascata é inválido, ou None se ele puder ser usado."""
+    if cascata.get('primeiro') not in MEMBROS:
+        return f"modelo primeiro {cascata.get('primeiro')!r} não é um de {', '.join(MEMBROS)}"
+    try:
+        inferior, superior = (float(v) for v in cascata['faixa'])
+    except (TypeError, ValueError):
+        return f"faixa {cascata['faixa']!r} não tem dois números"
+    if not 0 <= inferior <= superior <= 1:
+        return f"faixa {cascata['faixa']!r} não satisfaz 0 <= inferior <= superior <= 1"
+    return None
+
+def configuracao_cascata():
+    """
+    Ponto de operação da cascata: o escolhido por core/evaluation.py, podendo ser trocado por
+    implantação com ENSEMBLE_PRIMEIRO (ex.: 'xgb') e ENSEMBLE_FAIXA (ex.: '0.2,0.8').
+    Retorna None (ensemble completo) se ele estiver ausente ou for inválido.
+    """
+    global _cascata, _cascata_origem
+    if _cascata_origem is models.configuracao_ensemble:
+        return _cascata
+    cascata = dict((models.configuracao_ensemble or {}).get('cascata') or {})
+    if os.getenv("ENSEMBLE_PRIMEIRO"):
+        cascata['primeiro'] = os.getenv("ENSEMBLE_PRIMEIRO")
+    if os.getenv("ENSEMBLE_FAIXA"):
+        cascata['faixa'] = os.getenv("ENSEMBLE_FAIXA").split(',')
+    erro = _erro_cascata(cascata) if 'primeiro' in cascata and 'faixa' in cascata else None
+    if 'primeiro' not in cascata or 'faixa' not in cascata:
+        print("AVISO: ENSEMBLE_MODO=cascata sem ponto de operação (rode a avaliação ou defina ENSEMBLE_PRIMEIRO/ENSEMBLE_FAIXA). Usando o ensemble completo.")
+        cascata = None
+    elif erro:
+        print(f"ERRO: Ponto de operação da cascata inválido ({erro}). Usando o ensemble completo (media).")
+        cascata = None
+    else:
+        cascata['faixa'] = [float(v) for v in cascata['faixa']]
+        print(f"INFO: Cascata do ensemble: primeiro '{cascata['primeiro']}', faixa {cascata['faixa']}.")
+    _cascata, _cascata_origem = cascata, models.configuracao_ensemble
+    return cascata
+
+def prever_ensemble(X, avisar=True):
+    """Probabilidade final do ensemble para uma matriz (n, 4) de features, no modo configurado (ENSEMBLE_MODO)."""
+    # Entradas de produção entram no monitoramento de drift (só enfileiradas; contadas em lote)
+    monitoramento.registrar(X)
+    if ENSEMBLE_MODO == 'cascata':
+        cascata = configuracao_cascata()
+        if cascata:
+            return prever_cascata(X, cascata['primeiro'], cascata['faixa'], avisar=avisar)[0]
+    return combinar_probabilidades(*prever_probabilidades(X, avisar))
 
 def predict_ensemble(lat: float, lon: float): # Recebe lat e lon diretamente
     """
@@ -22,52 +87,25 @@ def predict_ensemble(lat: float, lon: float): # Recebe lat e lon diretamente
     # As features devem estar na mesma ordem do treinamento: Temperatura, Umidade, Vento, Precipitacao
     data_for_models = np.array([temp, humidity, wind, precipitation]).reshape(1, -1)
     
-    # Previsões individuais
-    # Verifica se os modelos estão treinados antes de prever
-    pred_rf = 0.5 # Valor padrão se não treinado
-    if hasattr(rf_model, 'estimators_') and len(rf_model.estimators_) > 0:
-        pred_rf = rf_model.predict_proba(data_for_models)[0][1]
-    else:
-        print("AVISO: Modelo Random Forest não treinado. Usando probabilidade padrão de 0.5.")
-
-    pred_xgb = 0.5 # Valor padrão se não treinado
-    if hasattr(xgb_model, '_Booster'):
-        pred_xgb = xgb_model.predict_proba(data_for_models)[0][1]
-    else:
-        print("AVISO: Modelo XGBoost não treinado. Usando probabilidade padrão de 0.5.")
-    
-    pred_lstm = 0.5 # Valor padrão se não treinado
-    if lstm_scaler is not None and hasattr(lstm_model, 'lstm'):
-        # Aplica o scaler nos dados para o LSTM
-        scaled_data_lstm = lstm_scaler.transform(data_for_models)
-        data_lstm_tensor = torch.tensor(scaled_data_lstm.reshape(-1, 1, scaled_data_lstm.shape[1]), dtype=torch.float32)
-        
-        # Coloca o modelo LSTM em modo de avaliação
-        lstm_model.eval()
-        with torch.no_grad():
-            pred_lstm = lstm_model(data_lstm_tensor).item() # O modelo já retorna a probabilidade
-    else:
-        print("AVISO: Modelo LSTM ou scaler não disponível/treinado. Usando probabilidade padrão de 0.5.")
-
-    # Previsão final do ensemble (média das probabilidades)
-    ensemble_prediction = (pred_rf + pred_xgb + pred_lstm) / 3
+    # Previsão final do ensemble (lote de uma linha): média ponderada ou cascata, conforme ENSEMBLE_MODO
+    ensemble_prediction = float(prever_ensemble(data_for_models)[0])
 
     # Define a probabilidade de enchente com base na previsão do ensemble
     flood_probability_percent = ensemble_prediction * 100 
     flood_probability_percent = min(100, max(0, flood_probability_percent)) # Garante que o valor esteja entre 0 e 100
 
     # Opcional: Salvar a previsão no histórico
-    conn = sqlite3.connect('database.db')
-    cursor = conn.cursor()
     # Primeiro, encontre o nome do município mais próximo ou use uma abordagem de identificação
     # Para simplificar, vamos usar uma string combinada lat_lon como identificador para o histórico
     municipio_id = f"{lat},{lon}"
+    conn = database.conectar('historico_previsao', municipio_id) # Com particionamento por UF, só o shard do ponto
+    cursor = conn.cursor()
     from datetime import datetime
     data_hora_atual = datetime.now().isoformat()
     cursor.execute("""
-        INSERT INTO historico_previsao (municipio, data_hora, probabilidade)
-        VALUES (?, ?, ?)
-    """, (municipio_id, data_hora_atual, ensemble_prediction)) # Salva a probabilidade bruta (0-1)
+        INSERT INTO historico_previsao (municipio, data_hora, probabilidade, versao_modelo)
+        VALUES (?, ?, ?, ?)
+    """, (municipio_id, data_hora_atual, ensemble_prediction, models.versao_modelos)) # Salva a probabilidade bruta (0-1)
     conn.commit()
     conn.close()
 
@@ -83,37 +121,115 @@ def predict_ensemble(lat: float, lon: float): # Recebe lat e lon diretamente
         }
     }
 
-def predict_historical(lat: float, lon: float, limit: int = 30):
+# Rótulo de um horário no histórico (séries brutas e agrupamento por hora)
+FORMATO_ROTULO_HORA = '%d/%m/%Y %Hh'
+
+# Expressões SQLite que levam 'data_hora' ao início do seu intervalo de agrupamento
+# (semana começa na segunda-feira) e o formato do rótulo enviado ao frontend. Todos os rótulos
+# levam o ano (um período longo repete dd/mm); 'inicio' traz o início ISO do intervalo
+AGRUPAMENTOS = {
+    'hora': ("strftime('%Y-%m-%dT%H:00', data_hora)", FORMATO_ROTULO_HORA),
+    'dia': ("date(data_hora)", '%d/%m/%Y'),
+    'semana': ("date(data_hora, 'weekday 0', '-6 days')", '%d/%m/%Y'),
+}
+
+def _filtro_periodo(inicio, fim):
+    """Monta a cláusula de período sobre 'data_hora' (texto ISO). Datas sem hora em `fim` incluem o dia inteiro."""
+    condicoes, params = [], []
+    if inicio:
+        condicoes.append("data_hora >= ?")
+        params.append(inicio)
+    if fim:
+        condicoes.append("data_hora <= ?")
+        params.append(fim + 'T23:59:59.999999' if len(fim) == 10 else fim)
+    return ''.join(f" AND {c}" for c in condicoes), params
+
+def _lttb(x, y, n_pontos):
+    """
+    Largest-Triangle-Three-Buckets: escolhe `n_pontos` índices que preservam a forma da série.
+    O laço é por balde de saída; dentro de cada balde a escolha é vetorizada em NumPy.
+    """
+    n = len(x)
+    if n_pontos >= n or n_pontos < 3:
+        return np.arange(n)
+    limites = np.linspace(1, n - 1, n_pontos - 1).astype(int) # n_pontos - 2 baldes internos
+    indices = np.empty(n_pontos, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    anterior = 0
+    for i in range(n_pontos - 2):
+        ini, fim_balde = limites[i], limites[i + 1]
+        # Ponto médio do próximo balde (ou o último ponto) como terceiro vértice do triângulo
+        prox_ini, prox_fim = fim_balde, (limites[i + 2] if i + 2 < len(limites) else n)
+        x_medio, y_medio = x[prox_ini:prox_fim].mean(), y[prox_ini:prox_fim].mean()
+        areas = np.abs(
+            (x[anterior] - x_medio) * (y[ini:fim_balde] - y[anterior])
+            - (x[anterior] - x[ini:fim_balde]) * (y_medio - y[anterior])
+        )
+        anterior = ini + int(np.argmax(areas))
+        indices[i + 1] = anterior
+    return indices
+
+def predict_historical(lat: float, lon: float, limit: int = 30, inicio: str = None, fim: str = None,
+                       agrupamento: str = None, pontos: int = None):
     """
     Busca o histórico de dados e previsões para uma latitude e longitude no banco de dados.
+
+    - Sem parâmetros extras: as `limit` previsões mais recentes (comportamento original).
+    - `inicio`/`fim`: restringem o período (texto ISO, ex.: '2024-01-01' ou '2024-01-01T12:00').
+    - `agrupamento` ('hora', 'dia' ou 'semana'): média e máximo por intervalo, calculados no SQLite;
+      `limit` passa a ser o número de intervalos mais recentes e 'inicio' traz o início ISO do intervalo.
+    - `pontos`: reduz a série bruta do período a esse número de pontos com LTTB (ignora `limit`).
     """
     print(f"DEBUG: Buscando histórico para Lat:{lat}, Lon:{lon}...")
     try:
-        conn = sqlite3.connect('database.db')
         # Use o mesmo identificador para o município que você usou ao salvar
         municipio_id = f"{lat},{lon}"
-        df = pd.read_sql_query(
-            "SELECT data_hora, probabilidade FROM historico_previsao WHERE municipio = ? ORDER BY data_hora DESC LIMIT ?", # DESC e LIMIT para os mais recentes
-            conn,
-            params=(municipio_id, limit)
-        )
+        # Com particionamento por UF, só o shard do ponto. A leitura não cria o shard (conectar é para
+        # quem grava): sem o arquivo, ainda não há previsões gravadas para a UF do ponto
+        caminho = database.caminho_banco('historico_previsao', municipio_id)
+        if not os.path.exists(caminho):
+            print(f"AVISO: Nenhum dado histórico encontrado para Lat:{lat}, Lon:{lon} ('{caminho}' não existe).")
+            return {"noData": True}
+        conn = sqlite3.connect(caminho)
+        filtro, params_periodo = _filtro_periodo(inicio, fim)
+
+        # O rótulo 'timestamp' já sai formatado do SQLite, sem conversão de datas linha a linha no Python
+        if agrupamento:
+            expressao, formato = AGRUPAMENTOS[agrupamento]
+            linhas = conn.execute(
+                f"""SELECT strftime('{formato}', {expressao}) AS timestamp, {expressao}, AVG(probabilidade), MAX(probabilidade), COUNT(*)
+                    FROM historico_previsao WHERE municipio = ?{filtro}
+                    GROUP BY {expressao} ORDER BY {expressao} DESC LIMIT ?""",
+                (municipio_id, *params_periodo, limit)
+            ).fetchall()[::-1] # Do mais antigo para o mais recente
+            chaves = ("timestamp", "inicio", "probability", "probability_max", "count")
+        elif pontos:
+            linhas = conn.execute(
+                f"""SELECT strftime('{FORMATO_ROTULO_HORA}', data_hora), probabilidade, CAST(strftime('%s', data_hora) AS INTEGER)
+                    FROM historico_previsao WHERE municipio = ?{filtro} ORDER BY data_hora""",
+                (municipio_id, *params_periodo)
+            ).fetchall()
+            if len(linhas) > pontos:
+                _, probabilidades, segundos = zip(*linhas)
+                indices = _lttb(np.array(segundos, dtype=np.float64), np.array(probabilidades), pontos)
+                linhas = [linhas[i] for i in indices]
+            chaves = ("timestamp", "probability")
+        else:
+            linhas = conn.execute(
+                f"""SELECT strftime('{FORMATO_ROTULO_HORA}', data_hora), probabilidade
+                    FROM historico_previsao WHERE municipio = ?{filtro} ORDER BY data_hora DESC LIMIT ?""", # DESC e LIMIT para os mais recentes
+                (municipio_id, *params_periodo, limit)
+            ).fetchall()[::-1] # O frontend espera ordem cronológica
+            chaves = ("timestamp", "probability")
         conn.close()
 
-        if df.empty:
+        if not linhas:
             print(f"AVISO: Nenhum dado histórico encontrado para Lat:{lat}, Lon:{lon}.")
             return {"noData": True} # Retorna noData: true para o frontend
 
-        # Converte a coluna de data para o formato necessário pelo front-end
-        df['data_hora'] = pd.to_datetime(df['data_hora'])
-        
         # O frontend espera 'timestamp' e 'probability'
-        history_list = df.sort_values(by='data_hora', ascending=True).apply(lambda row: {
-            "timestamp": row['data_hora'].strftime('%d/%m %Hh'),
-            "probability": row['probabilidade']
-        }, axis=1).tolist()
-        
-        return history_list # Retorna diretamente a lista de dicionários para o frontend
+        return [dict(zip(chaves, linha)) for linha in linhas] # Retorna diretamente a lista de dicionários para o frontend
 
     except Exception as e:
         print(f"ERRO: Falha ao buscar histórico de previsões para Lat:{lat}, Lon:{lon}: {e}")
-        return {"erro": True, "detail": f"Falha interna ao carregar o histórico: {e}"}
\ No newline at end of file
+        return {"erro": True, "detail": f"Falha interna ao carregar o histórico: {e}"}
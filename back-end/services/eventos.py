@@ -0,0 +1,84 @@
+# --- START OF FILE eventos.py ---
+# Canal de push (Server-Sent Events) das atualizações de risco por estação.
+#
+# O agendador de risco calcula o snapshot uma vez e chama publicar() com as estações que mudaram;
+# cada registro é serializado uma única vez e entregue a todos os assinantes cujo filtro (UF ou
+# estação) o aceita. Cada assinante guarda só o último valor pendente de cada estação: um cliente
+# lento recebe, quando voltar a ler, o estado mais recente em vez de uma fila de atualizações
+# antigas, e a memória por cliente nunca passa de uma entrada por estação.
+import asyncio
+import json
+import os
+
+# Intervalo dos comentários de keep-alive enviados a clientes sem atualizações (proxies fecham conexões ociosas)
+HEARTBEAT_SEGUNDOS = float(os.getenv("EVENTOS_HEARTBEAT_SEGUNDOS", "15"))
+# Limite de conexões simultâneas de push por processo
+MAXIMO_ASSINANTES = int(os.getenv("EVENTOS_MAXIMO_ASSINANTES", "1000"))
+
+assinantes = set()
+
+
+class Assinatura:
+    """Um cliente conectado: filtros e as atualizações pendentes ainda não enviadas (por estação)."""
+
+    def __init__(self, ufs=None, estacoes=None):
+        self.ufs = set(ufs) if ufs else None
+        self.estacoes = set(estacoes) if estacoes else None
+        self.pendentes = {}
+        self.sinal = asyncio.Event()
+
+    def aceita(self, registro):
+        if self.estacoes is not None and registro['codigo'] not in self.estacoes:
+            return False
+        if self.ufs is not None and registro['uf'] not in self.ufs:
+            return False
+        return True
+
+
+def _formatar_evento(evento, fragmentos, atualizado_em):
+    """Monta a mensagem SSE a partir dos registros já serializados."""
+    dados = f'{{"atualizado_em": {json.dumps(atualizado_em)}, "estacoes": [{", ".join(fragmentos)}]}}'
+    return f"event: {evento}\ndata: {dados}\n\n"
+
+
+def publicar(registros, atualizado_em=None):
+    """
+    Entrega os registros alterados a todos os assinantes interessados. Não bloqueia: apenas
+    atualiza as pendências de cada assinante e acorda quem estiver esperando.
+    """
+    if not registros or not assinantes:
+        return
+    serializados = [(registro, json.dumps(registro)) for registro in registros]
+    for assinatura in assinantes:
+        entregues = False
+        for registro, fragmento in serializados:
+            if assinatura.aceita(registro):
+                assinatura.pendentes[registro['codigo']] = fragmento
+                entregues = True
+        if entregues:
+            assinatura.sinal.set()
+
+
+async def transmitir(assinatura, estado_inicial, obter_atualizado_em, desconectado):
+    """
+    Gerador do corpo da resposta SSE: primeiro o estado atual (evento 'snapshot'), depois um
+    evento 'risco' com as estações alteradas a cada atualização, até o cliente desconectar.
+    """
+    assinantes.add(assinatura)
+    try:
+        iniciais = [json.dumps(r) for r in estado_inicial if assinatura.aceita(r)]
+        yield _formatar_evento('snapshot', iniciais, obter_atualizado_em())
+        while True:
+            try:
+                await asyncio.wait_for(assinatura.sinal.wait(), HEARTBEAT_SEGUNDOS)
+            except asyncio.TimeoutError:
+                if await desconectado():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            assinatura.sinal.clear()
+            pendentes, assinatura.pendentes = assinatura.pendentes, {}
+            if pendentes:
+                yield _formatar_evento('risco', list(pendentes.values()), obter_atualizado_em())
+    finally:
+        assinantes.discard(assinatura)
@@ -0,0 +1,336 @@
+# --- START OF FILE explicacao.py ---
+# Explicação das previsões: contribuição de cada feature para a probabilidade do ensemble.
+#
+# Cada membro é explicado com valores de Shapley exatos, somando (base + contribuições) à sua
+# probabilidade:
+#   - XGBoost: TreeSHAP nativo (pred_contribs), em log-odds, reescalado para probabilidade;
+#   - Random Forest: TreeSHAP (expectativa condicionada pelas coberturas dos nós) vetorizado.
+#     Com só 4 features há 16 coalizões; a expectativa de cada coalizão S é
+#         E[S] = soma sobre as folhas de valor * prod(1[x_j na caixa da folha], j em S) * prod(fração de cobertura, j fora de S)
+#     Para |S| <= 2 ela só depende de x_j (ou de x_j e x_k): fica tabelada na preparação, por
+#     faixa entre limiares consecutivos. Para |S| >= 3 as árvores são percorridas em lote (todas as
+#     árvores e amostras a cada nível), abrindo os dois ramos só nas features fora de S: poucos
+#     nós são visitados. Os valores de Shapley saem da combinação linear das 16 expectativas;
+#   - LSTM (sem árvores): Shapley exato contra a média de treino, avaliando as 16 coalizões.
+# As explicações ficam em cache por vetor de features (LRU), para a versão dos modelos carregada.
+import itertools
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import xgboost as xgb
+import core.models as models
+from services.ensemble import ENSEMBLE_MODO, FEATURES, MEMBROS, configuracao_cascata, pesos_ensemble, prever_membro
+
+# Número máximo de vetores de features com explicação em cache
+CACHE_MAXIMO = int(os.getenv("EXPLICACAO_CACHE_MAXIMO", "4096"))
+# Amostras percorridas juntas nas árvores (limita a memória do percurso em lote)
+LOTE_PERCURSO = 32
+
+_cache = OrderedDict()
+_cache_versao = None
+_trava_cache = threading.Lock()
+
+# Estruturas do TreeSHAP do Random Forest, preparadas uma vez por versão dos modelos
+_floresta = None
+_trava_preparo = threading.Lock()
+
+
+def _pesos_shapley(m):
+    """Matriz (2^m, m) que leva as expectativas das coalizões aos valores de Shapley."""
+    pesos = np.zeros((2 ** m, m))
+    for S in range(2 ** m):
+        k = bin(S).count('1')
+        for i in range(m):
+            if S >> i & 1:
+                pesos[S, i] += math.factorial(k - 1) * math.factorial(m - k) / math.factorial(m)
+            else:
+                pesos[S, i] -= math.factorial(k) * math.factorial(m - k - 1) / math.factorial(m)
+    return pesos
+
+
+PESOS_SHAPLEY = _pesos_shapley(len(FEATURES))
+
+
+def _limiares_float32(limiares):
+    """
+    O scikit-learn compara x em float32 com limiares float64 (x <= limiar). O maior float32 <= limiar
+    dá a mesma decisão numa comparação toda em float32.
+    """
+    l32 = limiares.astype(np.float32)
+    acima = l32.astype(np.float64) > limiares
+    l32[acima] = np.nextafter(l32[acima], np.float32(-np.inf))
+    return l32
+
+
+def _caixas_folhas(arvore, limiares32, faixas, m):
+    """
+    Caixa de cada folha da árvore em índices de faixa ([inicio, fim) por feature, com a faixa
+    de x = searchsorted(limiares, x)) e o produto das frações de cobertura por feature no caminho.
+    """
+    esq, dir_ = arvore.children_left, arvore.children_right
+    cobertura = arvore.weighted_n_node_samples
+    n = arvore.node_count
+    inicio = np.zeros((n, m), np.int32)
+    fim = np.tile(np.array([len(f) + 1 for f in faixas], np.int32), (n, 1))
+    fracao = np.ones((n, m))
+    indice = np.zeros(n, np.int32)
+    internos = np.flatnonzero(esq != -1)
+    for j in range(m):
+        sel = internos[arvore.feature[internos] == j]
+        indice[sel] = np.searchsorted(faixas[j], limiares32[sel])
+    frente = np.array([0])
+    while len(frente):
+        frente = frente[esq[frente] != -1]
+        f = arvore.feature[frente]
+        for filhos, esquerda in ((esq[frente], True), (dir_[frente], False)):
+            inicio[filhos], fim[filhos], fracao[filhos] = inicio[frente], fim[frente], fracao[frente]
+            if esquerda:
+                fim[filhos, f] = np.minimum(fim[frente, f], indice[frente] + 1)
+            else:
+                inicio[filhos, f] = np.maximum(inicio[frente, f], indice[frente] + 1)
+            fracao[filhos, f] *= cobertura[filhos] / cobertura[frente]
+        frente = np.concatenate([esq[frente], dir_[frente]])
+    folhas = np.flatnonzero(esq == -1)
+    return folhas, inicio[folhas], fim[folhas], fracao[folhas]
+
+
+def _somar_caixas(inicio, fim, pesos, formato):
+    """Soma de `pesos` sobre caixas em índices de faixa (diferenças nos cantos + soma acumulada)."""
+    total = np.zeros([t + 1 for t in formato])
+    d = len(formato)
+    for cantos in itertools.product((0, 1), repeat=d):
+        indices = tuple(np.where(c, fim[:, j], inicio[:, j]) for j, c in enumerate(cantos))
+        linear = np.ravel_multi_index(indices, total.shape)
+        total += np.bincount(linear, weights=pesos * (-1) ** sum(cantos), minlength=total.size).reshape(total.shape)
+    for eixo in range(d):
+        total = np.cumsum(total, axis=eixo)
+    return total[tuple(slice(0, t) for t in formato)]
+
+
+def _preparar_floresta(rf, m):
+    """Arrays de todas as árvores concatenadas (percurso em lote) e tabelas das coalizões com até 2 features."""
+    arvores = [e.tree_ for e in rf.estimators_]
+    classe = list(rf.classes_).index(1)
+    limiares32 = [_limiares_float32(a.threshold) for a in arvores]
+    faixas = [np.unique(np.concatenate([l[a.feature == j] for a, l in zip(arvores, limiares32)])) for j in range(m)]
+
+    tamanhos = np.array([a.node_count for a in arvores])
+    deslocamentos = np.concatenate([[0], np.cumsum(tamanhos)[:-1]])
+    esq, dir_, feat, limiar, razao = [], [], [], [], []
+    folhas_valor, folhas_inicio, folhas_fim, folhas_fracao = [], [], [], []
+    for a, l32, d in zip(arvores, limiares32, deslocamentos):
+        folha = a.children_left == -1
+        valor = a.value[:, 0, classe] / a.value[:, 0, :].sum(axis=1) / len(arvores)
+        esq.append(np.where(folha, -1, a.children_left + d))
+        dir_.append(np.where(folha, -1, a.children_right + d))
+        feat.append(a.feature)
+        # Nas folhas o limiar não é usado: guarda o valor da folha (probabilidade / número de árvores)
+        limiar.append(np.where(folha, valor, l32).astype(np.float32))
+        r = np.ones(a.node_count)
+        internos = np.flatnonzero(~folha)
+        for filhos in (a.children_left[internos], a.children_right[internos]):
+            r[filhos] = a.weighted_n_node_samples[filhos] / a.weighted_n_node_samples[internos]
+        razao.append(r)
+        folhas, inicio, fim, fracao = _caixas_folhas(a, l32, faixas, m)
+        folhas_valor.append(valor[folhas])
+        folhas_inicio.append(inicio)
+        folhas_fim.append(fim)
+        folhas_fracao.append(fracao)
+
+    valor = np.concatenate(folhas_valor)
+    inicio, fim, fracao = np.concatenate(folhas_inicio), np.concatenate(folhas_fim), np.concatenate(folhas_fracao)
+    tabelas = {}
+    for k in (1, 2):
+        for js in itertools.combinations(range(m), k):
+            fora = [j for j in range(m) if j not in js]
+            pesos = valor * np.prod(fracao[:, fora], axis=1)
+            tabelas[sum(1 << j for j in js)] = (list(js), _somar_caixas(inicio[:, list(js)], fim[:, list(js)], pesos, [len(faixas[j]) + 1 for j in js]))
+    return {
+        "versao": models.versao_modelos,
+        "esq": np.concatenate(esq).astype(np.int32),
+        "dir": np.concatenate(dir_).astype(np.int32),
+        "feat": np.concatenate(feat).astype(np.int8),
+        "limiar": np.concatenate(limiar),
+        "razao": np.concatenate(razao).astype(np.float32),
+        "raizes": deslocamentos,
+        "faixas": faixas,
+        "tabelas": tabelas,
+        "base": float(np.sum(valor * np.prod(fracao, axis=1))),
+        "folhas": len(valor),
+    }
+
+
+def _percorrer(fl, X, coalizoes):
+    """Expectativas E[S] (n, len(coalizoes)) percorrendo todas as árvores em lote, nível a nível."""
+    n, n_raizes = len(X), len(fl['raizes'])
+    amostra = np.repeat(np.arange(n), len(coalizoes) * n_raizes)
+    coalizao = np.tile(np.repeat(np.arange(len(coalizoes)), n_raizes), n)
+    mascara = np.asarray(coalizoes)[coalizao]
+    no = np.tile(fl['raizes'], len(coalizoes) * n).astype(np.int64)
+    peso = np.ones(len(no))
+    soma = np.zeros(n * len(coalizoes))
+    esq, dir_, feat, limiar, razao = fl['esq'], fl['dir'], fl['feat'], fl['limiar'], fl['razao']
+    while len(no):
+        folha = esq[no] == -1
+        if folha.any():
+            soma += np.bincount(amostra[folha] * len(coalizoes) + coalizao[folha],
+                                weights=peso[folha] * limiar[no[folha]], minlength=len(soma))
+            interno = ~folha
+            no, peso, amostra, coalizao, mascara = no[interno], peso[interno], amostra[interno], coalizao[interno], mascara[interno]
+        f = feat[no]
+        em_s = (mascara >> f) & 1 == 1
+        # Feature da coalizão: segue o ramo de x; fora dela: os dois ramos, pesados pela cobertura
+        seguinte = np.where(X[amostra[em_s], f[em_s]] <= limiar[no[em_s]], esq[no[em_s]], dir_[no[em_s]])
+        fora = ~em_s
+        e, d = esq[no[fora]], dir_[no[fora]]
+        no = np.concatenate([seguinte, e, d])
+        peso = np.concatenate([peso[em_s], peso[fora] * razao[e], peso[fora] * razao[d]])
+        amostra = np.concatenate([amostra[em_s], amostra[fora], amostra[fora]])
+        coalizao = np.concatenate([coalizao[em_s], coalizao[fora], coalizao[fora]])
+        mascara = np.concatenate([mascara[em_s], mascara[fora], mascara[fora]])
+    return soma.reshape(n, len(coalizoes))
+
+
+def preparar_explicacoes():
+    """Prepara o TreeSHAP do Random Forest para os modelos carregados (alguns segundos; uma vez por versão)."""
+    global _floresta
+    rf = models.rf_model
+    # Sem a classe positiva (floresta treinada só com exemplos sem enchente) o membro é tratado
+    # como não treinado, como em core/previsores.py (_prever_rf)
+    if not (hasattr(rf, 'estimators_') and rf.n_features_in_ == len(FEATURES) and 1 in rf.classes_):
+        return None
+    with _trava_preparo:
+        if _floresta is None or _floresta['versao'] != models.versao_modelos:
+            _floresta = _preparar_floresta(rf, len(FEATURES))
+            print(f"INFO: TreeSHAP do Random Forest preparado ({_floresta['folhas']} folhas, versão {models.versao_modelos}).")
+    return _floresta
+
+
+def _explicar_rf(X):
+    fl = preparar_explicacoes()
+    if fl is None:
+        return None
+    m = len(FEATURES)
+    n = len(X)
+    E = np.empty((n, 2 ** m))
+    E[:, 0] = fl['base']
+    faixa = np.stack([np.searchsorted(fl['faixas'][j], X[:, j], side='left') for j in range(m)], axis=1)
+    for S, (js, tabela) in fl['tabelas'].items():
+        E[:, S] = tabela[tuple(faixa[:, j] for j in js)]
+    grandes = [S for S in range(2 ** m) if bin(S).count('1') >= 3]
+    for a in range(0, n, LOTE_PERCURSO):
+        E[a:a + LOTE_PERCURSO, grandes] = _percorrer(fl, X[a:a + LOTE_PERCURSO], grandes)
+    return E[:, 0], E @ PESOS_SHAPLEY
+
+
+def _explicar_xgb(X):
+    if not (hasattr(models.xgb_model, '_Booster') and models.xgb_model.n_features_in_ == X.shape[1]):
+        return None
+    contribuicoes = models.xgb_model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True).astype(np.float64)
+    phi_logit, vies = contribuicoes[:, :-1], contribuicoes[:, -1]
+    margem = vies + phi_logit.sum(axis=1)
+    base, prob = 1 / (1 + np.exp(-vies)), 1 / (1 + np.exp(-margem))
+    # Reescala proporcional para o espaço de probabilidade (mantém base + soma = probabilidade)
+    delta = margem - vies
+    with np.errstate(divide='ignore', invalid='ignore'):
+        escala = np.where(np.abs(delta) > 1e-12, (prob - base) / delta, base * (1 - base))
+    return base, phi_logit * escala[:, None]
+
+
+def _media_treino():
+    """Média de cada feature no treino (manifesto), ou o centro da faixa do scaler do LSTM."""
+    try:
+        with open(models.ARQUIVO_MANIFESTO) as f:
+            manifesto = json.load(f)
+        referencia = manifesto.get('referencia_drift') or {}
+        if manifesto.get('versao_modelos') == models.versao_modelos and all(c in referencia for c in FEATURES):
+            return np.array([referencia[c]['media'] for c in FEATURES])
+    except (OSError, ValueError):
+        pass
+    return (models.lstm_scaler.data_min_ + models.lstm_scaler.data_max_) / 2
+
+
+def _explicar_lstm(X):
+    if models.lstm_scaler is None or not hasattr(models.lstm_model, 'lstm'):
+        return None
+    m, n = len(FEATURES), len(X)
+    referencia = _media_treino()
+    # Linha (amostra, S): x nas features de S, a média de treino nas demais
+    em_s = (np.arange(2 ** m)[:, None] >> np.arange(m)) & 1 == 1
+    Z = np.where(em_s[None, :, :], X[:, None, :], referencia[None, None, :]).reshape(-1, m)
+    E = prever_membro('lstm', Z, avisar=False).reshape(n, 2 ** m)
+    return E[:, 0], E @ PESOS_SHAPLEY
+
+
+EXPLICADORES = {'rf': _explicar_rf, 'xgb': _explicar_xgb, 'lstm': _explicar_lstm}
+
+
+def _calcular(X):
+    """Explicações de um lote (n, 4) de features, no mesmo modo do ensemble (média ponderada ou cascata)."""
+    n, m = X.shape
+    por_membro = {}
+    for membro in MEMBROS:
+        resultado = EXPLICADORES[membro](X)
+        # Modelo não treinado: probabilidade constante de 0.5, sem contribuições
+        por_membro[membro] = resultado if resultado is not None else (np.full(n, 0.5), np.zeros((n, m)))
+    pesos = pesos_ensemble()
+    base = sum(pesos[mb] * np.broadcast_to(por_membro[mb][0], (n,)) for mb in MEMBROS)
+    phi = sum(pesos[mb] * por_membro[mb][1] for mb in MEMBROS)
+
+    cascata = configuracao_cascata() if ENSEMBLE_MODO == 'cascata' else None
+    if cascata:
+        # Linhas fora da faixa de incerteza: a resposta (e a explicação) é só do primeiro modelo
+        base_p, phi_p = por_membro[cascata['primeiro']]
+        base_p = np.broadcast_to(base_p, (n,))
+        p_primeiro = base_p + phi_p.sum(axis=1)
+        certas = (p_primeiro < cascata['faixa'][0]) | (p_primeiro > cascata['faixa'][1])
+        base, phi = np.where(certas, base_p, base), np.where(certas[:, None], phi_p, phi)
+
+    explicacoes = []
+    for i in range(n):
+        explicacoes.append({
+            "probabilidade": round(float(base[i] + phi[i].sum()), 6),
+            "base": round(float(base[i]), 6),
+            "contribuicoes": {f: round(float(v), 6) for f, v in zip(FEATURES, phi[i])},
+            "modelos": {
+                mb: {
+                    "peso": pesos[mb],
+                    "base": round(float(np.broadcast_to(por_membro[mb][0], (n,))[i]), 6),
+                    "contribuicoes": {f: round(float(v), 6) for f, v in zip(FEATURES, por_membro[mb][1][i])},
+                }
+                for mb in MEMBROS
+            },
+        })
+    return explicacoes
+
+
+def explicar_lote(X):
+    """
+    Explicação de cada linha de X (n, 4), na ordem de FEATURES. Só as linhas sem explicação em
+    cache são calculadas, todas juntas num único lote.
+    """
+    global _cache_versao
+    X = np.asarray(X, dtype=np.float32).reshape(-1, len(FEATURES))
+    chaves = [tuple(linha.tolist()) for linha in X]
+    resultado = [None] * len(chaves)
+    with _trava_cache:
+        if _cache_versao != models.versao_modelos:
+            _cache.clear()
+            _cache_versao = models.versao_modelos
+        for i, chave in enumerate(chaves):
+            if chave in _cache:
+                _cache.move_to_end(chave)
+                resultado[i] = _cache[chave]
+    faltando = sorted({c for c, r in zip(chaves, resultado) if r is None})
+    if faltando:
+        novas = dict(zip(faltando, _calcular(np.array(faltando, dtype=np.float32))))
+        with _trava_cache:
+            for chave, explicacao in novas.items():
+                _cache[chave] = explicacao
+            while len(_cache) > CACHE_MAXIMO:
+                _cache.popitem(last=False)
+        resultado = [r if r is not None else novas[c] for c, r in zip(chaves, resultado)]
+    return resultado
@@ -0,0 +1,183 @@
+# --- START OF FILE exportacao.py ---
+# Exportação em massa das tabelas do banco em CSV, NDJSON ou Parquet, em fluxo.
+#
+# As linhas saem do cursor do SQLite em lotes (fetchmany) e cada lote é convertido e entregue
+# antes do próximo ser lido: a memória usada não depende do número de linhas exportadas.
+# Os geradores são síncronos; o StreamingResponse do FastAPI os consome numa thread, então uma
+# exportação longa não bloqueia o loop de eventos que atende as previsões.
+import csv
+import io
+import itertools
+import json
+import sqlite3
+import core.database as database
+
+TAMANHO_LOTE_PADRAO = 10_000
+
+# Tabelas exportáveis: colunas, coluna de estação, expressão de data/hora e coluna de versão de modelo
+TABELAS_EXPORTAVEIS = {
+    'previsoes': {
+        "tabela": "historico_previsao",
+        "colunas": ['municipio', 'data_hora', 'probabilidade', 'versao_modelo'],
+        "data": "data_hora",
+        "versao": "versao_modelo",
+    },
+    'backtest': {
+        "tabela": "backtest_previsao",
+        "colunas": ['versao_modelo', 'municipio', 'data_hora', 'prob_rf', 'prob_xgb', 'prob_lstm', 'probabilidade', 'enchente'],
+        "data": "data_hora",
+        "versao": "versao_modelo",
+    },
+    'clima': {
+        "tabela": "clima",
+        "colunas": ['municipio', 'Data', 'Hora', 'Precipitacao', 'Temperatura', 'Umidade', 'Vento', 'Pressao', 'Radiacao', 'Enchente'],
+        # A coluna Data vem do INMET como '2001-01-01' ou '2019/01/01'
+        "data": "replace(Data, '/', '-')",
+        "versao": None,
+    },
+}
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def montar_consulta(nome, municipios=None, inicio=None, fim=None, versao=None):
+    """
+    SQL da exportação com os filtros por estação, período ('YYYY-MM-DD' ou ISO) e versão de modelo.
+    Não há ORDER BY: as linhas saem na ordem de inserção, sem ordenação temporária no SQLite.
+    """
+    config = TABELAS_EXPORTAVEIS[nome]
+    condicoes, params = [], []
+    if municipios:
+        condicoes.append(f"municipio IN ({','.join('?' * len(municipios))})")
+        params.extend(municipios)
+    if inicio:
+        condicoes.append(f"{config['data']} >= ?")
+        params.append(inicio)
+    if fim:
+        condicoes.append(f"{config['data']} <= ?")
+        # Datas sem hora incluem o dia inteiro
+        params.append(fim + 'T23:59:59.999999' if len(fim) == 10 and config['data'] == 'data_hora' else fim)
+    if versao:
+        if config['versao'] is None:
+            raise ValueError(f"A tabela '{nome}' não tem versão de modelo.")
+        condicoes.append(f"{config['versao']} = ?")
+        params.append(versao)
+    where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return f"SELECT {', '.join(config['colunas'])} FROM {config['tabela']}{where}", params, config['colunas']
+
+
+def ler_em_lotes(sql, params, caminho_db='database.db', tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """Percorre o resultado com um cursor somente leitura, `tamanho_lote` linhas por vez."""
+    conn = sqlite3.connect(f"file:{caminho_db}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                break
+            yield linhas
+    finally:
+        conn.close()
+
+
+def gerar_csv(lotes, colunas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    escritor.writerow(colunas)
+    for linhas in lotes:
+        escritor.writerows(linhas)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def gerar_ndjson(lotes, colunas):
+    for linhas in lotes:
+        yield ''.join(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + '\n' for linha in linhas).encode('utf-8')
+
+
+class _SaidaParquet(io.RawIOBase):
+    """Arquivo só de escrita que acumula os bytes recebidos até serem retirados com `retirar()`."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def retirar(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def gerar_parquet(lotes, colunas, tipos):
+    """
+    Um row group do Parquet por lote; cada row group é enviado assim que é escrito.
+    `tipos` são os tipos declarados das colunas no SQLite ('TEXT', 'REAL', 'INTEGER').
+    """
+    # pyarrow é opcional: só é necessário para este formato
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    tipos_arrow = {'INTEGER': pa.int64(), 'REAL': pa.float64()}
+    esquema = pa.schema([(c, tipos_arrow.get(tipos.get(c, '').upper(), pa.string())) for c in colunas])
+    saida = _SaidaParquet()
+    escritor = pq.ParquetWriter(saida, esquema)
+    for linhas in lotes:
+        valores = list(zip(*linhas))
+        tabela = pa.Table.from_arrays([pa.array(v, type=campo.type) for v, campo in zip(valores, esquema)], schema=esquema)
+        escritor.write_table(tabela)
+        yield saida.retirar()
+    escritor.close()
+    yield saida.retirar()
+
+
+def tipos_colunas(tabela, caminho_db='database.db'):
+    """Tipos declarados das colunas da tabela no SQLite."""
+    conn = sqlite3.connect(f"file:{caminho_db}?mode=ro", uri=True)
+    try:
+        return {linha[1]: linha[2] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+    finally:
+        conn.close()
+
+
+def parquet_disponivel():
+    try:
+        import pyarrow.parquet # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def exportar(nome, formato='csv', municipios=None, inicio=None, fim=None, versao=None,
+             caminho_db=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Gerador de bytes com a exportação da tabela `nome` no `formato` pedido. Sem `caminho_db`, a
+    tabela é lida dos seus bancos (core/database.py): com 'clima' e 'historico_previsao'
+    particionadas por UF, os shards saem um após o outro, e só os das estações pedidas.
+    """
+    sql, params, colunas = montar_consulta(nome, municipios, inicio, fim, versao)
+    tabela = TABELAS_EXPORTAVEIS[nome]['tabela']
+    caminhos = [caminho_db] if caminho_db else database.bancos(tabela, municipios)
+    lotes = itertools.chain.from_iterable(ler_em_lotes(sql, params, c, tamanho_lote) for c in caminhos)
+    if formato == 'parquet':
+        return gerar_parquet(lotes, colunas, tipos_colunas(tabela, caminhos[0]) if caminhos else {})
+    if formato == 'ndjson':
+        return gerar_ndjson(lotes, colunas)
+    return gerar_csv(lotes, colunas)
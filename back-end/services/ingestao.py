@@ -0,0 +1,245 @@
+# --- START OF FILE ingestao.py ---
+# Ingestão contínua de observações das estações na tabela 'clima', sem reprocessar o INMET inteiro.
+#
+# Um lote (JSON da API ou linhas novas de um CSV acompanhado por ingerir.py) é validado de forma
+# vetorizada, com o mesmo tratamento do sentinela -9999 de processa_arquivos_inmet, e gravado com
+# executemany numa única transação (uma por shard, em paralelo, com a 'clima' particionada por UF;
+# ver core/database.py). Observações já gravadas são descartadas pelo índice único da 'clima'
+# (INSERT OR IGNORE), inclusive as gravadas por outro worker ou pelo ingerir.py. O estado por
+# estação (última observação e rótulo de enchente) fica em memória: a observação mais recente de
+# cada estação é pontuada em lote e atualiza o mapa de risco.
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+import unidecode
+import core.database as database
+import core.models as models
+import services.risco as risco
+from services.ensemble import FEATURES, prever_ensemble
+
+MEDIDAS = ['Precipitacao', 'Temperatura', 'Umidade', 'Vento', 'Pressao', 'Radiacao']
+# Sem estas o registro não serve ao modelo (o mesmo dropna de processa_arquivos_inmet)
+MEDIDAS_ESSENCIAIS = ['Precipitacao', 'Temperatura', 'Umidade', 'Vento']
+COLUNAS_CLIMA = ['Data', 'Hora', 'Precipitacao', 'Temperatura', 'Umidade', 'Vento', 'Pressao', 'Radiacao', 'Enchente', 'municipio']
+# Valor usado pelo INMET para medida ausente
+SENTINELA_INMET = -9999
+# Faixas fisicamente plausíveis; valores fora delas são tratados como ausentes
+LIMITES_MEDIDAS = {
+    'Precipitacao': (0, 500),
+    'Temperatura': (-40, 60),
+    'Umidade': (0, 100),
+    'Vento': (0, 100),
+    'Pressao': (300, 1100),
+    'Radiacao': (0, 10_000),
+}
+
+# Linhas aceitas por lote na API
+MAXIMO_LINHAS_LOTE = int(os.getenv("INGESTAO_MAXIMO_LINHAS", "50000"))
+# Observações mais antigas que isto são gravadas, mas não atualizam o mapa de risco
+IDADE_MAXIMA_RISCO = timedelta(hours=float(os.getenv("INGESTAO_IDADE_MAXIMA_RISCO_HORAS", "6")))
+# Tolerância para relógios adiantados das estações (horários em UTC)
+TOLERANCIA_FUTURO = timedelta(hours=1)
+
+# Catálogo: nome normalizado -> (DC_NOME, CD_ESTACAO, SG_ESTADO, lat, lon)
+_catalogo = {}
+# Estado por estação (chave: DC_NOME): {"ultima": 'YYYY-MM-DD HH:MM' (UTC), "enchente": 0/1}
+estado = {}
+# Um lote por vez: o estado e a escrita no SQLite são compartilhados entre as threads da API
+_trava = threading.Lock()
+
+
+def _normalizar(nome):
+    return unidecode.unidecode(nome).upper().strip() if isinstance(nome, str) else None
+
+
+def _agora_utc():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def preparar_ingestao(df_estacoes):
+    """Monta o índice de estações do catálogo do INMET (chamado na inicialização da API e por ingerir.py)."""
+    df = df_estacoes.dropna(subset=['CD_ESTACAO', 'DC_NOME', 'VL_LATITUDE', 'VL_LONGITUDE'])
+    _catalogo.clear()
+    for nome, codigo, uf, lat, lon in df[['DC_NOME', 'CD_ESTACAO', 'SG_ESTADO', 'VL_LATITUDE', 'VL_LONGITUDE']].itertuples(index=False, name=None):
+        _catalogo.setdefault(_normalizar(nome), (nome, codigo, uf, float(lat), float(lon)))
+
+
+def municipio_da_estacao(codigo):
+    """DC_NOME da estação com o código WMO dado (cabeçalho dos CSVs do INMET), ou None."""
+    return next((nome for nome, cod, *_ in _catalogo.values() if cod == codigo), None)
+
+
+def validar_observacoes(df):
+    """
+    Valida e normaliza um lote no esquema da tabela 'clima' (Data e Hora em UTC; Enchente opcional).
+    Aceita os formatos do INMET: Data '2019/01/01' ou '2019-01-01', Hora '0000 UTC' ou '00:00',
+    decimais com vírgula. Retorna (observações válidas, contagem de rejeitadas por motivo).
+    """
+    faltando = [c for c in ['municipio', 'Data', 'Hora', *MEDIDAS_ESSENCIAIS] if c not in df.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes: {faltando}.")
+    df = df.copy()
+    for coluna in MEDIDAS + ['Enchente']:
+        if coluna not in df.columns:
+            df[coluna] = np.nan
+    rejeitadas = {}
+
+    def rejeitar(mascara, motivo):
+        nonlocal df
+        total = int(mascara.sum())
+        if total:
+            rejeitadas[motivo] = rejeitadas.get(motivo, 0) + total
+            df = df[~mascara]
+
+    # Estação: o nome do catálogo do INMET, como em prepara_dados.py
+    nomes = df['municipio'].astype(str)
+    mapa = {n: _catalogo.get(_normalizar(n), (None,))[0] for n in nomes.unique()}
+    df['municipio'] = nomes.map(mapa)
+    rejeitar(df['municipio'].isna(), 'estacao_desconhecida')
+
+    # Data e hora normalizadas para 'YYYY-MM-DD' e 'HH:MM'
+    df['Data'] = df['Data'].astype(str).str.strip().str.replace('/', '-', regex=False)
+    hora = df['Hora'].astype(str).str.replace('UTC', '', regex=False).str.replace(':', '', regex=False).str.strip().str.zfill(4).str[:4]
+    df['Hora'] = hora.str[:2] + ':' + hora.str[2:]
+    instante = pd.to_datetime(df['Data'] + ' ' + df['Hora'], format='%Y-%m-%d %H:%M', errors='coerce')
+    rejeitar(instante.isna(), 'data_invalida')
+    instante = instante[df.index]
+    rejeitar(instante > pd.Timestamp(_agora_utc() + TOLERANCIA_FUTURO), 'data_futura')
+
+    # Medidas: vírgula decimal, sentinela -9999 e valores impossíveis viram ausentes
+    for coluna in MEDIDAS:
+        valores = pd.to_numeric(df[coluna].astype(str).str.replace(',', '.', regex=False), errors='coerce')
+        valores = valores.mask(valores == SENTINELA_INMET)
+        minimo, maximo = LIMITES_MEDIDAS[coluna]
+        df[coluna] = valores.mask((valores < minimo) | (valores > maximo))
+    rejeitar(df[MEDIDAS_ESSENCIAIS].isna().any(axis=1), 'medidas_ausentes')
+
+    df['Enchente'] = pd.to_numeric(df['Enchente'], errors='coerce')
+    # A mesma observação repetida no lote: fica a última
+    antes = len(df)
+    df = df.drop_duplicates(subset=['municipio', 'Data', 'Hora'], keep='last')
+    if len(df) < antes:
+        rejeitadas['duplicada_no_lote'] = antes - len(df)
+    return df[COLUNAS_CLIMA], rejeitadas
+
+
+def _carregar_estado(conn, municipios):
+    """Lê do banco a última observação e o rótulo das estações que ainda não estão em memória."""
+    novos = [m for m in municipios if m not in estado]
+    if not novos:
+        return
+    linhas = conn.execute(f"""
+        SELECT municipio,
+               MAX(replace(Data, '/', '-') || ' ' || substr(replace(Hora, ':', ''), 1, 2) || ':' || substr(replace(Hora, ':', ''), 3, 2)),
+               MAX(Enchente)
+        FROM clima WHERE municipio IN ({','.join('?' * len(novos))}) GROUP BY municipio
+    """, novos).fetchall()
+    for municipio, ultima, enchente in linhas:
+        estado[municipio] = {"ultima": ultima, "enchente": int(enchente or 0)}
+    for municipio in novos:
+        estado.setdefault(municipio, {"ultima": None, "enchente": 0})
+
+
+def _registros_de_risco(recentes):
+    """Pontua de uma vez a observação mais recente de cada estação e monta os registros do snapshot."""
+    X = recentes[FEATURES].to_numpy(dtype=np.float64)
+    probabilidades = prever_ensemble(X, avisar=False)
+    agora = datetime.now().isoformat()
+    registros = []
+    for municipio, features, probabilidade in zip(recentes['municipio'], X, probabilidades):
+        nome, codigo, uf, lat, lon = _catalogo[_normalizar(municipio)]
+        registros.append({
+            "codigo": codigo,
+            "nome": nome,
+            "uf": uf,
+            "lat": lat,
+            "lon": lon,
+            "probabilidade": float(probabilidade),
+            "dados_atuais": dict(zip(FEATURES, map(float, features))),
+            "versao_modelo": models.versao_modelos,
+            "atualizado_em": agora,
+        })
+    return registros
+
+
+def _gravar_no_banco(item):
+    """
+    Grava as observações de um banco (shard); retorna (inseridas, chave 'Data Hora', repetidas). A unicidade é garantida pelo índice idx_clima_observacao (INSERT OR IGNORE):
+    observações já gravadas por outro worker ou pelo ingerir.py são ignoradas, e observações
+    atrasadas (anteriores à última da estação) são inseridas normalmente.
+    """
+    caminho, validas = item
+    conn = database.conectar('clima', caminho=caminho)
+    try:
+        _carregar_estado(conn, validas['municipio'].unique().tolist())
+        # Sem rótulo no lote, vale o da estação (o rótulo da ANA é por município)
+        rotulos = validas['municipio'].map({m: estado[m]['enchente'] for m in validas['municipio'].unique()})
+        validas = validas.assign(Enchente=validas['Enchente'].fillna(rotulos).astype(int))
+        linhas = validas.astype(object).where(validas.notna(), None).itertuples(index=False, name=None)
+        # IMMEDIATE: a trava de escrita vale desde a leitura do último id, então as linhas com id
+        # maior são exatamente as inseridas por esta transação
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ultimo_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM clima").fetchone()[0]
+            antes = conn.total_changes
+            conn.executemany(f"""
+                INSERT OR IGNORE INTO clima ({', '.join(COLUNAS_CLIMA)})
+                VALUES ({', '.join('?' * len(COLUNAS_CLIMA))})
+            """, linhas)
+            inseridas = conn.total_changes - antes
+            chaves = conn.execute("SELECT municipio, Data, Hora FROM clima WHERE id > ?", (ultimo_id,)).fetchall()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+    # Repetidas: as que o índice recusou (já no banco ou repetidas dentro do próprio lote)
+    gravadas = (validas.drop_duplicates(['municipio', 'Data', 'Hora'])
+                .merge(pd.DataFrame(chaves, columns=['municipio', 'Data', 'Hora']), on=['municipio', 'Data', 'Hora']))
+    return gravadas, gravadas['Data'] + ' ' + gravadas['Hora'], len(validas) - inseridas
+
+
+def ingerir(df):
+    """
+    Valida e grava um lote de observações. Observações já gravadas são ignoradas pelo índice único
+    da 'clima' (reenviar um lote ou reler um arquivo não duplica linhas); observações atrasadas são
+    gravadas, mas só as mais novas que a última da estação atualizam o risco. Se os modelos
+    estiverem carregados, as estações com observação recente têm o risco recalculado e
+    gravado em 'snapshot_risco'; os registros são retornados para o chamador aplicá-los ao
+    snapshot em memória (risco.incorporar_registros). Retorna (resumo, registros).
+    """
+    recebidas = len(df)
+    validas, rejeitadas = validar_observacoes(df)
+    with _trava:
+        # Com a 'clima' particionada por UF, cada shard recebe só as suas estações, em paralelo
+        gravados = (database.em_paralelo(_gravar_no_banco, database.particionar('clima', validas).items())
+                    or [(validas, validas['Data'] + ' ' + validas['Hora'], 0)])
+        inseridas = pd.concat([g[0] for g in gravados])
+        chave = pd.concat([g[1] for g in gravados])
+        repetidas = sum(g[2] for g in gravados)
+
+        # Estado atualizado só depois do commit; uma observação atrasada não recua a última da estação
+        recentes = inseridas.assign(chave=chave).sort_values('chave').groupby('municipio').tail(1)
+        recentes = recentes[np.array([c > (estado[m]['ultima'] or '') for m, c in zip(recentes['municipio'], recentes['chave'])], dtype=bool)]
+        for municipio, ultima_chave in zip(recentes['municipio'], recentes['chave']):
+            estado[municipio]['ultima'] = ultima_chave
+
+    registros = []
+    limite = (_agora_utc() - IDADE_MAXIMA_RISCO).strftime('%Y-%m-%d %H:%M')
+    recentes = recentes[recentes['chave'] >= limite]
+    if models.modelos_carregados and not recentes.empty:
+        registros = _registros_de_risco(recentes)
+        risco._gravar_snapshot(registros)
+
+    resumo = {
+        "recebidas": recebidas,
+        "inseridas": len(inseridas),
+        "repetidas": repetidas,
+        "rejeitadas": rejeitadas,
+        "estacoes": sorted(set(inseridas['municipio'])),
+        "risco_atualizado": [r['codigo'] for r in registros],
+    }
+    return resumo, registros
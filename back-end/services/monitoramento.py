@@ -0,0 +1,186 @@
+# --- START OF FILE monitoramento.py ---
+# Monitoramento de drift das entradas dos modelos em relação à distribuição de treino.
+#
+# prever_ensemble entrega cada matriz de entrada a registrar(), que apenas a enfileira num deque
+# (append é atômico, sem trava no caminho da requisição). As matrizes pendentes são contadas em
+# lote, de forma vetorizada, nas faixas do histograma de referência salvo no manifesto do
+# treinamento: a memória é uma contagem por faixa e feature, independente do tráfego. A cada
+# DRIFT_INTERVALO_SEGUNDOS o relatório (PSI e KS por feature) é recalculado e um aviso é emitido
+# quando alguma feature passa a ter drift alto.
+#
+# Cada worker do servidor.py mede as entradas que ele próprio recebeu; como as requisições são
+# distribuídas entre os workers, a distribuição de cada um é uma amostra da distribuição total.
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+import numpy as np
+import core.models as models
+from core.drift import classificar_psi, contar_faixas, ks, psi
+
+INTERVALO_SEGUNDOS = int(os.getenv("DRIFT_INTERVALO_SEGUNDOS", "60"))
+# Duração da janela de comparação; ao final, ela vira a janela anterior e uma nova começa
+JANELA_SEGUNDOS = float(os.getenv("DRIFT_JANELA_HORAS", "24")) * 3600
+# Abaixo disto (entradas na janela) as métricas não são calculadas
+MINIMO_AMOSTRAS = int(os.getenv("DRIFT_MINIMO_AMOSTRAS", "200"))
+# Matrizes enfileiradas antes de uma contagem fora do ciclo periódico (limita a memória da fila)
+MAXIMO_PENDENTES = 1024
+
+# Referência do treinamento: features (na ordem de entrada dos modelos), limites e proporções
+features = []
+_limites = []
+_proporcoes = []
+_pendentes = deque()
+# Protege as contagens; registrar() nunca espera por ela
+_trava = threading.Lock()
+janela_atual = None
+janela_anterior = None
+acumulado = None
+janela_iniciada_em = None
+janela_anterior_iniciada_em = None
+iniciado_em = None
+_features_em_alerta = set()
+tarefa_monitoramento = None
+
+
+def _zeros():
+    return [np.zeros(len(limites) + 1, dtype=np.int64) for limites in _limites]
+
+
+def carregar_referencia(caminho=models.ARQUIVO_MANIFESTO):
+    """Carrega o histograma de referência do manifesto, se ele corresponder aos modelos carregados."""
+    global features, _limites, _proporcoes, janela_atual, janela_anterior, acumulado, janela_iniciada_em, janela_anterior_iniciada_em, iniciado_em
+    features = []
+    if not os.path.exists(caminho):
+        print(f"AVISO: Manifesto '{caminho}' não encontrado. Monitoramento de drift desativado.")
+        return False
+    with open(caminho) as f:
+        manifesto = json.load(f)
+    referencia = manifesto.get('referencia_drift')
+    if not referencia:
+        print("AVISO: O manifesto dos modelos não tem referência de drift (treinamento anterior a ela). "
+              "Rode treinamento_acelerado.py para ativar o monitoramento de drift.")
+        return False
+    if manifesto.get('versao_modelos') != models.versao_modelos:
+        print(f"AVISO: A referência de drift em '{caminho}' é de outra versão dos modelos. Monitoramento de drift desativado.")
+        return False
+    _limites = [np.array(r['limites'], dtype=np.float64) for r in referencia.values()]
+    _proporcoes = [np.array(r['proporcoes'], dtype=np.float64) for r in referencia.values()]
+    features = list(referencia)
+    janela_atual, janela_anterior, acumulado = _zeros(), None, _zeros()
+    janela_iniciada_em, janela_anterior_iniciada_em = datetime.now(), None
+    iniciado_em = janela_iniciada_em
+    _pendentes.clear()
+    print(f"INFO: Monitoramento de drift ativo para {features} (versão {models.versao_modelos}).")
+    return True
+
+
+def registrar(X):
+    """Registra uma matriz de entrada (linhas x features) dos modelos. Custo constante: só enfileira."""
+    if not features:
+        return
+    _pendentes.append(X)
+    if len(_pendentes) > MAXIMO_PENDENTES:
+        consolidar(esperar=False)
+
+
+def consolidar(esperar=True):
+    """Conta as matrizes pendentes nas faixas de referência. Sem `esperar`, desiste se outra thread já estiver contando."""
+    if not _trava.acquire(blocking=esperar):
+        return
+    try:
+        matrizes = []
+        while _pendentes:
+            matrizes.append(_pendentes.popleft())
+        if not matrizes:
+            return
+        X = np.vstack([np.asarray(m, dtype=np.float64).reshape(-1, len(features)) for m in matrizes])
+        for j, limites in enumerate(_limites):
+            contagens = contar_faixas(X[:, j], limites)
+            janela_atual[j] += contagens
+            acumulado[j] += contagens
+    finally:
+        _trava.release()
+
+
+def _girar_janela(agora):
+    global janela_atual, janela_anterior, janela_iniciada_em, janela_anterior_iniciada_em
+    if (agora - janela_iniciada_em).total_seconds() >= JANELA_SEGUNDOS:
+        janela_anterior, janela_anterior_iniciada_em = janela_atual, janela_iniciada_em
+        janela_atual, janela_iniciada_em = _zeros(), agora
+
+
+def _pontuar(contagens, iniciada_em):
+    resultado = {"iniciada_em": iniciada_em.isoformat(timespec='seconds'), "amostras": int(contagens[0].sum()), "features": {}}
+    for feature, proporcoes, c in zip(features, _proporcoes, contagens):
+        n = int(c.sum())
+        if n < MINIMO_AMOSTRAS:
+            resultado['features'][feature] = {"amostras": n, "psi": None, "ks": None, "drift": 'amostra_insuficiente'}
+            continue
+        valor_psi = psi(proporcoes, c)
+        resultado['features'][feature] = {
+            "amostras": n,
+            "psi": round(valor_psi, 4),
+            "ks": round(ks(proporcoes, c), 4),
+            "drift": classificar_psi(valor_psi),
+        }
+    return resultado
+
+
+def calcular_relatorio():
+    """PSI e KS de cada feature na janela atual, na anterior (completa) e desde o início do processo."""
+    if not features:
+        return {"ativo": False, "versao_modelo": models.versao_modelos}
+    consolidar()
+    agora = datetime.now()
+    with _trava:
+        _girar_janela(agora)
+        relatorio = {
+            "ativo": True,
+            "versao_modelo": models.versao_modelos,
+            "calculado_em": agora.isoformat(timespec='seconds'),
+            "janela_horas": JANELA_SEGUNDOS / 3600,
+            "janela_atual": _pontuar(janela_atual, janela_iniciada_em),
+            "janela_anterior": _pontuar(janela_anterior, janela_anterior_iniciada_em) if janela_anterior is not None else None,
+            "acumulado": _pontuar(acumulado, iniciado_em),
+        }
+    return relatorio
+
+
+def _avisar(relatorio):
+    """Avisa quando uma feature entra em drift alto na janela atual (uma vez, até ela sair)."""
+    em_alerta = {f for f, m in relatorio['janela_atual']['features'].items() if m['drift'] == 'alto'}
+    for feature in sorted(em_alerta - _features_em_alerta):
+        m = relatorio['janela_atual']['features'][feature]
+        print(f"AVISO: Drift alto em '{feature}' na janela atual (PSI {m['psi']}, KS {m['ks']}, {m['amostras']} entradas).")
+    _features_em_alerta.clear()
+    _features_em_alerta.update(em_alerta)
+
+
+async def loop_monitoramento(intervalo=INTERVALO_SEGUNDOS):
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            _avisar(calcular_relatorio())
+        except Exception as e:
+            print(f"ERRO: Falha ao calcular o drift das entradas: {e}")
+
+
+def iniciar_monitoramento():
+    """Carrega a referência e inicia o cálculo periódico no loop de eventos atual."""
+    global tarefa_monitoramento
+    try:
+        ativo = carregar_referencia()
+    except Exception as e:
+        print(f"ERRO: Falha ao carregar a referência de drift: {e}")
+        ativo = False
+    if ativo and INTERVALO_SEGUNDOS > 0:
+        tarefa_monitoramento = asyncio.create_task(loop_monitoramento())
+    return tarefa_monitoramento
+
+
+def parar_monitoramento():
+    if tarefa_monitoramento is not None:
+        tarefa_monitoramento.cancel()
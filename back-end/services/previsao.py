@@ -0,0 +1,139 @@
+# --- START OF FILE previsao.py ---
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import core.models as models
+import services.weather as weather
+from services.ensemble import FEATURES, prever_ensemble
+
+# Horizonte máximo da série de risco. Para cobrir 72 horas a partir de qualquer hora do dia são
+# pedidos 4 dias; no plano gratuito a weatherapi.com devolve só 3 e a série termina antes
+HORAS_MAXIMAS = 72
+DIAS_PREVISAO = 4
+# A weatherapi.com recalcula a previsão a cada 15 minutos; até lá a resposta em cache continua válida
+INTERVALO_UPSTREAM = int(os.getenv("PREVISAO_INTERVALO_UPSTREAM_SEGUNDOS", "900"))
+# Tempo mínimo em cache, para quando a última atualização do upstream já estiver atrasada
+CACHE_MINIMO_SEGUNDOS = 60
+# Número máximo de coordenadas mantidas em cache (as menos usadas saem primeiro)
+CACHE_MAXIMO = int(os.getenv("PREVISAO_CACHE_MAXIMO", "2048"))
+
+# Cache por coordenada: (lat, lon) -> {"expira_em", "horas", "probabilidades"}, com as horas já
+# convertidas para features e as probabilidades de todas as horas por versão dos modelos
+_cache = OrderedDict()
+_trava_cache = threading.Lock()
+# Coordenadas com consulta à weatherapi.com em andamento: chave -> Event sinalizado ao terminar.
+# Pedidos simultâneos para a mesma coordenada esperam essa consulta em vez de repeti-la
+_em_andamento = {}
+# Espera máxima por uma consulta em andamento de outra thread (as tentativas de get_forecast_data)
+ESPERA_CONSULTA_SEGUNDOS = 60
+
+
+def extrair_horas(dados):
+    """
+    Converte o JSON de forecast.json numa lista de horas (da hora atual em diante), cada uma com
+    epoch, horário local e as features na ordem de FEATURES.
+    """
+    atual = dados['current']['last_updated_epoch']
+    horas = []
+    for dia in dados['forecast']['forecastday']:
+        for hora in dia['hour']:
+            # A hora corrente (que começou antes da última atualização) também entra
+            if hora['time_epoch'] + 3600 <= atual:
+                continue
+            horas.append({
+                "epoch": hora['time_epoch'],
+                "timestamp": hora['time'],
+                "features": [hora['temp_c'], hora['humidity'], hora['wind_kph'], hora.get('precip_mm', 0)],
+            })
+    return horas
+
+
+def _expiracao(dados, agora):
+    """Próxima atualização esperada do upstream, com um mínimo de CACHE_MINIMO_SEGUNDOS."""
+    proxima = dados['current']['last_updated_epoch'] + INTERVALO_UPSTREAM
+    return max(proxima, agora + CACHE_MINIMO_SEGUNDOS)
+
+
+def obter_previsao_horaria(lat, lon):
+    """
+    Previsão horária das próximas HORAS_MAXIMAS horas para a coordenada, do cache se ainda válida.
+    Retorna (item do cache, veio_do_cache); o item é None se a weatherapi.com não responder.
+    Pedidos simultâneos para a mesma coordenada fora do cache fazem uma única consulta.
+    """
+    chave = (round(lat, 4), round(lon, 4))
+    agora = time.time()
+    with _trava_cache:
+        item = _cache.get(chave)
+        if item is not None and item['expira_em'] > agora:
+            _cache.move_to_end(chave)
+            return item, True
+        evento = _em_andamento.get(chave)
+        consultar = evento is None
+        if consultar:
+            evento = _em_andamento[chave] = threading.Event()
+
+    if not consultar:
+        # Outra thread já consulta esta coordenada: usa o resultado dela (None se ela falhar)
+        evento.wait(ESPERA_CONSULTA_SEGUNDOS)
+        with _trava_cache:
+            item = _cache.get(chave)
+        return (item, True) if item is not None and item['expira_em'] > agora else (None, False)
+
+    try:
+        dados = weather.get_forecast_data(lat, lon, dias=DIAS_PREVISAO)
+        if dados is None:
+            return None, False
+        item = {"expira_em": _expiracao(dados, agora), "horas": extrair_horas(dados)[:HORAS_MAXIMAS], "probabilidades": {}}
+        with _trava_cache:
+            _cache[chave] = item
+            _cache.move_to_end(chave)
+            while len(_cache) > CACHE_MAXIMO:
+                _cache.popitem(last=False)
+        return item, False
+    finally:
+        with _trava_cache:
+            del _em_andamento[chave]
+        evento.set()
+
+
+def prever_horizonte(lat, lon, horas=24):
+    """
+    Série de risco de enchente para as próximas `horas` horas. Todas as horas da previsão são
+    pontuadas de uma vez, numa única matriz (horas, 4) enviada ao ensemble, e o resultado fica
+    no cache junto com a previsão: pedidos com outro horizonte só recortam a série.
+    """
+    item, do_cache = obter_previsao_horaria(lat, lon)
+    if item is None:
+        return {"error": "Não foi possível obter a previsão do tempo para as coordenadas fornecidas."}
+    if not item['horas']:
+        return {"error": "A previsão do tempo retornada não contém horas futuras."}
+
+    probabilidades = item['probabilidades'].get(models.versao_modelos)
+    if probabilidades is None:
+        X = np.array([h['features'] for h in item['horas']], dtype=np.float64)
+        probabilidades = prever_ensemble(X, avisar=False)
+        item['probabilidades'] = {models.versao_modelos: probabilidades}
+    previsao = item['horas'][:horas]
+    probabilidades = probabilidades[:horas]
+
+    serie = [
+        {
+            "timestamp": h['timestamp'],
+            "probability": float(p),
+            "dados": dict(zip(FEATURES, h['features'])),
+        }
+        for h, p in zip(previsao, probabilidades)
+    ]
+    pico = int(np.argmax(probabilidades))
+    return {
+        "lat": lat,
+        "lon": lon,
+        "horas": len(serie),
+        "probabilidade_maxima": float(probabilidades[pico]),
+        "horario_pico": serie[pico]['timestamp'],
+        "versao_modelo": models.versao_modelos,
+        "cache": do_cache,
+        "serie": serie,
+    }
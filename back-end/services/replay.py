@@ -0,0 +1,208 @@
+# --- START OF FILE replay.py ---
+import itertools
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+import torch
+import core.database as database
+import core.models as models
+from core.models import carregar_modelos
+from services.ensemble import FEATURES, prever_probabilidades, combinar_probabilidades
+
+TAMANHO_LOTE_PADRAO = 50_000
+
+
+def normalizar_data_hora(datas, horas):
+    """
+    Monta 'YYYY-MM-DDTHH:MM' a partir das colunas Data e Hora da tabela 'clima'.
+    Aceita os dois formatos do INMET: '2001-01-01'/'00:00' e '2019/01/01'/'0000 UTC'.
+    """
+    datas = datas.astype(str).str.replace('/', '-', regex=False)
+    horas = horas.astype(str).str.replace(' UTC', '', regex=False)
+    sem_separador = horas.str.len() == 4
+    horas = horas.where(~sem_separador, horas.str[:2] + ':' + horas.str[2:])
+    return datas + 'T' + horas
+
+
+def ler_clima_em_lotes(conn, municipios=None, inicio=None, fim=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Lê a tabela 'clima' em lotes de `tamanho_lote` linhas, ordenada por estação e horário,
+    sem carregar a tabela inteira em memória (o cursor do SQLite é consumido com fetchmany).
+    `inicio` e `fim` filtram pela coluna Data ('YYYY-MM-DD'), normalizada como em services/exportacao.py
+    ('2019/01/01' não se ordena junto com datas ISO).
+    """
+    condicoes = []
+    params = []
+    if municipios:
+        condicoes.append(f"municipio IN ({','.join('?' * len(municipios))})")
+        params.extend(municipios)
+    if inicio:
+        condicoes.append("replace(Data, '/', '-') >= ?")
+        params.append(inicio)
+    if fim:
+        condicoes.append("replace(Data, '/', '-') <= ?")
+        params.append(fim)
+    where = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+
+    colunas = ['municipio', 'Data', 'Hora'] + FEATURES + ['Enchente']
+    cursor = conn.execute(
+        f"SELECT {', '.join(colunas)} FROM clima {where} ORDER BY municipio, Data, Hora",
+        params
+    )
+    while True:
+        linhas = cursor.fetchmany(tamanho_lote)
+        if not linhas:
+            break
+        yield pd.DataFrame.from_records(linhas, columns=colunas)
+
+
+def _inicializar_trabalhador():
+    """Carrega os modelos uma vez em cada processo do pool, com 1 thread de torch por processo."""
+    torch.set_num_threads(1)
+    carregar_modelos()
+
+
+def pontuar_lote(df_lote):
+    """
+    Pontua um lote da tabela 'clima' com o mesmo código do ensemble usado pela API.
+    Linhas com features ausentes são descartadas. Retorna um DataFrame pronto para gravar.
+    """
+    df_lote = df_lote.dropna(subset=FEATURES)
+    pred_rf, pred_xgb, pred_lstm = prever_probabilidades(df_lote[FEATURES].values, avisar=False)
+    return pd.DataFrame({
+        'versao_modelo': models.versao_modelos,
+        'municipio': df_lote['municipio'].values,
+        'data_hora': normalizar_data_hora(df_lote['Data'], df_lote['Hora']).values,
+        'prob_rf': pred_rf,
+        'prob_xgb': pred_xgb,
+        'prob_lstm': pred_lstm,
+        'probabilidade': combinar_probabilidades(pred_rf, pred_xgb, pred_lstm),
+        'enchente': df_lote['Enchente'].values,
+    })
+
+
+def _coordenadas_municipios(conn):
+    """Mapeia o nome da estação para o identificador 'lat,lon' usado em 'historico_previsao'."""
+    df = pd.read_sql_query("SELECT nome, latitude, longitude FROM municipios", conn)
+    return {nome: f"{lat},{lon}" for nome, lat, lon in df.itertuples(index=False)}
+
+
+def _gravar_resultados(conn, df_resultado, coordenadas=None, conexoes_historico=None, substituir=False):
+    """
+    Grava um lote de resultados em uma única transação (com 'historico_previsao' particionada por
+    UF, mais uma por shard; `conexoes_historico` guarda as conexões abertas com os shards).
+    Com `substituir`, as linhas de 'historico_previsao' de um replay anterior da mesma versão
+    (mesmo ponto e horário) são apagadas antes, sem tocar nas previsões gravadas pela API.
+    """
+    colunas = ['versao_modelo', 'municipio', 'data_hora', 'prob_rf', 'prob_xgb', 'prob_lstm', 'probabilidade', 'enchente']
+    with conn:
+        conn.executemany(
+            f"INSERT INTO backtest_previsao ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+            df_resultado[colunas].itertuples(index=False, name=None)
+        )
+    if coordenadas is None:
+        return
+    # Carrega o histórico de previsões com o identificador 'lat,lon' que o frontend consulta
+    ids = df_resultado['municipio'].map(coordenadas)
+    df_hist = df_resultado.assign(municipio=ids).dropna(subset=['municipio'])
+    for caminho, parte in database.particionar('historico_previsao', df_hist).items():
+        if caminho == database.BANCO_PRINCIPAL:
+            conn_historico = conn
+        else:
+            if caminho not in conexoes_historico:
+                conexoes_historico[caminho] = database.conectar('historico_previsao', caminho=caminho)
+            conn_historico = conexoes_historico[caminho]
+        with conn_historico:
+            if substituir:
+                conn_historico.executemany(
+                    "DELETE FROM historico_previsao WHERE municipio = ? AND data_hora = ? AND versao_modelo = ?",
+                    parte[['municipio', 'data_hora', 'versao_modelo']].itertuples(index=False, name=None)
+                )
+            conn_historico.executemany(
+                "INSERT INTO historico_previsao (municipio, data_hora, probabilidade, versao_modelo) VALUES (?, ?, ?, ?)",
+                parte[['municipio', 'data_hora', 'probabilidade', 'versao_modelo']].itertuples(index=False, name=None)
+            )
+
+
+def executar_replay(caminho_db='database.db', municipios=None, inicio=None, fim=None,
+                    tamanho_lote=TAMANHO_LOTE_PADRAO, processos=None, gravar_historico=False, substituir=True):
+    """
+    Reexecuta o ensemble sobre os dados históricos da tabela 'clima' e grava as probabilidades
+    na tabela 'backtest_previsao', identificadas pela versão dos modelos carregados.
+
+    Os lotes são lidos em streaming por estação/horário e pontuados em paralelo num pool de
+    processos; no máximo 2 lotes por processo ficam em voo, então a memória não cresce com o
+    tamanho da tabela. Com `gravar_historico`, as probabilidades também vão para
+    'historico_previsao', o que permite popular o gráfico de histórico do frontend; com
+    `substituir`, rodar de novo troca as linhas da versão em vez de duplicá-las nas duas tabelas.
+    Com a 'clima' particionada por UF (core/database.py), os shards são lidos um após o outro
+    (só os das estações pedidas) e `caminho_db` guarda apenas 'backtest_previsao'.
+    """
+    carregar_modelos()
+    versao = models.versao_modelos
+    processos = processos or os.cpu_count() or 1
+    print(f"INFO: Iniciando replay da versão de modelos {versao} com {processos} processo(s)...")
+
+    conn_escrita = sqlite3.connect(caminho_db)
+    # Em modo WAL a leitura em streaming da 'clima' não bloqueia as gravações dos resultados
+    conn_escrita.execute("PRAGMA journal_mode=WAL")
+    bancos_clima = database.bancos('clima', municipios) if database.ARMAZENAMENTO_POR_UF else [caminho_db]
+    conexoes_leitura = [sqlite3.connect(caminho) for caminho in bancos_clima]
+    conexoes_historico = {}
+    coordenadas = _coordenadas_municipios(conn_escrita) if gravar_historico else None
+
+    if substituir:
+        with conn_escrita:
+            conn_escrita.execute("DELETE FROM backtest_previsao WHERE versao_modelo = ?", (versao,))
+
+    total = 0
+    inicio_tempo = time.perf_counter()
+    lotes = itertools.chain.from_iterable(
+        ler_clima_em_lotes(conn, municipios, inicio, fim, tamanho_lote) for conn in conexoes_leitura
+    )
+    try:
+        with ProcessPoolExecutor(max_workers=processos, initializer=_inicializar_trabalhador) as pool:
+            pendentes = set()
+            for df_lote in lotes:
+                pendentes.add(pool.submit(pontuar_lote, df_lote))
+                if len(pendentes) < 2 * processos:
+                    continue
+                concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    df_resultado = futuro.result()
+                    _gravar_resultados(conn_escrita, df_resultado, coordenadas, conexoes_historico, substituir)
+                    total += len(df_resultado)
+            for futuro in pendentes:
+                df_resultado = futuro.result()
+                _gravar_resultados(conn_escrita, df_resultado, coordenadas, conexoes_historico, substituir)
+                total += len(df_resultado)
+    finally:
+        for conn in conexoes_leitura + list(conexoes_historico.values()):
+            conn.close()
+        conn_escrita.close()
+
+    duracao = time.perf_counter() - inicio_tempo
+    print(f"INFO: Replay concluído: {total} linhas em {duracao:.1f}s ({total / max(duracao, 1e-9):.0f} linhas/s).")
+    return {"versao_modelo": versao, "linhas": total, "segundos": duracao}
+
+
+def comparar_versoes(caminho_db='database.db'):
+    """
+    Resume cada versão de modelo presente em 'backtest_previsao': número de linhas,
+    probabilidade média, acurácia com limiar 0.5 e Brier score contra a coluna 'enchente'.
+    """
+    conn = sqlite3.connect(caminho_db)
+    df = pd.read_sql_query("""
+        SELECT versao_modelo,
+               COUNT(*) AS linhas,
+               AVG(probabilidade) AS probabilidade_media,
+               AVG(CASE WHEN (probabilidade >= 0.5) = (enchente = 1) THEN 1.0 ELSE 0.0 END) AS acuracia,
+               AVG((probabilidade - enchente) * (probabilidade - enchente)) AS brier
+        FROM backtest_previsao
+        GROUP BY versao_modelo
+        ORDER BY versao_modelo
+    """, conn)
+    conn.close()
+    return df
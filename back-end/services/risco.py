@@ -0,0 +1,260 @@
+# --- START OF FILE risco.py ---
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import core.database as database
+import core.models as models
+import services.eventos as eventos
+import services.weather as weather
+from services.ensemble import FEATURES, prever_ensemble
+
+# Intervalo entre atualizações do mapa nacional (0 desativa o agendador)
+INTERVALO_ATUALIZACAO = int(os.getenv("RISCO_INTERVALO_SEGUNDOS", "1800"))
+# Orçamento de chamadas à weatherapi.com usado pelo agendador
+REQUISICOES_POR_MINUTO = float(os.getenv("RISCO_REQUISICOES_POR_MINUTO", "60"))
+# Chamadas simultâneas à weatherapi.com
+CONCORRENCIA_CLIMA = int(os.getenv("RISCO_CONCORRENCIA_CLIMA", "4"))
+
+# Variação mínima de probabilidade para uma estação ser enviada aos clientes do canal de push
+VARIACAO_MINIMA_PUSH = 0.001
+
+# Último snapshot de risco por estação (chave: CD_ESTACAO), mantido em memória
+snapshot = {}
+snapshot_atualizado_em = None
+tarefa_atualizacao = None
+
+
+def estacoes_ativas(df_estacoes):
+    """Estações operantes do catálogo do INMET com nome e coordenadas válidas."""
+    df = df_estacoes.dropna(subset=['CD_ESTACAO', 'DC_NOME', 'VL_LATITUDE', 'VL_LONGITUDE'])
+    return df[df['CD_SITUACAO'] == 'Operante']
+
+
+async def _buscar_clima_estacoes(coordenadas):
+    """
+    Busca o clima atual de todas as coordenadas respeitando o orçamento de requisições:
+    a i-ésima chamada só começa após i * (60 / REQUISICOES_POR_MINUTO) segundos, e no
+    máximo CONCORRENCIA_CLIMA chamadas (bloqueantes, em threads) ficam em andamento.
+    """
+    espacamento = 60 / REQUISICOES_POR_MINUTO
+    semaforo = asyncio.Semaphore(CONCORRENCIA_CLIMA)
+
+    async def buscar(i, lat, lon):
+        await asyncio.sleep(i * espacamento)
+        async with semaforo:
+            return await asyncio.to_thread(weather.get_weather_data, lat, lon, 1)
+
+    return await asyncio.gather(*(buscar(i, lat, lon) for i, (lat, lon) in enumerate(coordenadas)))
+
+
+def _gravar_snapshot(registros):
+    """
+    Grava o snapshot em 'snapshot_risco' e as previsões em 'historico_previsao', numa transação
+    (com 'historico_previsao' particionada por UF, uma transação por shard).
+    """
+    conn = sqlite3.connect(database.BANCO_PRINCIPAL)
+    with conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO snapshot_risco
+                (codigo, nome, uf, latitude, longitude, probabilidade, Temperatura, Umidade, Vento, Precipitacao, versao_modelo, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (r['codigo'], r['nome'], r['uf'], r['lat'], r['lon'], r['probabilidade'],
+             *(r['dados_atuais'][f] for f in FEATURES), r['versao_modelo'], r['atualizado_em'])
+            for r in registros
+        ])
+    conn.close()
+    # Mesmo identificador 'lat,lon' usado por predict_ensemble, para alimentar /predict/history/
+    historico = pd.DataFrame(
+        [(f"{r['lat']},{r['lon']}", r['atualizado_em'], r['probabilidade'], r['versao_modelo']) for r in registros],
+        columns=['municipio', 'data_hora', 'probabilidade', 'versao_modelo'],
+    )
+    for caminho, parte in database.particionar('historico_previsao', historico).items():
+        conn = database.conectar('historico_previsao', caminho=caminho)
+        with conn:
+            conn.executemany(
+                "INSERT INTO historico_previsao (municipio, data_hora, probabilidade, versao_modelo) VALUES (?, ?, ?, ?)",
+                parte.itertuples(index=False, name=None)
+            )
+        conn.close()
+
+
+def _aplicar_registros(registros):
+    """
+    Atualiza o snapshot em memória e publica no canal de push (services/eventos.py) as estações
+    novas ou cuja probabilidade mudou. Retorna as estações publicadas.
+    """
+    alterados = []
+    for registro in registros:
+        anterior = snapshot.get(registro['codigo'])
+        if anterior is None or abs(anterior['probabilidade'] - registro['probabilidade']) >= VARIACAO_MINIMA_PUSH:
+            alterados.append(registro)
+        snapshot[registro['codigo']] = registro
+    eventos.publicar(alterados, max((r['atualizado_em'] for r in registros), default=None))
+    return alterados
+
+
+def _ler_snapshot_do_banco():
+    """Lê o snapshot gravado em 'snapshot_risco' no formato dos registros em memória."""
+    conn = sqlite3.connect(database.BANCO_PRINCIPAL)
+    conn.row_factory = sqlite3.Row
+    linhas = conn.execute("SELECT * FROM snapshot_risco").fetchall()
+    conn.close()
+    return [
+        {
+            "codigo": linha['codigo'],
+            "nome": linha['nome'],
+            "uf": linha['uf'],
+            "lat": linha['latitude'],
+            "lon": linha['longitude'],
+            "probabilidade": linha['probabilidade'],
+            "dados_atuais": {f: linha[f] for f in FEATURES},
+            "versao_modelo": linha['versao_modelo'],
+            "atualizado_em": linha['atualizado_em'],
+        }
+        for linha in linhas
+    ]
+
+
+def incorporar_registros(registros):
+    """
+    Aplica ao snapshot em memória registros já gravados no banco (relidos de 'snapshot_risco' ou
+    calculados pela ingestão de observações) e avança a data do snapshot. Roda no loop de eventos.
+    """
+    global snapshot_atualizado_em
+    _aplicar_registros(registros)
+    if registros:
+        snapshot_atualizado_em = max(r['atualizado_em'] for r in registros)
+
+
+def carregar_snapshot_do_banco(avisar=True):
+    """Restaura o último snapshot gravado, para que /risk/snapshot responda logo após reiniciar a API."""
+    try:
+        registros = _ler_snapshot_do_banco()
+    except sqlite3.Error as e:
+        print(f"AVISO: Não foi possível carregar o snapshot de risco do banco: {e}")
+        return
+    incorporar_registros(registros)
+    if registros and avisar:
+        print(f"INFO: Snapshot de risco restaurado do banco com {len(registros)} estações.")
+
+
+async def atualizar_snapshot(df_estacoes):
+    """
+    Recalcula o risco de todas as estações ativas: busca o clima de cada uma (com limite de
+    taxa) e pontua todas de uma vez, numa única chamada em lote ao ensemble.
+    Estações cuja consulta de clima falhar mantêm o valor anterior.
+    Retorna a lista de registros atualizados.
+    """
+    global snapshot_atualizado_em
+    df = estacoes_ativas(df_estacoes)
+    inicio = time.perf_counter()
+    print(f"INFO: Atualizando snapshot de risco para {len(df)} estações...")
+
+    climas = await _buscar_clima_estacoes(list(zip(df['VL_LATITUDE'], df['VL_LONGITUDE'])))
+    validos = [i for i, c in enumerate(climas) if c is not None]
+    if not validos:
+        print("AVISO: Nenhum dado climático obtido; snapshot de risco não atualizado.")
+        return []
+
+    X = np.array([climas[i] for i in validos], dtype=np.float64)
+    probabilidades = prever_ensemble(X, avisar=False)
+
+    agora = datetime.now().isoformat()
+    df_validos = df.iloc[validos]
+    registros = []
+    for (codigo, nome, uf, lat, lon), features, probabilidade in zip(
+            df_validos[['CD_ESTACAO', 'DC_NOME', 'SG_ESTADO', 'VL_LATITUDE', 'VL_LONGITUDE']].itertuples(index=False, name=None),
+            X, probabilidades):
+        registros.append({
+            "codigo": codigo,
+            "nome": nome,
+            "uf": uf,
+            "lat": float(lat),
+            "lon": float(lon),
+            "probabilidade": float(probabilidade),
+            "dados_atuais": dict(zip(FEATURES, map(float, features))),
+            "versao_modelo": models.versao_modelos,
+            "atualizado_em": agora,
+        })
+
+    await asyncio.to_thread(_gravar_snapshot, registros)
+    alterados = _aplicar_registros(registros)
+    snapshot_atualizado_em = agora
+    print(f"INFO: Snapshot de risco atualizado: {len(registros)}/{len(df)} estações em {time.perf_counter() - inicio:.1f}s "
+          f"({len(alterados)} alteradas enviadas a {len(eventos.assinantes)} cliente(s) do push).")
+    return registros
+
+
+async def loop_atualizacao(df_estacoes, intervalo=INTERVALO_ATUALIZACAO):
+    """Tarefa de fundo: atualiza o snapshot a cada `intervalo` segundos até ser cancelada."""
+    while True:
+        try:
+            await atualizar_snapshot(df_estacoes)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"ERRO: Falha ao atualizar o snapshot de risco: {e}")
+        await asyncio.sleep(intervalo)
+
+
+async def loop_sincronizacao(intervalo):
+    """
+    Tarefa de fundo dos workers que não rodam o agendador (ver servidor.py): relê o snapshot
+    gravado no SQLite pelo worker responsável, em vez de consultar a weatherapi.com de novo.
+    """
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            # Leitura numa thread; a aplicação (e o push aos clientes) no loop de eventos
+            incorporar_registros(await asyncio.to_thread(_ler_snapshot_do_banco))
+        except Exception as e:
+            print(f"ERRO: Falha ao sincronizar o snapshot de risco: {e}")
+
+
+def iniciar_agendador(df_estacoes):
+    """Inicia a tarefa de atualização periódica no loop de eventos atual, se estiver habilitada."""
+    global tarefa_atualizacao
+    if os.getenv("RISCO_AGENDADOR", "1") == "0":
+        # Com vários workers, apenas um atualiza o snapshot; os demais só o releem do banco
+        intervalo = min(60, INTERVALO_ATUALIZACAO) if INTERVALO_ATUALIZACAO > 0 else 60
+        tarefa_atualizacao = asyncio.create_task(loop_sincronizacao(intervalo))
+        return tarefa_atualizacao
+    if INTERVALO_ATUALIZACAO <= 0:
+        print("INFO: Atualização periódica do snapshot de risco desativada (RISCO_INTERVALO_SEGUNDOS=0).")
+        return None
+    if not weather.WEATHER_API_KEY:
+        print("AVISO: WEATHER_API_KEY não definida. Atualização periódica do snapshot de risco desativada.")
+        return None
+    tarefa_atualizacao = asyncio.create_task(loop_atualizacao(df_estacoes))
+    print(f"INFO: Agendador de risco iniciado (a cada {INTERVALO_ATUALIZACAO}s, até {REQUISICOES_POR_MINUTO:g} req/min).")
+    return tarefa_atualizacao
+
+
+def parar_agendador():
+    if tarefa_atualizacao is not None:
+        tarefa_atualizacao.cancel()
+
+
+def obter_snapshot():
+    """Snapshot nacional com metadados de desatualização (idade em segundos, global e por estação)."""
+    agora = datetime.now()
+
+    def idade(atualizado_em):
+        return (agora - datetime.fromisoformat(atualizado_em)).total_seconds() if atualizado_em else None
+
+    idade_geral = idade(snapshot_atualizado_em)
+    estacoes = [dict(registro, idade_segundos=idade(registro['atualizado_em'])) for registro in snapshot.values()]
+    return {
+        "atualizado_em": snapshot_atualizado_em,
+        "idade_segundos": idade_geral,
+        "intervalo_segundos": INTERVALO_ATUALIZACAO,
+        # Desatualizado se já passou mais de duas atualizações sem sucesso (ou se nunca houve uma)
+        "desatualizado": idade_geral is None or (INTERVALO_ATUALIZACAO > 0 and idade_geral > 2 * INTERVALO_ATUALIZACAO),
+        "total_estacoes": len(estacoes),
+        "estacoes": estacoes,
+    }
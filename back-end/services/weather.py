@@ -1,27 +1,81 @@
 import requests, os, time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
+# Permite apontar para um servidor local que imita a weatherapi.com (benchmarks, desenvolvimento offline)
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "http://api.weatherapi.com/v1")
+
+# Espera entre tentativas após erro de rede ou do servidor
+ESPERA_PADRAO_SEGUNDOS = 2
+# Espera máxima por tentativa, mesmo que o Retry-After de um 429 peça mais: as chamadas rodam
+# em threads da API e do agendador, que não devem ficar presas por minutos
+ESPERA_MAXIMA_SEGUNDOS = float(os.getenv("WEATHER_API_ESPERA_MAXIMA_SEGUNDOS", "10"))
+
+def _segundos_retry_after(valor):
+    """Segundos pedidos pelo cabeçalho Retry-After (número ou data HTTP), ou None se ausente/inválido."""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        data = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return None
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return max(0.0, (data - datetime.now(timezone.utc)).total_seconds())
+
+def _requisitar(url, tentativas=3):
+    """
+    GET na weatherapi.com com até `tentativas` tentativas; retorna o JSON ou None.
+    Erros de rede, 5xx e 429 são repetidos (no 429, esperando o Retry-After, limitado a
+    ESPERA_MAXIMA_SEGUNDOS); os demais 4xx (chave inválida, coordenada desconhecida) não.
+    Não há espera depois da última tentativa.
+    """
+    for tentativa in range(tentativas):
+        espera = ESPERA_PADRAO_SEGUNDOS
+        try:
+            response = requests.get(url, timeout=10)
+            if response.status_code == 429:
+                # Limite de requisições da weatherapi.com atingido
+                retry_after = _segundos_retry_after(response.headers.get("Retry-After"))
+                espera = min(ESPERA_MAXIMA_SEGUNDOS if retry_after is None else retry_after, ESPERA_MAXIMA_SEGUNDOS)
+            elif 400 <= response.status_code < 500:
+                print(f"ERRO: weatherapi.com respondeu {response.status_code}: {response.text[:200]}")
+                return None
+            else:
+                response.raise_for_status()
+                return response.json()
+        except (requests.RequestException, ValueError):
+            pass
+        if tentativa < tentativas - 1:
+            time.sleep(espera)
+    return None
 
 def get_weather_data(lat, lon, tentativas=3):
     """
     Busca dados meteorológicos (temperatura, umidade, vento, precipitação)
     para uma coordenada geográfica.
     """
-    url = f"http://api.weatherapi.com/v1/current.json?key={WEATHER_API_KEY}&q={lat},{lon}"
-    for _ in range(tentativas):
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            # Extraindo a precipitação em milímetros (mm)
-            precipitacao_mm = data["current"].get("precip_mm", 0)
-            
-            # A API retorna 'precip_mm' para a precipitação.
-            # O .get() é usado para evitar erros caso a chave não exista no retorno da API.
-            
-            return [data["current"]["temp_c"], data["current"]["humidity"], data["current"]["wind_kph"], precipitacao_mm]
-        except Exception:
-            # Em caso de erro, espera e tenta novamente.
-            time.sleep(2)
-    return None
\ No newline at end of file
+    url = f"{WEATHER_API_URL}/current.json?key={WEATHER_API_KEY}&q={lat},{lon}"
+    data = _requisitar(url, tentativas)
+    if data is None:
+        return None
+    try:
+        # A API retorna 'precip_mm' para a precipitação.
+        # O .get() é usado para evitar erros caso a chave não exista no retorno da API.
+        precipitacao_mm = data["current"].get("precip_mm", 0)
+        return [data["current"]["temp_c"], data["current"]["humidity"], data["current"]["wind_kph"], precipitacao_mm]
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+def get_forecast_data(lat, lon, dias=3, tentativas=3):
+    """
+    Busca a previsão horária (forecast.json) dos próximos `dias` dias (o plano gratuito devolve no máximo 3).
+    Retorna o JSON da weatherapi.com, ou None se todas as tentativas falharem.
+    """
+    url = f"{WEATHER_API_URL}/forecast.json?key={WEATHER_API_KEY}&q={lat},{lon}&days={dias}&aqi=no&alerts=no"
+    return _requisitar(url, tentativas)
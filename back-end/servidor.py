@@ -0,0 +1,145 @@
+# --- START OF FILE servidor.py ---
+# Servidor com vários workers que compartilham os modelos carregados uma única vez.
+#
+# O `uvicorn main:app --workers N` inicia cada worker do zero: a floresta, o booster e o runtime
+# do torch são carregados (e ocupam memória) N vezes. Aqui o processo pai carrega os modelos,
+# abre o socket e só então faz fork dos workers; as páginas de memória dos modelos, que nunca
+# são escritas durante a inferência, ficam compartilhadas por copy-on-write.
+#
+# Uso (na pasta back-end/, apenas Linux/macOS):
+#   python3 servidor.py --workers 4 --port 8000
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import uvicorn
+
+
+def threads_por_worker(workers):
+    """Divide os núcleos entre os workers, para que N workers não disputem os mesmos núcleos."""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def configurar_threads(threads):
+    """
+    Limita as threads de OpenMP/MKL (torch, XGBoost, scikit-learn). As variáveis de ambiente
+    precisam estar definidas antes de importar o torch; o restante é aplicado em cada worker.
+    """
+    for variavel in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[variavel] = str(threads)
+
+
+def criar_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def executar_worker(indice, sock, threads, log_level):
+    """Código do processo filho: ajusta as threads e serve a aplicação no socket herdado."""
+    import torch
+    import main
+    from core.models import xgb_model
+
+    torch.set_num_threads(threads)
+    xgb_model.set_params(n_jobs=threads)
+    if indice != 0:
+        # Só o worker 0 consulta a weatherapi.com para o snapshot de risco; os outros o releem do banco
+        os.environ['RISCO_AGENDADOR'] = '0'
+
+    config = uvicorn.Config(main.app, log_level=log_level, lifespan='on')
+    servidor = uvicorn.Server(config)
+    servidor.run(sockets=[sock])
+
+
+def iniciar_worker(indice, sock, threads, log_level):
+    pid = os.fork()
+    if pid == 0:
+        codigo = 0
+        try:
+            executar_worker(indice, sock, threads, log_level)
+        except Exception as e:
+            print(f"ERRO [servidor]: Worker {indice} terminou com erro: {e}")
+            codigo = 1
+        finally:
+            os._exit(codigo)
+    print(f"INFO [servidor]: Worker {indice} iniciado (pid {pid}, {threads} thread(s)).")
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a API com vários workers que compartilham os modelos carregados.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--threads', type=int, default=None, help="Threads de torch/XGBoost por worker (padrão: núcleos / workers).")
+    parser.add_argument('--log-level', default='warning')
+    args = parser.parse_args()
+
+    threads = args.threads or threads_por_worker(args.workers)
+    configurar_threads(threads)
+
+    # Importa a aplicação e carrega os modelos no processo pai, antes do fork
+    from core.models import carregar_modelos
+    import main as _app # noqa: F401 - importa torch, sklearn, xgboost e a aplicação uma única vez
+    carregar_modelos()
+    # As estruturas do TreeSHAP do Random Forest (explicações) também ficam compartilhadas
+    from services.explicacao import preparar_explicacoes
+    try:
+        preparar_explicacoes()
+    except Exception as e:
+        # As explicações são opcionais: sem o pré-cálculo, cada worker as prepara no primeiro uso
+        print(f"AVISO [servidor]: Não foi possível preparar as explicações antes do fork: {e}")
+
+    # Move todos os objetos já criados para uma geração permanente do coletor de lixo: assim as
+    # varreduras do GC nos workers não escrevem nos cabeçalhos desses objetos e não quebram o
+    # compartilhamento copy-on-write das páginas
+    gc.collect()
+    gc.freeze()
+
+    sock = criar_socket(args.host, args.port)
+    print(f"INFO [servidor]: Escutando em http://{args.host}:{args.port} com {args.workers} worker(s).")
+
+    workers = {iniciar_worker(i, sock, threads, args.log_level): i for i in range(args.workers)}
+    encerrando = False
+
+    def encerrar(signum, frame):
+        nonlocal encerrando
+        encerrando = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+
+    # Supervisiona os workers: reinicia os que morrerem inesperadamente
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        indice = workers.pop(pid, None)
+        if indice is None or encerrando:
+            continue
+        print(f"AVISO [servidor]: Worker {indice} (pid {pid}) terminou inesperadamente (status {status}). Reiniciando...")
+        time.sleep(1)
+        workers[iniciar_worker(indice, sock, threads, args.log_level)] = indice
+
+    sock.close()
+    print("INFO [servidor]: Encerrado.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
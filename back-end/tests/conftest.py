@@ -0,0 +1,8 @@
+# --- START OF FILE conftest.py ---
+import os
+import sys
+
+# O código do back-end é importado como nos scripts (a partir da raiz do back-end)
+RAIZ_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ_BACKEND not in sys.path:
+    sys.path.insert(0, RAIZ_BACKEND)
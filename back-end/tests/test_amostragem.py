@@ -0,0 +1,60 @@
+# --- START OF FILE test_amostragem.py ---
+# Amostragem estratificada da 'clima' (core/amostragem.py) com os rótulos da ANA (CHEIAS_201),
+# que vão de 0 a 3 e não só 0 e 1.
+import sqlite3
+import pytest
+import core.database as database
+from core.amostragem import amostrar_clima, calcular_cotas, contar_estratos
+
+
+@pytest.fixture
+def banco(tmp_path):
+    """Banco com três estações: só rótulos 2 e 3, rótulos 0 a 3 misturados e só rótulo 0."""
+    caminho = str(tmp_path / 'clima.db')
+    conn = sqlite3.connect(caminho)
+    database._criar_tabela_clima(conn.cursor())
+    linhas = []
+    for dia in range(1, 29):
+        for hora in range(24):
+            data, hora_txt = f'2020-01-{dia:02d}', f'{hora:02d}:00'
+            linhas.append((data, hora_txt, 0.0, 25.0, 80.0, 2.0, 'SO CHEIAS', 2 + hora % 2))
+            linhas.append((data, hora_txt, 0.0, 25.0, 80.0, 2.0, 'MISTA', hora % 4))
+            linhas.append((data, hora_txt, 0.0, 25.0, 80.0, 2.0, 'SECA', 0))
+    conn.executemany("""
+        INSERT INTO clima (Data, Hora, Precipitacao, Temperatura, Umidade, Vento, municipio, Enchente)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, linhas)
+    conn.commit()
+    conn.close()
+    return caminho
+
+
+def test_estratos_usam_classe_binaria(banco):
+    conn = sqlite3.connect(banco)
+    contagens = contar_estratos(conn)
+    conn.close()
+    assert contagens == {
+        ('SO CHEIAS', '2020-01', 1): 672,
+        ('MISTA', '2020-01', 0): 168,
+        ('MISTA', '2020-01', 1): 504,
+        ('SECA', '2020-01', 0): 672,
+    }
+    # Um mês só com rótulos 2 e 3 não deixa o estrato sem linhas (antes: ZeroDivisionError)
+    cotas = calcular_cotas(contagens, 300)
+    assert sum(cotas.values()) == 300
+    assert cotas[('SO CHEIAS', '2020-01', 1)] == 100
+
+
+def test_amostra_mantem_rotulos_acima_de_um(banco):
+    df, especificacao = amostrar_clima(banco, linhas=300)
+    assert len(df) == 300
+    assert set(df['Enchente'].unique()) == {0, 1}
+    # 100 da estação só com cheias e 75 das 100 da estação mista (3 de cada 4 horas com cheia)
+    assert especificacao['positivos'] == 175
+
+
+def test_amostra_completa_binariza_rotulo(banco):
+    df, especificacao = amostrar_clima(banco)
+    assert len(df) == 3 * 672
+    assert int(df['Enchente'].sum()) == 672 + 504
+    assert especificacao['linhas_amostradas'] == especificacao['linhas_disponiveis']
@@ -0,0 +1,151 @@
+# --- START OF FILE test_previsao.py ---
+# Série de risco das próximas horas (services/previsao.py e GET /predict/forecast/) contra o stub
+# local da weatherapi.com, que serve a gravação de forecast.json em benchmarks/fixtures.
+import socket
+import threading
+import time
+import numpy as np
+import pytest
+import services.previsao as previsao
+import services.weather as weather
+from benchmarks.stub_weatherapi import iniciar_stub, previsao as previsao_stub
+
+LAT, LON = -15.78, -47.92
+
+
+@pytest.fixture(scope='module')
+def url_stub():
+    servidor, url = iniciar_stub()
+    yield url
+    servidor.shutdown()
+
+
+@pytest.fixture
+def consultas(url_stub, monkeypatch):
+    """Aponta o back-end para o stub, limpa o cache e conta as consultas a forecast.json."""
+    monkeypatch.setattr(weather, 'WEATHER_API_URL', url_stub)
+    monkeypatch.setattr(weather, 'ESPERA_PADRAO_SEGUNDOS', 0)
+    previsao._cache.clear()
+    # Probabilidade determinística (precipitação / 100), sem depender dos modelos treinados
+    monkeypatch.setattr(previsao, 'prever_ensemble', lambda X, avisar=True: np.clip(X[:, 3] / 100, 0, 1))
+    chamadas = []
+    original = weather.get_forecast_data
+
+    def contar(*args, **kwargs):
+        chamadas.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(weather, 'get_forecast_data', contar)
+    return chamadas
+
+
+def test_recorta_o_horizonte_a_partir_da_hora_atual(consultas):
+    esperado = previsao.extrair_horas(previsao_stub(LAT, LON, previsao.DIAS_PREVISAO))
+
+    resultado = previsao.prever_horizonte(LAT, LON, 24)
+
+    assert resultado['horas'] == 24
+    assert [p['timestamp'] for p in resultado['serie']] == [h['timestamp'] for h in esperado[:24]]
+    assert resultado['serie'][0]['dados']['Precipitacao'] == esperado[0]['features'][3]
+    pico = max(resultado['serie'], key=lambda p: p['probability'])
+    assert resultado['probabilidade_maxima'] == pico['probability']
+
+
+def test_horizonte_limitado_pelas_horas_da_previsao(consultas):
+    # A gravação tem 3 dias: a partir da hora atual sobram menos de HORAS_MAXIMAS horas
+    disponiveis = len(previsao.extrair_horas(previsao_stub(LAT, LON, previsao.DIAS_PREVISAO)))
+
+    resultado = previsao.prever_horizonte(LAT, LON, previsao.HORAS_MAXIMAS)
+
+    assert resultado['horas'] == min(disponiveis, previsao.HORAS_MAXIMAS)
+
+
+def test_segundo_pedido_vem_do_cache_e_so_recorta(consultas):
+    primeiro = previsao.prever_horizonte(LAT, LON, 48)
+    segundo = previsao.prever_horizonte(LAT, LON, 6)
+
+    assert primeiro['cache'] is False
+    assert segundo['cache'] is True
+    assert len(consultas) == 1
+    assert segundo['serie'] == primeiro['serie'][:6]
+
+
+def test_coordenadas_diferentes_nao_compartilham_cache(consultas):
+    previsao.prever_horizonte(LAT, LON, 6)
+    outro = previsao.prever_horizonte(LAT + 1, LON, 6)
+
+    assert outro['cache'] is False
+    assert len(consultas) == 2
+
+
+def test_cache_expirado_consulta_de_novo(consultas):
+    previsao.prever_horizonte(LAT, LON, 6)
+    for item in previsao._cache.values():
+        item['expira_em'] = 0
+
+    resultado = previsao.prever_horizonte(LAT, LON, 6)
+
+    assert resultado['cache'] is False
+    assert len(consultas) == 2
+
+
+def test_pedidos_simultaneos_fazem_uma_unica_consulta(consultas, monkeypatch):
+    liberar = threading.Event()
+    consultar = weather.get_forecast_data
+
+    def lenta(*args, **kwargs):
+        liberar.wait(5)
+        return consultar(*args, **kwargs)
+
+    monkeypatch.setattr(weather, 'get_forecast_data', lenta)
+    resultados = []
+    threads = [threading.Thread(target=lambda: resultados.append(previsao.prever_horizonte(LAT, LON, 12))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    # Dá tempo para todas as threads chegarem enquanto a primeira consulta está em andamento
+    time.sleep(0.2)
+    liberar.set()
+    for t in threads:
+        t.join(10)
+
+    assert len(consultas) == 1
+    assert len(resultados) == 8
+    assert sum(not r['cache'] for r in resultados) == 1
+    assert all(r['serie'] == resultados[0]['serie'] for r in resultados)
+
+
+def test_weatherapi_indisponivel_retorna_erro_sem_cache(consultas, monkeypatch):
+    # Porta local sem servidor: todas as tentativas falham
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        porta = s.getsockname()[1]
+    monkeypatch.setattr(weather, 'WEATHER_API_URL', f"http://127.0.0.1:{porta}/v1")
+
+    assert previsao.obter_previsao_horaria(LAT, LON) == (None, False)
+    assert 'error' in previsao.prever_horizonte(LAT, LON, 24)
+    assert not previsao._cache
+
+
+def test_endpoint_forecast(consultas):
+    from fastapi.testclient import TestClient
+    import main
+
+    # Sem o contexto do TestClient a inicialização da API (catálogo, modelos, agendador) não roda
+    cliente = TestClient(main.app)
+    resposta = cliente.get('/predict/forecast/', params={"lat": LAT, "lon": LON, "horas": 12})
+    assert resposta.status_code == 200
+    assert resposta.json()['horas'] == 12
+    assert resposta.json()['cache'] is False
+    assert cliente.get('/predict/forecast/', params={"lat": LAT, "lon": LON, "horas": 3}).json()['cache'] is True
+    assert cliente.get('/predict/forecast/', params={"lat": LAT, "lon": LON, "horas": 0}).status_code == 400
+    assert len(consultas) == 1
+
+
+def test_endpoint_forecast_erro(consultas, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+
+    monkeypatch.setattr(weather, 'get_forecast_data', lambda *args, **kwargs: None)
+    resposta = TestClient(main.app).get('/predict/forecast/', params={"lat": LAT, "lon": LON})
+    assert resposta.status_code == 200
+    assert 'error' in resposta.json()
@@ -1,26 +1,29 @@
 # --- START OF FILE treinamento_acelerado.py ---
-import pandas as pd
-import sqlite3
+import argparse
 from sklearn.model_selection import train_test_split
+from core.amostragem import PERFIS_AMOSTRAGEM, amostrar_clima
+from core.drift import construir_referencia
+from core.models import carregar_modelos, salvar_manifesto
 from core.treino_rf import treinar_modelo_rf
 from core.treino_xgb import treinar_modelo_xgb
 from core.treino_lstm import treinar_modelo_lstm
 from core.evaluation import run_ensemble_evaluation
 import numpy as np # Importar numpy para checagem
 
-def ciclo_de_treinamento_acelerado():
+def ciclo_de_treinamento_acelerado(perfil='rapido', linhas=None, semente=None):
     """
     Orquestra o processo de carregamento, divisão e treinamento dos modelos.
+    O perfil 'rapido' treina sobre uma amostra estratificada da tabela 'clima' (por estação,
+    mês e classe); o perfil 'completo' usa todas as linhas. `linhas` e `semente` sobrescrevem o perfil.
     """
-    print("Iniciando o ciclo de treinamento acelerado...")
+    print(f"Iniciando o ciclo de treinamento acelerado (perfil '{perfil}')...")
 
     try:
-        conn = sqlite3.connect('database.db')
+        config = PERFIS_AMOSTRAGEM[perfil]
+        linhas = config['linhas'] if linhas is None else linhas
+        semente = config['semente'] if semente is None else semente
         # Seleciona as colunas esperadas pelos modelos (Temperatura, Umidade, Vento, Precipitacao)
-        df = pd.read_sql_query("SELECT Temperatura, Umidade, Vento, Precipitacao, Enchente FROM clima", conn)
-        conn.close()
-        
-        df.dropna(inplace=True)
+        df, amostra = amostrar_clima(linhas=linhas, semente=semente)
 
         if len(df) < 20:
             print(f"AVISO: Dados insuficientes no banco de dados para um treinamento significativo. Mínimo de 20 linhas. Atualmente: {len(df)}")
@@ -35,7 +38,10 @@ def ciclo_de_treinamento_acelerado():
             return
 
         print(f"Dataset carregado com sucesso. Total de {len(df)} linhas e {len(df.columns)} colunas.")
-        print("AVISO: Usando um subconjunto de dados para treinamento rápido. A precisão do modelo será reduzida.")
+        if amostra['linhas_amostradas'] < amostra['linhas_disponiveis']:
+            print(f"AVISO: Usando um subconjunto de {amostra['linhas_amostradas']} de {amostra['linhas_disponiveis']} linhas "
+                  f"({amostra['estacoes']} estações, {amostra['positivos']} com enchente) para treinamento rápido. "
+                  "A precisão do modelo será reduzida.")
 
         X = df.drop('Enchente', axis=1) # Usar 'Enchente' conforme o nome da coluna
         y = df['Enchente']
@@ -63,8 +69,12 @@ def ciclo_de_treinamento_acelerado():
         print("Treinamento do LSTM concluído.")
 
         print("--- Treinamento de todos os modelos concluído. ---\n")
+        # Distribuição de treino de cada feature, comparada às entradas em produção (/drift/)
+        salvar_manifesto(perfil, amostra, construir_referencia(X_treino.values, feature_columns))
 
         print("Iniciando a avaliação do ensemble...")
+        # O LSTM e seu scaler são salvos em disco pelo treinador; recarrega para avaliar os artefatos novos
+        carregar_modelos()
         metricas = run_ensemble_evaluation(X_teste.values, y_teste.values)
         if metricas:
             print("Avaliação concluída com sucesso:")
@@ -86,4 +96,10 @@ def ciclo_de_treinamento_acelerado():
         print(f"Ocorreu um erro no ciclo de treinamento: {e}")
 
 if __name__ == "__main__":
-    ciclo_de_treinamento_acelerado()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Treina RF, XGBoost e LSTM sobre a tabela 'clima'.")
+    parser.add_argument('--perfil', choices=list(PERFIS_AMOSTRAGEM), default='rapido',
+                        help="'rapido' (amostra para desenvolvimento) ou 'completo' (todas as linhas, produção).")
+    parser.add_argument('--linhas', type=int, default=None, help="Tamanho da amostra (sobrescreve o perfil).")
+    parser.add_argument('--semente', type=int, default=None, help="Semente da amostragem (sobrescreve o perfil).")
+    args = parser.parse_args()
+    ciclo_de_treinamento_acelerado(args.perfil, args.linhas, args.semente)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { MapContainer, TileLayer, Marker } from 'react-leaflet';
 import MarkerClusterGroup from 'react-leaflet-markercluster';
 import 'leaflet/dist/leaflet.css';
@@ -19,6 +19,7 @@ const ESTACOES_URL = 'http://localhost:8000/estacoes/';
 const API_URL = 'http://localhost:8000/predict/';
 const EVALUATE_URL = 'http://localhost:8000/evaluate/';
 const HISTORY_API_URL = 'http://localhost:8000/predict/history/';
+const RISK_STREAM_URL = 'http://localhost:8000/risk/stream';
 
 const defaultIcon = new L.Icon({
   iconUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/1.7.1/images/marker-icon.png',
@@ -57,6 +58,8 @@ const MapaBrasil = () => {
   const [loadingPrediction, setLoadingPrediction] = useState(false);
   const [predictionResult, setPredictionResult] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [riscos, setRiscos] = useState({});
+  const codigoSelecionado = useRef(null);
 
   useEffect(() => {
     // Busca dados das estações do backend
@@ -87,6 +90,33 @@ const MapaBrasil = () => {
       });
   }, []);
 
+  useEffect(() => {
+    // Recebe por push o risco de todas as estações: o backend calcula o mapa uma vez e envia
+    // só as estações que mudaram, em vez de cada painel aberto consultar a API por conta própria
+    const fonte = new EventSource(RISK_STREAM_URL);
+    const aplicar = (evento) => {
+      const { estacoes: atualizadas } = JSON.parse(evento.data);
+      setRiscos(anteriores => {
+        const novos = { ...anteriores };
+        atualizadas.forEach(estacao => { novos[estacao.codigo] = estacao; });
+        return novos;
+      });
+      return atualizadas;
+    };
+    fonte.addEventListener('snapshot', aplicar);
+    fonte.addEventListener('risco', (evento) => {
+      // Atualiza o painel da estação selecionada quando o backend recalcula o risco dela
+      const selecionada = aplicar(evento).find(estacao => estacao.codigo === codigoSelecionado.current);
+      if (selecionada) {
+        setPredictionResult(anterior => (anterior && !anterior.error)
+          ? { ...anterior, probabilidade: selecionada.probabilidade, dados_atuais: selecionada.dados_atuais }
+          : anterior);
+      }
+    });
+    fonte.onerror = () => console.error("Conexão de push de risco interrompida; o navegador tentará reconectar.");
+    return () => fonte.close();
+  }, []);
+
   useEffect(() => {
     if (evaluationMetrics) {
       const ensembleMetrics = evaluationMetrics.Ensemble || {};
@@ -166,6 +196,7 @@ const MapaBrasil = () => {
     setLoadingPrediction(true);
     setPredictionResult(null);
     setMunicipioSelecionado(municipio);
+    codigoSelecionado.current = municipio.codigo;
 
     try {
       const response = await axios.get(API_URL, {
@@ -220,6 +251,7 @@ const MapaBrasil = () => {
   
   const handleCloseSidebar = () => {
     setMunicipioSelecionado(null);
+    codigoSelecionado.current = null;
     setPredictionResult(null);
   };
 
@@ -298,7 +330,7 @@ const MapaBrasil = () => {
               <Marker 
                 key={index} 
                 position={[municipio.lat, municipio.lon]} 
-                icon={defaultIcon}
+                icon={riscos[municipio.codigo] ? getIcon(riscos[municipio.codigo].probabilidade) : defaultIcon}
                 eventHandlers={{
                   click: () => predict(municipio),
                 }}